@@ -5,10 +5,19 @@ The data can be either defined per voxel/vertex (:class:`DenseCifti`) or per par
 
 The data can be read from NIFTI, GIFTI, or CIFTI files.
 Non-sparse volumetric or surface representations can be extracte.
+
+Reductions (sum, mean, variance, standard deviation; optionally weighted) over groups of
+greyordinates or parcels can be computed with :meth:`Cifti.reduce`,
+:meth:`DenseCifti.reduce_structures`, and :meth:`DenseCifti.reduce_parcels`.
+These work through the data in chunks along the greyordinate axis,
+so that memory-mapped CIFTI files do not need to be loaded into memory in their entirety.
+The same reduction can be applied to many files in parallel using :func:`reduce_files`.
 """
+from concurrent.futures import ThreadPoolExecutor
 from nibabel.cifti2 import cifti2_axes
 from typing import Sequence, Optional, Union
 import numpy as np
+import scipy.sparse as sparse
 from fsl.data import image
 import nibabel as nib
 from fsl.utils.path import addExt
@@ -30,6 +39,12 @@ parcel_extensions = {
     cifti2_axes.LabelAxis: '.plabel.nii',
 }
 
+reductions = ('sum', 'mean', 'var', 'std')
+"""Reductions supported by :meth:`Cifti.reduce`."""
+
+default_chunk_size = 10000
+"""Default number of greyordinates/parcels processed at once by :meth:`Cifti.reduce`."""
+
 
 class Cifti:
     """
@@ -198,6 +213,74 @@ class Cifti:
         bm_axes = cifti2_axes.BrainModelAxis.from_mask(mask, affine=img.nibImage.affine)
         return DenseCifti(inverted_data, [bm_axes])
 
+    def reduce(self, groups, func='mean', weights=None, chunk_size=default_chunk_size) -> np.ndarray:
+        """
+        Reduces the data over groups of greyordinates or parcels
+
+        The data is processed in chunks of `chunk_size` elements along the last axis,
+        so that only a single chunk of a memory-mapped array is in memory at any time.
+
+        :param groups: (N, ) integer array assigning each greyordinate/parcel to a group;
+            negative values are excluded from all groups
+        :param func: one of 'sum', 'mean', 'var', or 'std'
+        :param weights: optional (N, ) array of non-negative weights (e.g., vertex areas or voxel volumes)
+        :param chunk_size: number of greyordinates/parcels to process at once
+        :return: (..., G) float array, where G is `groups.max() + 1`
+        """
+        if func not in reductions:
+            raise ValueError(f"Unknown reduction {func}; should be one of {reductions}")
+        groups = np.asarray(groups)
+        nelem = self.arr.shape[-1]
+        if groups.shape != (nelem, ):
+            raise ValueError(f"Shape of groups {groups.shape} does not match last axis of array ({nelem}, )")
+        if weights is None:
+            weights = np.ones(nelem)
+        else:
+            weights = np.asarray(weights, dtype=float)
+            if weights.shape != (nelem, ):
+                raise ValueError(f"Shape of weights {weights.shape} does not match last axis of array ({nelem}, )")
+            if (weights < 0).any():
+                raise ValueError("Weights should be non-negative")
+        chunk_size = max(int(chunk_size), 1)
+
+        ngroups = max(int(groups.max(initial=-1)) + 1, 0)
+        if ngroups == 0:
+            return np.zeros(self.arr.shape[:-1] + (0, ))
+        include = (groups >= 0) & (weights > 0)
+        indices = np.where(include)[0]
+        weight_matrix = sparse.csr_matrix(
+            (weights[include], (indices, groups[include])), shape=(nelem, ngroups))
+        total_weight = np.asarray(weight_matrix.sum(0)).ravel()
+
+        def chunks():
+            for start in range(0, nelem, chunk_size):
+                end = min(start + chunk_size, nelem)
+                chunk = np.asarray(self.arr[..., start:end], dtype=float)
+                yield start, end, chunk.reshape(-1, end - start)
+
+        lead_shape = self.arr.shape[:-1]
+        result = np.zeros((int(np.prod(lead_shape)), ngroups))
+        for start, end, chunk in chunks():
+            result += chunk @ weight_matrix[start:end]
+
+        if func != 'sum':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result /= total_weight
+
+        if func in ('var', 'std'):
+            mean = result
+            result = np.zeros_like(mean)
+            clipped = np.where(groups >= 0, groups, 0)
+            for start, end, chunk in chunks():
+                residual = chunk - mean[:, clipped[start:end]]
+                result += residual ** 2 @ weight_matrix[start:end]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result /= total_weight
+            if func == 'std':
+                result = np.sqrt(result)
+
+        return result.reshape(lead_shape + (ngroups, ))
+
 
 class DenseCifti(Cifti):
     """
@@ -264,6 +347,77 @@ class DenseCifti(Cifti):
         else:
             return bm.vertex, self.arr[..., slc]
 
+    def mask(self, mask) -> "DenseCifti":
+        """
+        Selects a subset of the greyordinates
+
+        :param mask: one of
+
+            - (N, ) boolean array selecting greyordinates
+            - 'surface' or 'volume' to select all vertices or voxels
+            - BrainStructure or string like 'CortexLeft' to select a specific structure
+        :return: new DenseCifti with only the selected greyordinates
+        """
+        bm = self.brain_model_axis
+        if isinstance(mask, str) and mask in ('surface', 'volume'):
+            mask = bm.surface_mask if mask == 'surface' else bm.volume_mask
+        elif isinstance(mask, (str, BrainStructure)):
+            if isinstance(mask, str):
+                mask = BrainStructure.from_string(mask)
+            mask = bm.name == mask.cifti
+        mask = np.asarray(mask)
+        if mask.shape != (len(bm), ) or mask.dtype != bool:
+            raise ValueError(f"Mask should be a boolean array of shape ({len(bm)}, )")
+        if not mask.any():
+            raise ValueError("No greyordinates selected by mask")
+        return DenseCifti(self.arr[..., mask], self.axes[:-1] + (bm[mask], ))
+
+    def reduce_structures(self, func='mean', weights=None, chunk_size=default_chunk_size) -> "ParcelCifti":
+        """
+        Reduces the data within each brain structure (e.g., CortexLeft, ThalamusRight)
+
+        :param func: one of 'sum', 'mean', 'var', or 'std'
+        :param weights: optional (N, ) array of non-negative weights for each greyordinate
+        :param chunk_size: number of greyordinates to process at once
+        :return: ParcelCifti with one parcel per brain structure
+        """
+        names = []
+        structures = {}
+        groups = np.full(len(self.brain_model_axis), -1)
+        for name, slc, bm in self.brain_model_axis.iter_structures():
+            if name not in structures:
+                names.append(name)
+                structures[name] = bm
+            else:
+                structures[name] = structures[name] + bm
+            groups[slc] = names.index(name)
+        parcels = cifti2_axes.ParcelsAxis.from_brain_models([(name, structures[name]) for name in names])
+        reduced = self.reduce(groups, func, weights, chunk_size)
+        return ParcelCifti(reduced, self.axes[:-1] + (parcels, ))
+
+    def reduce_parcels(self, parcels: cifti2_axes.ParcelsAxis, func='mean', weights=None,
+                       chunk_size=default_chunk_size) -> "ParcelCifti":
+        """
+        Reduces the data within each parcel
+
+        Greyordinates not covered by any parcel are ignored.
+
+        :param parcels: parcellation defined in the same volume/surface space as the greyordinates
+        :param func: one of 'sum', 'mean', 'var', or 'std'
+        :param weights: optional (N, ) array of non-negative weights for each greyordinate
+        :param chunk_size: number of greyordinates to process at once
+        :return: ParcelCifti with the reduced data for each parcel
+        """
+        groups = _parcel_groups(self.brain_model_axis, parcels)
+        reduced = self.reduce(groups, func, weights, chunk_size)
+        # make sure empty trailing parcels are still represented
+        if reduced.shape[-1] < len(parcels):
+            missing = len(parcels) - reduced.shape[-1]
+            reduced = np.concatenate(
+                (reduced, np.full(reduced.shape[:-1] + (missing, ), np.nan if func != 'sum' else 0.)),
+                axis=-1)
+        return ParcelCifti(reduced, self.axes[:-1] + (parcels, ))
+
 
 class ParcelCifti(Cifti):
     """
@@ -451,6 +605,67 @@ class BrainStructure(object):
         return anatomy
 
 
+def _parcel_groups(bm: cifti2_axes.BrainModelAxis, parcels: cifti2_axes.ParcelsAxis) -> np.ndarray:
+    """
+    Finds which parcel each greyordinate belongs to
+
+    :param bm: greyordinates
+    :param parcels: parcellation
+    :return: (N, ) integer array with the parcel index of each greyordinate (-1 if not in any parcel)
+    """
+    groups = np.full(len(bm), -1)
+
+    volume_mask = bm.volume_mask
+    if volume_mask.any() and any(len(voxels) > 0 for voxels in parcels.voxels):
+        if tuple(parcels.volume_shape) != tuple(bm.volume_shape) or not np.allclose(parcels.affine, bm.affine):
+            raise ValueError("Volume space of parcels does not match that of the greyordinates")
+        lookup = np.full(bm.volume_shape, -1)
+        for idx, voxels in enumerate(parcels.voxels):
+            if (lookup[tuple(voxels.T)] != -1).any():
+                raise ValueError("Duplicate voxels in different parcels")
+            lookup[tuple(voxels.T)] = idx
+        groups[volume_mask] = lookup[tuple(bm.voxel[volume_mask].T)]
+
+    for name, nvertices in parcels.nvertices.items():
+        in_structure = bm.surface_mask & (bm.name == name)
+        if not in_structure.any():
+            continue
+        if bm.nvertices[name] != nvertices:
+            raise ValueError(f"Number of vertices in {name} does not match between parcels and greyordinates")
+        lookup = np.full(nvertices, -1)
+        for idx, vertices in enumerate(parcels.vertices):
+            if name not in vertices:
+                continue
+            if (lookup[vertices[name]] != -1).any():
+                raise ValueError("Duplicate vertices in different parcels")
+            lookup[vertices[name]] = idx
+        groups[in_structure] = lookup[bm.vertex[in_structure]]
+    return groups
+
+
+def reduce_files(filenames, method='reduce', *args, n_jobs=None, **kwargs) -> list:
+    """
+    Applies a reduction to many CIFTI files in parallel
+
+    Each file is loaded as a (memory-mapped) :class:`DenseCifti` or :class:`ParcelCifti`,
+    after which the reduction method is called on it, e.g.::
+
+        means = reduce_files(dtseries_files, 'reduce_parcels', parcels, func='mean', n_jobs=8)
+
+    :param filenames: sequence of CIFTI filenames
+    :param method: name of the reduction method (e.g., 'reduce', 'reduce_structures', 'reduce_parcels')
+    :param args: positional arguments passed on to the method
+    :param n_jobs: maximum number of files processed simultaneously (default: determined by ``concurrent.futures``)
+    :param kwargs: keyword arguments passed on to the method
+    :return: list with the result for each file
+    """
+    def run(filename):
+        return getattr(load(filename), method)(*args, **kwargs)
+
+    with ThreadPoolExecutor(n_jobs) as pool:
+        return list(pool.map(run, filenames))
+
+
 def load(filename, mask_values=(0, np.nan), writable=False) -> Union[DenseCifti, ParcelCifti]:
     """
     Reads CIFTI data from the given file
@@ -44,21 +44,33 @@ The following functions are also available:
      relatedGeometryFiles
      relatedVertexDataFiles
      findReferenceImage
+     scanSubjectDirectory
+     invalidateDirectoryCache
+
+
+The :func:`relatedGeometryFiles`, :func:`relatedVertexDataFiles`,
+:func:`findReferenceImage` and :func:`scanSubjectDirectory` functions all
+share a cache of directory listings, so that each directory is only read
+once, rather than being globbed once per file pattern. A cached listing is
+discarded as soon as the modification time of its directory changes. The
+cache can be cleared explicitly with the :func:`invalidateDirectoryCache`
+function.
 """
 
 
+import os
 import os.path   as op
-import itertools as it
-import              glob
+import              re
+import              time
 import              fnmatch
+import              threading
 import              collections
 
 import numpy              as np
 import nibabel.freesurfer as nibfs
 
-import fsl.utils.path    as fslpath
 import fsl.utils.memoize as memoize
-import fsl.data.image    as fslimage
+import fsl.utils.path    as fslpath
 import fsl.data.mghimage as fslmgh
 import fsl.data.mesh     as fslmesh
 
@@ -126,7 +138,8 @@ class FreesurferMesh(fslmesh.Mesh):
     """
 
 
-    def __init__(self, filename, fixWinding=False, loadAll=False):
+    def __init__(self, filename, fixWinding=False, loadAll=False,
+                 compact=None):
         """Load the given Freesurfer surface file using ``nibabel``.
 
         :arg infile:     A Freesurfer geometry file  (e.g. ``*.pial``).
@@ -137,6 +150,8 @@ class FreesurferMesh(fslmesh.Mesh):
         :arg loadAll:    If ``True``, the ``infile`` directory is scanned
                          for other freesurfer surface files which are then
                          loaded as additional vertex sets.
+
+        :arg compact:    Passed through to :meth:`.Mesh.__init__`.
         """
 
         vertices, indices, meta, comment = nibfs.read_geometry(
@@ -150,7 +165,8 @@ class FreesurferMesh(fslmesh.Mesh):
         fslmesh.Mesh.__init__(self,
                               indices,
                               name=name,
-                              dataSource=filename)
+                              dataSource=filename,
+                              compact=compact)
 
         self.addVertices(vertices, filename, fixWinding=fixWinding)
 
@@ -302,59 +318,174 @@ def loadVertexDataFile(infile):
                          'file type: {}'.format(infile))
 
 
+FILE_TYPES = collections.OrderedDict((
+    ('core',  CORE_GEOMETRY_FILES),
+    ('extra', EXTRA_GEOMETRY_FILES),
+    ('vdata', VERTEX_DATA_FILES),
+    ('mgh',   VERTEX_MGH_FILES),
+    ('label', VERTEX_LABEL_FILES),
+    ('annot', VERTEX_ANNOT_FILES)))
+"""Identifiers for each of the Freesurfer file types recognised by this
+module, and the file patterns associated with each of them. These identifiers
+are used by the :func:`fileType` and :func:`scanSubjectDirectory` functions.
+"""
+
+
 @memoize.memoize
+def _compilePatterns(patterns):
+    """Compiles the given tuple of ``fnmatch``-style file patterns into a
+    single regular expression.
+    """
+    return re.compile('|'.join(fnmatch.translate(p) for p in patterns))
+
+
+_FILE_TYPE_PATTERNS = [(ftype, _compilePatterns(tuple(pats)))
+                       for ftype, pats in FILE_TYPES.items()]
+"""Compiled regular expressions for each of the :attr:`FILE_TYPES`. """
+
+
+@memoize.memoize
+def fileType(infile):
+    """Returns an identifier (one of the keys of :attr:`FILE_TYPES`)
+    describing the type of the given Freesurfer file, or ``None`` if it
+    does not look like a Freesurfer file. Only the file name is used -
+    the file system is not accessed.
+    """
+    infile = op.basename(infile)
+    for ftype, pattern in _FILE_TYPE_PATTERNS:
+        if pattern.match(infile):
+            return ftype
+    return None
+
+
 def isCoreGeometryFile(infile):
     """Returns ``True`` if ``infile`` looks like a core Freesurfer geometry
     file, ``False`` otherwise.
     """
-    infile = op.basename(infile)
-    return any([fnmatch.fnmatch(infile, gf) for gf in CORE_GEOMETRY_FILES])
+    return fileType(infile) == 'core'
 
 
-@memoize.memoize
 def isGeometryFile(infile):
     """Returns ``True`` if ``infile`` looks like a Freesurfer geometry
     file (core or otherwise), ``False`` otherwise.
     """
-    infile = op.basename(infile)
-    return any([fnmatch.fnmatch(infile, gf)
-                for gf in CORE_GEOMETRY_FILES + EXTRA_GEOMETRY_FILES])
+    return fileType(infile) in ('core', 'extra')
 
 
-@memoize.memoize
 def isVertexDataFile(infile):
     """Returns ``True`` if ``infile`` looks like a Freesurfer vertex
     data file, ``False`` otherwise.
     """
-    infile = op.basename(infile)
-    return any([fnmatch.fnmatch(infile, gf) for gf in VERTEX_DATA_FILES])
+    return fileType(infile) == 'vdata'
 
 
-@memoize.memoize
 def isVertexMGHFile(infile):
     """Returns ``True`` if ``infile`` looks like a Freesurfer MGH file
     containing vertex data, ``False`` otherwise.
     """
-    infile = op.basename(infile)
-    return any([fnmatch.fnmatch(infile, gf) for gf in VERTEX_MGH_FILES])
+    return fileType(infile) == 'mgh'
 
 
-@memoize.memoize
 def isVertexLabelFile(infile):
     """Returns ``True`` if ``infile`` looks like a Freesurfer vertex
     label file, ``False`` otherwise.
     """
-    infile = op.basename(infile)
-    return any([fnmatch.fnmatch(infile, gf) for gf in VERTEX_LABEL_FILES])
+    return fileType(infile) == 'label'
 
 
-@memoize.memoize
 def isVertexAnnotFile(infile):
     """Returns ``True`` if ``infile`` looks like a Freesurfer vertex
     annotation file, ``False`` otherwise.
     """
-    infile = op.basename(infile)
-    return any([fnmatch.fnmatch(infile, gf) for gf in VERTEX_ANNOT_FILES])
+    return fileType(infile) == 'annot'
+
+
+DirectoryListing = collections.namedtuple(
+    'DirectoryListing', ('mtime', 'scanned', 'names', 'files'))
+"""Cached contents of a directory, as stored by :func:`listDirectory`. The
+``mtime`` is the directory modification time (in nanoseconds) at the time of
+the scan, ``scanned`` is the time (in nanoseconds) at which the scan took
+place, ``names`` is a sorted tuple containing the names of all entries in the
+directory, and ``files`` is a ``frozenset`` containing the names of all
+regular files.
+"""
+
+
+_directoryCache     = {}
+_directoryCacheLock = threading.Lock()
+
+
+def listDirectory(dirname):
+    """Returns a :attr:`DirectoryListing` containing the contents of the
+    given directory. Listings are cached, and are re-used until the
+    modification time of the directory changes. If ``dirname`` does not
+    exist, or is not a directory, an empty listing is returned.
+    """
+
+    dirname = op.abspath(dirname)
+
+    try:
+        mtime = os.stat(dirname).st_mtime_ns
+    except OSError:
+        return DirectoryListing(None, None, (), frozenset())
+
+    with _directoryCacheLock:
+        listing = _directoryCache.get(dirname)
+
+    if listing is not None                                  and \
+       listing.mtime == mtime                               and \
+       fslpath.isSettled(listing.mtime, listing.scanned):
+        return listing
+
+    scanned = time.time_ns()
+    names   = []
+    files   = set()
+
+    try:
+        with os.scandir(dirname) as entries:
+            for entry in entries:
+                names.append(entry.name)
+                if entry.is_file():
+                    files.add(entry.name)
+    except OSError:
+        return DirectoryListing(None, None, (), frozenset())
+
+    listing = DirectoryListing(mtime, scanned, tuple(sorted(names)),
+                               frozenset(files))
+
+    with _directoryCacheLock:
+        _directoryCache[dirname] = listing
+
+    return listing
+
+
+def invalidateDirectoryCache(dirname=None):
+    """Clears the directory listing cache used by :func:`listDirectory`. If
+    ``dirname`` is provided, only the listing for that directory is cleared.
+    """
+    with _directoryCacheLock:
+        if dirname is None:
+            _directoryCache.clear()
+        else:
+            _directoryCache.pop(op.abspath(dirname), None)
+
+
+def _matchDirectory(dirname, patterns):
+    """Returns the absolute paths to all entries in ``dirname`` which match
+    any of the given ``fnmatch``-style ``patterns``. Matches are ordered by
+    pattern, and then by name. Hidden files are only matched if the pattern
+    explicitly starts with a ``'.'``, as with ``glob``.
+    """
+    dirname = op.abspath(dirname)
+    names   = listDirectory(dirname).names
+    matches = []
+    for pat in patterns:
+        regex  = _compilePatterns((pat,))
+        hidden = pat.startswith('.')
+        matches.extend(op.join(dirname, n) for n in names
+                       if (hidden or not n.startswith('.')) and
+                       regex.match(n))
+    return matches
 
 
 def relatedGeometryFiles(fname):
@@ -369,9 +500,7 @@ def relatedGeometryFiles(fname):
     hemi           = fname[0]
 
     fpats          = [hemi + p[1:] for p in CORE_GEOMETRY_FILES]
-
-    related        = [glob.glob(op.join(dirname, p)) for p in fpats]
-    related        = list(it.chain(*related))
+    related        = _matchDirectory(dirname, fpats)
 
     return [r for r in related if op.basename(r) != fname]
 
@@ -395,17 +524,16 @@ def relatedVertexDataFiles(fname):
     fpats   = [hemi + p[1:] if p.startswith('?h') else p for p in fpats]
 
     basedir    = op.dirname(dirname)
-    searchDirs = set([dirname,
-                      op.join(basedir, 'surf'),
-                      op.join(basedir, 'stats'),
-                      op.join(basedir, 'label')])
-
-    searchPats = it.product(searchDirs, fpats)
+    searchDirs = [dirname,
+                  op.join(basedir, 'surf'),
+                  op.join(basedir, 'stats'),
+                  op.join(basedir, 'label')]
+    searchDirs = list(collections.OrderedDict.fromkeys(searchDirs))
 
     related = []
 
-    for sdir, spat in searchPats:
-        related.extend(glob.glob(op.join(sdir, spat)))
+    for sdir in searchDirs:
+        related.extend(_matchDirectory(sdir, fpats))
 
     return related
 
@@ -416,10 +544,53 @@ def findReferenceImage(fname):
     """
 
     basedir = op.dirname(op.dirname(op.abspath(fname)))
-    t1      = op.join(basedir, 'mri', 'T1.mgz')
-    exts    = fslimage.ALLOWED_EXTENSIONS + fslmgh.ALLOWED_EXTENSIONS
+    return _findReferenceImage(basedir)
 
-    try:
-        return fslpath.addExt(t1, allowedExts=exts, mustExist=True)
-    except fslpath.PathError:
-        return None
+
+def _findReferenceImage(subjdir):
+    """Used by :func:`findReferenceImage` and :func:`scanSubjectDirectory`.
+    Returns the path to ``<subjdir>/mri/T1.mgz`` if it exists, ``None``
+    otherwise.
+    """
+    mridir = op.join(subjdir, 'mri')
+    if 'T1.mgz' in listDirectory(mridir).files:
+        return op.join(mridir, 'T1.mgz')
+    return None
+
+
+def scanSubjectDirectory(subjdir):
+    """Classifies all of the Freesurfer files in a subject directory.
+
+    The ``surf``, ``label``, ``stats`` and ``mri`` sub-directories of
+    ``subjdir`` are each listed once, and every file within them is
+    classified according to the :attr:`FILE_TYPES` patterns.
+
+    :arg subjdir: Freesurfer subject directory (e.g.
+                  ``$SUBJECTS_DIR/bert``).
+
+    :returns:     A dictionary containing the absolute paths of all
+                  recognised files, sorted by name. The dictionary contains
+                  an entry for each of the :attr:`FILE_TYPES` identifiers,
+                  and a ``'reference'`` entry which contains the path to the
+                  volumetric reference image (see
+                  :func:`findReferenceImage`), or ``None``.
+    """
+
+    subjdir = op.abspath(subjdir)
+    files   = collections.OrderedDict((ftype, []) for ftype in FILE_TYPES)
+
+    for sdir in ['surf', 'label', 'stats']:
+        sdir = op.join(subjdir, sdir)
+        for name in listDirectory(sdir).files:
+            if name.startswith('.'):
+                continue
+            ftype = fileType(name)
+            if ftype is not None:
+                files[ftype].append(op.join(sdir, name))
+
+    for ftype in FILE_TYPES:
+        files[ftype] = sorted(files[ftype])
+
+    files['reference'] = _findReferenceImage(subjdir)
+
+    return files
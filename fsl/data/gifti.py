@@ -66,7 +66,7 @@ class GiftiMesh(fslmesh.Mesh):
     """
 
 
-    def __init__(self, infile, fixWinding=False, loadAll=False):
+    def __init__(self, infile, fixWinding=False, loadAll=False, compact=None):
         """Load the given GIFTI file using ``nibabel``, and extracts surface
         data using the  :func:`loadGiftiMesh` function.
 
@@ -85,6 +85,8 @@ class GiftiMesh(fslmesh.Mesh):
                          for other surface files which are then loaded
                          as additional vertex sets.
 
+        :arg compact:    Passed through to :meth:`.Mesh.__init__`.
+
         .. todo:: Allow loading from a ``.topo.gii`` and ``.coord.gii`` file?
                   Maybe.
         """
@@ -97,7 +99,8 @@ class GiftiMesh(fslmesh.Mesh):
         fslmesh.Mesh.__init__(self,
                               indices,
                               name=name,
-                              dataSource=infile)
+                              dataSource=infile,
+                              compact=compact)
 
         for i, v in enumerate(vertices):
             if i == 0: key = infile
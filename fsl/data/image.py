@@ -1202,7 +1202,11 @@ class Image(Nifti):
                     (via the :meth:`__setitem__` method). The indices/
                     slices of the portion of data that was modified is
                     passed to registered listeners as the notification
-                    value (see :meth:`.Notifier.notify`).
+                    value (see :meth:`.Notifier.notify`). Notifications
+                    made within a :meth:`.Notifier.batch` block are
+                    merged into one notification, with a value which
+                    covers all modified slices (see
+                    :func:`mergeSliceObjs`).
 
     ``'saveState'`` This topic is notified whenever the saved state of the
                     image changes (i.e. data or ``voxToWorldMat`` is
@@ -1418,6 +1422,10 @@ class Image(Nifti):
         self.register(self.name, self.__headerChanged, topic='transform')
         self.register(self.name, self.__headerChanged, topic='header')
 
+        # Data notifications made within a
+        # batch() block are merged into one
+        self.coalesce('data', mergeSliceObjs)
+
         # try and load metadata
         # from JSON sidecar files
         if self.dataSource is not None and loadMeta:
@@ -1904,6 +1912,56 @@ def canonicalSliceObj(sliceobj, shape):
         return nib.fileslice.canonical_slicers(sliceobj, shape)
 
 
+def mergeSliceObjs(image, topic, sliceobjs):
+    """Merges the given slice objects into a single slice object which
+    covers all of them - the bounding box of all of the slices. This function
+    is used to coalesce ``'data'`` notifications on an :class:`Image` (see
+    :meth:`.Notifier.coalesce`).
+
+    :arg image:     The :class:`Image`
+    :arg topic:     Notification topic (ignored)
+    :arg sliceobjs: Sequence of slice objects used to modify the image data.
+    :returns:       A tuple of ``slice`` objects.
+    """
+
+    # Slice objects passed to Image.__setitem__
+    # (and hence to data notifications) are in
+    # terms of the image shape, not realShape
+    shape = image.shape
+
+    if len(sliceobjs) == 1:
+        return sliceobjs[0]
+
+    lows  = list(shape)
+    highs = [0] * len(shape)
+
+    for sliceobj in sliceobjs:
+
+        # Fancy slice objects may touch any voxel
+        if isValidFancySliceObj(sliceobj, shape):
+            return tuple(slice(0, s) for s in shape)
+
+        sliceobj = [s for s in canonicalSliceObj(sliceobj, shape)
+                    if s is not None]
+
+        for dim, s in enumerate(sliceobj):
+
+            if isinstance(s, slice):
+                idxs = range(*s.indices(shape[dim]))
+                if len(idxs) == 0:
+                    continue
+                lo = min(idxs[0], idxs[-1])
+                hi = max(idxs[0], idxs[-1]) + 1
+            else:
+                lo = int(s)
+                hi = lo + 1
+
+            lows[ dim] = min(lows[ dim], lo)
+            highs[dim] = max(highs[dim], hi)
+
+    return tuple(slice(lo, max(lo, hi)) for lo, hi in zip(lows, highs))
+
+
 def expectedShape(sliceobj, shape):
     """Given a slice object, and the shape of an array to which
     that slice object is going to be applied, returns the expected
@@ -23,6 +23,7 @@ various things with meshes:
 
      calcFaceNormals
      calcVertexNormals
+     calcAdjacency
      needsFixing
 """
 
@@ -41,6 +42,13 @@ import fsl.transform.affine as affine
 log = logging.getLogger(__name__)
 
 
+COMPACT = False
+"""Default value for the ``compact`` argument to :meth:`Mesh.__init__`. If
+``True``, all ``Mesh`` instances which are created without an explicit
+``compact`` argument will store their data in compact form.
+"""
+
+
 class IncompatibleVerticesError(ValueError):
     """``ValueError`` raised by the :meth:`Mesh.addVertices` method if
     an attempt is made to add a vertex set with the wrong number of
@@ -80,6 +88,10 @@ class Mesh(notifier.Notifier, meta.Meta):
     ``vnormals``   A ``(n, 3)`` array containing vertex normals for the
                    the current vertices.
 
+    ``adjacency``  A tuple containing a vertex-to-triangle adjacency
+                   structure, in compressed sparse row form - see
+                   :func:`calcAdjacency`. This is shared by all vertex sets.
+
     ``trimesh``    (if the `trimesh <https://github.com/mikedh/trimesh>`_
                    library is present) A ``trimesh.Trimesh`` object which
                    can be used for geometric queries on the mesh.
@@ -139,6 +151,17 @@ class Mesh(notifier.Notifier, meta.Meta):
     selected vertex set.
 
 
+    **Compact storage**
+
+
+    By default, a ``Mesh`` stores vertices in whatever data type they are
+    provided in (often ``float64``). If the ``compact`` argument to
+    :meth:`__init__` is ``True`` (or the module-level :attr:`COMPACT` flag is
+    set), vertices, normals and floating point vertex data are stored as
+    C-contiguous ``float32`` arrays, and triangle indices as ``uint32``.
+    Data which is already stored in these types is not copied.
+
+
     **Metadata**
 
 
@@ -158,6 +181,20 @@ class Mesh(notifier.Notifier, meta.Meta):
        rayIntersection
        planeIntersection
        nearestVertex
+
+
+    **Topological queries**
+
+
+    The following methods can be used to query the mesh topology. They
+    use the :attr:`adjacency` structure, which is calculated once, and
+    shared by all vertex sets:
+
+    .. autosummary::
+       :nosignatures:
+
+       vertexTriangles
+       vertexNeighbours
     """
 
 
@@ -166,7 +203,8 @@ class Mesh(notifier.Notifier, meta.Meta):
                  name='mesh',
                  dataSource=None,
                  vertices=None,
-                 fixWinding=False):
+                 fixWinding=False,
+                 compact=None):
         """Create a ``Mesh`` instance.
 
         Before a ``Mesh`` can be used, some vertices must be added via the
@@ -185,14 +223,21 @@ class Mesh(notifier.Notifier, meta.Meta):
 
         :arg fixWinding: Ignored if ``vertices is None``. Passed through to the
                          :meth:`addVertices` method along with ``vertices``.
+
+        :arg compact:    If ``True``, all data is stored as ``float32`` /
+                         ``uint32``. Defaults to :attr:`COMPACT`.
         """
 
         if indices is None and vertices is not None:
             raise ValueError('Indices must be provided '
                              'if vertices are provided')
 
+        if compact is None:
+            compact = COMPACT
+
         self.__name       = name
         self.__dataSource = dataSource
+        self.__compact    = bool(compact)
 
         # nvertices/indices are assigned in the
         # indices setter method.
@@ -209,6 +254,10 @@ class Mesh(notifier.Notifier, meta.Meta):
         self.__fixedIndices = None
         self.__vindices     = collections.OrderedDict()
 
+        # Vertex-to-triangle adjacency, calculated
+        # on first access via the adjacency property
+        self.__adjacency    = None
+
         # All of these are populated
         # in the addVertices method
         self.__selected = None
@@ -273,6 +322,14 @@ class Mesh(notifier.Notifier, meta.Meta):
         return self.__nvertices
 
 
+    @property
+    def compact(self):
+        """Returns ``True`` if this ``Mesh`` stores its data in compact
+        ``float32``/``uint32`` form, ``False`` otherwise.
+        """
+        return self.__compact
+
+
     @property
     def vertices(self):
         """The ``(N, 3)`` vertices of this mesh. """
@@ -314,11 +371,53 @@ class Mesh(notifier.Notifier, meta.Meta):
         if self.__indices is not None:
             raise ValueError('Indices are already set')
 
-        indices          = np.asarray(indices, dtype=np.int32)
+        if self.__compact:
+            indices = np.asarray(indices)
+            # Signed 32 bit indices (e.g. as stored
+            # in GIFTI files) can be re-interpreted
+            # without a copy, as they are never negative
+            if indices.dtype == np.int32 and indices.flags.c_contiguous:
+                indices = indices.view(np.uint32)
+            else:
+                indices = np.ascontiguousarray(indices, dtype=np.uint32)
+        else:
+            indices = np.asarray(indices, dtype=np.int32)
+
         self.__nvertices = int(indices.max()) + 1
         self.__indices   = indices.reshape((-1, 3))
 
 
+    @property
+    def adjacency(self):
+        """A tuple containing ``(offsets, triangles)`` arrays which describe
+        the triangles that each vertex is a member of - the triangles for
+        vertex ``i`` are given by ``triangles[offsets[i]:offsets[i + 1]]``.
+        See :func:`calcAdjacency`. Returns ``None`` if indices have not
+        yet been assigned.
+        """
+        if self.__indices is None:
+            return None
+        if self.__adjacency is None:
+            self.__adjacency = calcAdjacency(self.__indices, self.nvertices)
+        return self.__adjacency
+
+
+    def vertexTriangles(self, ivert):
+        """Returns a ``(k, )`` array containing the indices of all triangles
+        which contain vertex ``ivert``.
+        """
+        offsets, triangles = self.adjacency
+        return triangles[offsets[ivert]:offsets[ivert + 1]]
+
+
+    def vertexNeighbours(self, ivert):
+        """Returns a sorted array containing the indices of all vertices which
+        share an edge with vertex ``ivert``.
+        """
+        neighbours = np.unique(self.__indices[self.vertexTriangles(ivert)])
+        return neighbours[neighbours != ivert]
+
+
     @property
     def normals(self):
         """A ``(M, 3)`` array containing surface normals for every
@@ -331,7 +430,7 @@ class Mesh(notifier.Notifier, meta.Meta):
         fnormals = self.__faceNormals.get(selected, None)
 
         if fnormals is None:
-            fnormals = calcFaceNormals(vertices, indices)
+            fnormals = self.__compactFloat(calcFaceNormals(vertices, indices))
             self.__faceNormals[selected] = fnormals
 
         return fnormals
@@ -350,6 +449,7 @@ class Mesh(notifier.Notifier, meta.Meta):
 
         if vnormals is None:
             vnormals = calcVertexNormals(vertices, indices, self.normals)
+            vnormals = self.__compactFloat(vnormals)
             self.__vertNormals[selected] = vnormals
 
         return vnormals
@@ -429,7 +529,7 @@ class Mesh(notifier.Notifier, meta.Meta):
         if key is None:
             key = 'default'
 
-        vertices = np.asarray(vertices)
+        vertices = self.__compactFloat(np.asarray(vertices))
         lo       = vertices.min(axis=0)
         hi       = vertices.max(axis=0)
 
@@ -450,28 +550,47 @@ class Mesh(notifier.Notifier, meta.Meta):
         self.__loBounds[key] = lo
         self.__hiBounds[key] = hi
 
-        if select:
-            self.vertices = key
-
+        # Any normals cached for a previous
+        # vertex set with the same key are
+        # no longer valid
+        self.__faceNormals.pop(key, None)
+        self.__vertNormals.pop(key, None)
+        self.__trimesh    .pop(key, None)
+
+        # See needsFixing documentation. Face
+        # normals are lazily calculated on
+        # first access - as they are calculated
+        # from the fixed indices, they will
+        # have the correct orientation.
         if fixWinding:
             indices  = self.__indices
-            normals  = calcFaceNormals(vertices, indices)
-            needsFix = needsFixing(vertices, indices, normals, lo, hi)
+            needsFix = needsFixing(vertices, indices, None, lo, hi,
+                                   adjacency=self.adjacency)
 
-            # See needsFixing documentation
             if needsFix:
 
                 if self.__fixedIndices is None:
                     self.__fixedIndices = indices[:, [0, 2, 1]]
 
-                self.__vindices[   key] = self.__fixedIndices
-                self.__faceNormals[key] = normals * -1
-            else:
-                self.__faceNormals[key] = normals
+                self.__vindices[key] = self.__fixedIndices
+
+        if select:
+            self.vertices = key
 
         return vertices
 
 
+    def __compactFloat(self, data):
+        """Used internally. If this ``Mesh`` is compact, and the given
+        array contains floating point data, it is returned as a contiguous
+        ``float32`` array (without a copy if possible). Otherwise the array
+        is returned unmodified.
+        """
+        if self.__compact and np.issubdtype(data.dtype, np.floating):
+            data = np.ascontiguousarray(data, dtype=np.float32)
+        return data
+
+
     def vertexSets(self):
         """Returns a list containing the keys of all vertex sets. """
         return list(self.__vertices.keys())
@@ -519,6 +638,7 @@ class Mesh(notifier.Notifier, meta.Meta):
             raise ValueError('{}: incompatible vertex data '
                              'shape: {}'.format(key, vdata.shape))
 
+        vdata                  = self.__compactFloat(vdata)
         vdata                  = vdata.reshape(nvertices, -1)
         self.__vertexData[key] = vdata
 
@@ -742,25 +862,57 @@ def calcVertexNormals(vertices, indices, fnormals):
                    the mesh.
     """
 
-    vnormals = np.zeros((vertices.shape[0], 3), dtype=float)
+    nvertices = vertices.shape[0]
+    indices   = np.asarray(indices).ravel()
+    fnormals  = np.asarray(fnormals).reshape(-1, 3)
+    vnormals  = np.zeros((nvertices, 3), dtype=float)
 
-    # TODO make fast. I can't figure
-    # out how to use np.add.at to
-    # accumulate the face normals for
-    # each vertex.
-    for i in range(indices.shape[0]):
-
-        v0, v1, v2 = indices[i]
-
-        vnormals[v0, :] += fnormals[i]
-        vnormals[v1, :] += fnormals[i]
-        vnormals[v2, :] += fnormals[i]
+    # Accumulate the normals of all
+    # triangles that each vertex is in
+    for i in range(3):
+        vnormals[:, i] = np.bincount(indices,
+                                     weights=np.repeat(fnormals[:, i], 3),
+                                     minlength=nvertices)
 
     # normalise to unit length
     return affine.normalise(vnormals)
 
 
-def needsFixing(vertices, indices, fnormals, loBounds, hiBounds):
+def calcAdjacency(indices, nvertices=None):
+    """Calculates a vertex-to-triangle adjacency structure for the mesh
+    triangles described by ``indices``, in compressed sparse row (CSR) form.
+
+    :arg indices:   A ``(m, 3)`` array containing the mesh triangles.
+    :arg nvertices: Number of vertices in the mesh. If not provided, is
+                    calculated from ``indices``.
+    :returns:       A tuple containing:
+
+                     - A ``(n + 1, )`` array of ``offsets``
+
+                     - A ``(3 * m, )`` array of ``triangles``, such that the
+                       indices of all triangles which contain vertex ``i``
+                       are given by ``triangles[offsets[i]:offsets[i + 1]]``.
+    """
+
+    indices = np.asarray(indices).ravel()
+
+    if nvertices is None:
+        nvertices = int(indices.max()) + 1
+
+    counts      = np.bincount(indices, minlength=nvertices)
+    offsets     = np.zeros(nvertices + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(counts)
+    triangles   = np.argsort(indices, kind='stable') // 3
+
+    return offsets, triangles.astype(np.int32)
+
+
+def needsFixing(vertices,
+                indices,
+                fnormals,
+                loBounds,
+                hiBounds,
+                adjacency=None):
     """Determines whether the triangle winding order, for the mesh described by
     ``vertices`` and ``indices``, needs to be flipped.
 
@@ -771,14 +923,20 @@ def needsFixing(vertices, indices, fnormals, loBounds, hiBounds):
         indices[:, [1, 2]] = indices[:, [2, 1]]
         fnormals           = fnormals * -1
 
-    :arg vertices: A ``(n, 3)`` array containing the mesh vertices.
-    :arg indices:  A ``(m, 3)`` array containing the mesh triangles.
-    :arg fnormals: A ``(m, 3)`` array containing the face/triangle normals.
-    :arg loBounds: A ``(3, )`` array contaning the low vertex bounds.
-    :arg hiBounds: A ``(3, )`` array contaning the high vertex bounds.
-
-    :returns:      ``True`` if the ``indices`` and ``fnormals`` need to be
-                   adjusted, ``False`` otherwise.
+    :arg vertices:  A ``(n, 3)`` array containing the mesh vertices.
+    :arg indices:   A ``(m, 3)`` array containing the mesh triangles.
+    :arg fnormals:  A ``(m, 3)`` array containing the face/triangle normals.
+                    May be ``None``, in which case normals are only calculated
+                    for the triangles that need to be inspected.
+    :arg loBounds:  A ``(3, )`` array contaning the low vertex bounds.
+    :arg hiBounds:  A ``(3, )`` array contaning the high vertex bounds.
+    :arg adjacency: Vertex-to-triangle adjacency structure, as returned by
+                    :func:`calcAdjacency`. If not provided, the triangles
+                    containing the relevant vertex are found by searching
+                    ``indices``.
+
+    :returns:       ``True`` if the ``indices`` and ``fnormals`` need to be
+                    adjusted, ``False`` otherwise.
     """
 
     # Define a viewpoint which is
@@ -787,15 +945,23 @@ def needsFixing(vertices, indices, fnormals, loBounds, hiBounds):
 
     # Find the nearest vertex
     # to the viewpoint
-    dists = np.sqrt(np.sum((vertices - camera) ** 2, axis=1))
+    dists = np.sum((vertices - camera) ** 2, axis=1)
     ivert = np.argmin(dists)
     vert  = vertices[ivert]
 
     # Get all the triangles
     # that this vertex is in
     # and their face normals
-    itris = np.where(indices == ivert)[0]
-    norms = fnormals[itris, :]
+    if adjacency is not None:
+        offsets, triangles = adjacency
+        itris = triangles[offsets[ivert]:offsets[ivert + 1]]
+    else:
+        itris = np.where(indices == ivert)[0]
+
+    if fnormals is None:
+        norms = calcFaceNormals(vertices, np.asarray(indices)[itris])
+    else:
+        norms = fnormals[itris, :]
 
     # Calculate the angle between each
     # normal, and a vector from the
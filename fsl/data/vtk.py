@@ -54,11 +54,12 @@ class VTKMesh(fslmesh.Mesh):
     """
 
 
-    def __init__(self, infile, fixWinding=False):
+    def __init__(self, infile, fixWinding=False, compact=None):
         """Create a ``VTKMesh``.
 
         :arg infile:     VTK file to load mesh from.
         :arg fixWinding: See the :meth:`.Mesh.addVertices` method.
+        :arg compact:    See the :meth:`.Mesh.__init__` method.
         """
 
         data, lengths, indices = loadVTKPolydataFile(infile)
@@ -74,7 +75,8 @@ class VTKMesh(fslmesh.Mesh):
                               name=name,
                               dataSource=dataSource,
                               vertices=data,
-                              fixWinding=fixWinding)
+                              fixWinding=fixWinding,
+                              compact=compact)
 
 
 def loadVTKPolydataFile(infile):
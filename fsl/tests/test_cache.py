@@ -5,10 +5,15 @@
 # Author: Paul McCarthy <pauldmccarthy@gmail.com>
 #
 
+import os
 import time
+import threading
+
+import numpy  as np
 import pytest
 
 import fsl.utils.cache as cache
+from   fsl.utils.tempdir import tempdir
 
 
 def test_dropOldest():
@@ -165,3 +170,142 @@ def test_accessors():
     assert 1     in c
     assert 2     in c
     assert 3     in c
+
+
+def test_maxbytes():
+    evicted = []
+
+    def onEvict(key, value):
+        evicted.append(key)
+
+    c = cache.Cache(maxsize=None, maxbytes=1000, onEvict=onEvict)
+
+    for i in range(5):
+        c[i] = np.zeros(200, dtype=np.uint8)
+    assert c.nbytes == 1000
+    assert evicted  == []
+
+    c[5] = np.zeros(400, dtype=np.uint8)
+    assert c.nbytes  == 1000
+    assert evicted   == [0, 1]
+    assert list(c.keys()) == [2, 3, 4, 5]
+
+    # replacing an item updates the size
+    c[2] = np.zeros(100, dtype=np.uint8)
+    assert c.nbytes == 900
+
+    # items larger than maxbytes are not stored
+    c[6] = np.zeros(2000, dtype=np.uint8)
+    assert 6 not in c
+    assert evicted == [0, 1, 6]
+    assert c.nbytes == 900
+
+    # custom sizing function
+    c = cache.Cache(maxsize=None, maxbytes=10, sizeof=len)
+    c['a'] = 'abcde'
+    c['b'] = 'abcde'
+    c['c'] = 'a'
+    assert list(c.keys()) == ['b', 'c']
+
+
+def test_stats():
+    evicted = []
+
+    def onEvict(key, value):
+        evicted.append((key, value))
+
+    c = cache.Cache(maxsize=2, onEvict=onEvict)
+
+    c.put('a', 1, expiry=0.1)
+    c.put('b', 2)
+    assert c['a'] == 1
+    assert c['b'] == 2
+    assert c.get('c', None) is None
+    time.sleep(0.2)
+    with pytest.raises(cache.Expired):
+        c['a']
+    c['c'] = 3
+    c['d'] = 4
+
+    assert evicted == [('a', 1), ('b', 2)]
+
+    stats = c.stats()
+    assert stats['hits']      == 2
+    assert stats['misses']    == 2
+    assert stats['expired']   == 1
+    assert stats['evictions'] == 1
+    assert stats['items']     == 2
+
+    assert c.pop('c') == 3
+    assert c.pop('c', 'default') == 'default'
+    with pytest.raises(KeyError):
+        c.pop('c')
+
+
+def test_disk_tier():
+
+    evicted = []
+
+    def onEvict(key, value):
+        evicted.append(key)
+
+    with tempdir():
+        c = cache.Cache(maxsize=2,
+                        lru=True,
+                        onEvict=onEvict,
+                        diskdir='cachedir',
+                        maxdiskbytes=250)
+
+        for i in range(4):
+            c[i] = np.full(100, i, dtype=np.uint8)
+
+        # 0 and 1 have been spilled to disk
+        assert len(os.listdir('cachedir')) == 2
+        assert c.nbytes    == 200
+        assert c.diskbytes == 200
+        assert len(c)      == 4
+        assert 0           in c
+        assert evicted     == []
+
+        # loading 0 from disk moves it back to
+        # memory, and spills the least recently
+        # used item in memory (2) to disk
+        assert np.all(c[0] == 0)
+        assert c.stats()['diskHits'] == 1
+        assert sorted(c.keys()) == [0, 1, 2, 3]
+
+        # the disk tier is full, so the oldest
+        # item on disk (1) is dropped
+        c[4] = np.full(100, 4, dtype=np.uint8)
+        assert evicted   == [1]
+        assert 1 not in c
+        assert sorted(k for k, v in c.items()) == [0, 2, 3, 4]
+        assert all(np.all(v == k) for k, v in c.items())
+
+        c.clear()
+        assert len(c) == 0
+        assert os.listdir('cachedir') == []
+
+
+def test_threadsafe():
+    c      = cache.Cache(maxsize=50, maxbytes=4000, lru=True)
+    errors = []
+
+    def worker(offset):
+        try:
+            for i in range(2000):
+                key    = (offset + i) % 100
+                c[key] = np.zeros(key % 10 + 1, dtype=np.float32)
+                c.get((key * 7) % 100, None)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i * 13,))
+               for i in range(4)]
+    [t.start() for t in threads]
+    [t.join()  for t in threads]
+
+    assert errors == []
+    assert len(c) <= 50
+    assert c.nbytes == sum(v.nbytes for v in c.values())
+    assert c.nbytes <= 4000
@@ -262,3 +262,78 @@ def test_brainstructure():
                     else:
                         assert cifti.BrainStructure.from_string(bst.cifti) == bst
                     assert cifti.BrainStructure.from_string(bst.cifti).secondary is None
+
+
+def test_reduce():
+    bm = volumetric_brain_model() + surface_brain_model()
+    scl = cifti2_axes.ScalarAxis(['A', 'B', 'C'])
+    data = cifti.DenseCifti(gen_data([scl, bm]), [scl, bm])
+    groups = np.random.randint(-1, 4, size=len(bm))
+    weights = np.random.rand(len(bm))
+
+    for chunk_size in (1, 7, len(bm)):
+        res_sum = data.reduce(groups, 'sum', chunk_size=chunk_size)
+        res_mean = data.reduce(groups, 'mean', chunk_size=chunk_size)
+        res_std = data.reduce(groups, 'std', chunk_size=chunk_size)
+        res_wmean = data.reduce(groups, 'mean', weights=weights, chunk_size=chunk_size)
+        assert res_sum.shape == (3, 4)
+        for idx in range(4):
+            sel = groups == idx
+            testing.assert_allclose(res_sum[:, idx], data.arr[:, sel].sum(-1))
+            testing.assert_allclose(res_mean[:, idx], data.arr[:, sel].mean(-1))
+            testing.assert_allclose(res_std[:, idx], data.arr[:, sel].std(-1))
+            testing.assert_allclose(res_wmean[:, idx],
+                                    np.average(data.arr[:, sel], weights=weights[sel], axis=-1))
+
+    # all greyordinates excluded
+    for func in ('sum', 'mean', 'var', 'std'):
+        assert data.reduce(np.full(len(bm), -1), func).shape == (3, 0)
+
+    with testing.assert_raises(ValueError):
+        data.reduce(groups, 'median')
+    with testing.assert_raises(ValueError):
+        data.reduce(groups[1:])
+
+
+def test_reduce_structures():
+    vol_bm = volumetric_brain_model()
+    surf_bm = surface_brain_model()
+    bm = vol_bm + surf_bm
+    data = cifti.DenseCifti(gen_data([None, bm]), [None, bm])
+
+    reduced = data.reduce_structures('mean')
+    assert isinstance(reduced, cifti.ParcelCifti)
+    assert len(reduced.parcel_axis) == 2
+    testing.assert_allclose(reduced.arr[:, 0], data.arr[:, :len(vol_bm)].mean(-1))
+    testing.assert_allclose(reduced.arr[:, 1], data.arr[:, len(vol_bm):].mean(-1))
+
+    surface = data.mask('surface')
+    assert surface.brain_model_axis == surf_bm
+    testing.assert_equal(surface.arr, data.arr[:, len(vol_bm):])
+    cortex = data.mask('cortex')
+    assert cortex.brain_model_axis == surf_bm
+    volume = data.mask('volume')
+    assert volume.brain_model_axis == vol_bm
+
+
+def test_reduce_parcels():
+    vol_parcel, vol_mask = volumetric_parcels(return_mask=True)
+    surf_parcel, surf_mask = surface_parcels(return_mask=True)
+    parcels = vol_parcel + surf_parcel
+    bm = (cifti2_axes.BrainModelAxis.from_mask(np.ones((10, 10, 10), dtype=bool), affine=np.eye(4)) +
+          cifti2_axes.BrainModelAxis.from_mask(np.ones(100, dtype=bool), name='cortex'))
+    data = cifti.DenseCifti(gen_data([None, bm]), [None, bm])
+    vol_data = data.to_image().data
+    surf_data = data.surface('cortex')
+
+    reduced = data.reduce_parcels(parcels, 'sum')
+    assert reduced.parcel_axis == parcels
+    for idx in range(1, 5):
+        testing.assert_allclose(reduced.arr[:, idx - 1], vol_data[vol_mask == idx].sum(0))
+        testing.assert_allclose(reduced.arr[:, idx + 3], surf_data[:, surf_mask == idx].sum(-1))
+
+    with tests.testdir():
+        data.to_cifti(default_axis='series').to_filename('test.dtseries.nii')
+        for res in cifti.reduce_files(['test.dtseries.nii'] * 3, 'reduce_parcels', parcels,
+                                      func='sum', n_jobs=2):
+            testing.assert_allclose(res.arr, reduced.arr, rtol=1e-6)
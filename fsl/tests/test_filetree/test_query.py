@@ -6,6 +6,7 @@
 #
 
 import os
+import time
 import glob
 import shutil
 import os.path as op
@@ -646,3 +647,189 @@ def test_allVariables():
 
         assert qvars  == expqvars
         assert snames == expsnames
+
+
+def test_scan_equivalent_to_glob():
+
+    def globscan(tree):
+        matches = []
+        for template in tree.templates:
+            for variables in tree.get_all_vars(template, glob_vars='all'):
+                filename = tree.update(**variables).get(template)
+                if op.isfile(filename):
+                    matches.append(ftquery.Match(
+                        filename, template, tree, variables))
+        for sub_tree in tree.sub_trees.values():
+            matches.extend(globscan(sub_tree))
+        return matches
+
+    def key(m):
+        return (m.full_name, m.filename, sorted(m.variables.items()))
+
+    tree1 = tw.dedent("""
+    subj-{participant}
+        [ses-{session}]
+            T1w[_run-{run}].nii.gz (T1w)
+            surf
+                ->surface (surf)
+    """)
+    tree2 = tw.dedent("""
+    {hemi}.{space}.gii (surface)
+    """)
+
+    files = [
+        op.join('subj-01', 'T1w.nii.gz'),
+        op.join('subj-01', 'T1w_run-1.nii.gz'),
+        op.join('subj-01', 'surf', 'L.native.gii'),
+        op.join('subj-02', 'ses-1', 'T1w.nii.gz'),
+        op.join('subj-02', 'ses-1', 'surf', 'R.mni.gii'),
+        op.join('subj-02', 'ses-2', 'T1w_run-2.nii.gz'),
+        op.join('subj-03', '.T1w.nii.gz'),
+        op.join('subj-03', 'T1w.nii.gz', 'notafile'),
+        op.join('.subj-04', 'T1w.nii.gz'),
+        op.join('other', 'T1w.nii.gz')]
+
+    with testdir(files):
+        with open('tree1.tree',   'wt') as f: f.write(tree1)
+        with open('surface.tree', 'wt') as f: f.write(tree2)
+
+        tree = filetree.FileTree.read('tree1.tree', '.').partial_fill()
+        exp  = sorted(map(key, globscan(tree)))
+
+        assert len(exp) > 0
+        assert sorted(map(key, ftquery.scan(tree)))             == exp
+        assert sorted(map(key, ftquery.scan(tree, nthreads=4))) == exp
+
+        query = filetree.FileTreeQuery(tree, nthreads=2)
+        assert [m.filename for m in sorted(query.query('T1w', run='2'))] == [
+            op.join('subj-02', 'ses-2', 'T1w_run-2.nii.gz')]
+
+
+def test_scan_index():
+    with _test_data():
+
+        # set modification times in the past,
+        # so directories are not considered to
+        # have been modified while being scanned
+        past = time.time() - 3600
+        for dirpath, _, _ in os.walk('.'):
+            os.utime(dirpath, (past, past))
+
+        tree  = filetree.FileTree.read('_test_tree.tree', '.').partial_fill()
+        index = ftquery.ScanIndex()
+        exp   = ftquery.scan(tree)
+        got   = ftquery.scan(tree, index=index)
+
+        assert sorted(got) == sorted(exp)
+        assert index.changed
+        assert index.key == ftquery.treeKey(tree)
+
+        got = ftquery.scan(tree, index=index)
+        assert sorted(got) == sorted(exp)
+        assert not index.changed
+        assert index.rescanned == 0
+
+        os.remove(op.join('subj-01', 'ses-1', 'T1w.nii.gz'))
+        got = ftquery.scan(tree, index=index)
+        assert index.changed
+        assert index.rescanned == 1
+        assert len(got) == len(exp) - 1
+        assert sorted(got) == sorted(ftquery.scan(tree))
+
+        # a different tree resets the index
+        other = tree.update(participant='01').partial_fill()
+        got   = ftquery.scan(other, index=index)
+        assert index.key == ftquery.treeKey(other)
+        assert sorted(got) == sorted(ftquery.scan(other))
+
+
+def test_query_cache():
+    with _test_data():
+
+        os.mkdir('cache')
+        past = time.time() - 3600
+        for dirpath, _, _ in os.walk('.'):
+            os.utime(dirpath, (past, past))
+
+        tree   = filetree.FileTree.read('_test_tree.tree', '.')
+        query1 = filetree.FileTreeQuery(tree, cachedir='cache')
+        cfile  = op.join('cache', '{}.pkl'.format(
+            ftquery.treeKey(tree.partial_fill())))
+
+        assert op.exists(cfile)
+        mtime = os.stat(cfile).st_mtime_ns
+
+        # unchanged - cache file used
+        # as-is, and not re-written
+        query2 = filetree.FileTreeQuery(tree, cachedir='cache')
+        assert os.stat(cfile).st_mtime_ns == mtime
+        assert sorted(query2.templates) == sorted(query1.templates)
+        assert query2.variables()       == query1.variables()
+        for template in query1.templates:
+            assert [m.filename for m in sorted(query2.query(template))] == \
+                   [m.filename for m in sorted(query1.query(template))]
+
+        # new files are picked up
+        os.mkdir(op.join('subj-04'))
+        with open(op.join('subj-04', 'T1w.nii.gz'), 'wt') as f:
+            f.write('')
+        query3 = filetree.FileTreeQuery(tree, cachedir='cache')
+        assert query3.variables()['participant'] == ['01', '02', '03', '04']
+        assert query3.variables()['session']     == [None, '1', '2']
+        assert [m.filename for m in query3.query('T1w', participant='04')] == \
+               [op.join('subj-04', 'T1w.nii.gz')]
+
+        # corrupt cache files are ignored
+        with open(cfile, 'wt') as f:
+            f.write('garbage')
+        query4 = filetree.FileTreeQuery(tree, cachedir='cache')
+        assert query4.variables() == query3.variables()
+
+
+def test_query_sparse():
+    tree = tw.dedent("""
+    subj-{participant}
+        ses-{session}
+            run-{run}.nii.gz (run)
+    """)
+
+    present = [('01', '1', '1'), ('01', '2', '3'), ('02', '2', '2'),
+               ('03', '1', '1'), ('03', '1', '3')]
+    files   = [op.join('subj-{}'.format(p), 'ses-{}'.format(s),
+                       'run-{}.nii.gz'.format(r)) for p, s, r in present]
+
+    with testdir(files):
+        with open('sparse.tree', 'wt') as f:
+            f.write(tree)
+
+        tree  = filetree.FileTree.read('sparse.tree', '.')
+        query = filetree.FileTreeQuery(tree)
+
+        assert query.axes('run') == ['participant', 'run', 'session']
+
+        # matches are returned in order of
+        # variable values, along each axis
+        got = query.query('run')
+        assert [m.filename for m in got] == [
+            files[0], files[1], files[2], files[3], files[4]]
+        got = query.query('run', run='1')
+        assert [m.filename for m in got] == [files[0], files[3]]
+        got = query.query('run', participant='03', session='1')
+        assert [m.filename for m in got] == [files[3], files[4]]
+        assert query.query('run', participant='02', session='1') == []
+
+        arr = query.query('run', asarray=True)
+        assert arr.shape == (3, 3, 2)
+        for i, j, k in it.product(range(3), range(3), range(2)):
+            key = (query.variables()['participant'][i],
+                   query.variables()['session'][k],
+                   query.variables()['run'][j])
+            if key in present:
+                assert arr[i, j, k].filename == files[present.index(key)]
+            else:
+                assert not isinstance(arr[i, j, k], ftquery.Match)
+
+        arr = query.query('run', asarray=True, participant='03', run='3')
+        assert arr.shape == (1, 1, 2)
+        assert arr[0, 0, 0].filename == files[4]
+        assert not isinstance(arr[0, 0, 1], ftquery.Match)
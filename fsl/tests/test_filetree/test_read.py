@@ -86,6 +86,43 @@ def test_parent_tree():
     same_path(sub0_tree.get('../subvar/basename'), 'subvar_grot')
 
 
+def test_get_many():
+    directory = op.split(__file__)[0]
+    tree = filetree.FileTree.read(op.join(directory, 'parent.tree'))
+    sub0_tree = tree.update(subvar='grot').sub_trees['sub0']
+
+    variables = [{'subvar': 'test'}, {'subvar': 'other'}, {}]
+    assert sub0_tree.get_many('../subvar/basename', variables) == \
+        [sub0_tree.update(**v).get('../subvar/basename') for v in variables]
+    assert sub0_tree.get_many('../subvar/basename', variables, set_parent=False) == \
+        [sub0_tree.update(set_parent=False, **v).get('../subvar/basename') for v in variables]
+    same_path(sub0_tree.get_many('../subvar/basename', variables)[0], 'subvar_test')
+    same_path(sub0_tree.get_many('../subvar/basename', variables, set_parent=False)[0], 'subvar_grot')
+    with pytest.raises(KeyError):
+        tree.get_many('subvar/basename', [{}])
+
+    tree = filetree.FileTree.read(op.join(directory, 'custom.tree'), directory=directory)
+    variables = [{'opt': 'test'}, {'opt': None}, {}]
+    assert tree.get_many('sub_file', variables) == [tree.update(**v).get('sub_file') for v in variables]
+    assert tree.update(opt='test').get_many('sub_file', variables) == \
+        [tree.update(opt='test').update(**v).get('sub_file') for v in variables]
+
+    tree = filetree.FileTree.read('HCP_directory').update(subject='100307')
+    variables = [{'hemi': 'L'}, {'hemi': 'R'}]
+    assert tree.get_many('T1w_32k/white', variables) == \
+        [tree.update(**v).get('T1w_32k/white') for v in variables]
+    sub_tree = tree.sub_trees['T1w_32k']
+    assert sub_tree.get_many('white', variables, set_parent=False) == \
+        [sub_tree.update(set_parent=False, **v).get('white') for v in variables]
+
+    with tempdir():
+        tree = filetree.FileTree.read('eddy', directory='out')
+        fnames = tree.get_many('image', [{'basename': 'a'}, {'basename': 'b'}], make_dir=True)
+        same_path(fnames[0], 'out/a.nii.gz')
+        same_path(fnames[1], 'out/b.nii.gz')
+        assert op.isdir('out')
+
+
 def test_custom_tree():
     directory = op.split(__file__)[0]
     tree = filetree.FileTree.read(op.join(directory, 'custom.tree'), directory=directory)
@@ -34,3 +34,52 @@ def test_multiple_optionals():
     assert {'var': 'test', 'opt1': 'oo', 'opt2': None} == utils.extract_variables('{var}[_f{opt1}][_{opt2}]', 'test_foo')
 
 
+
+
+def test_compiled_matchers():
+    template = utils.Template.parse('sub-{subject}/[ses-{session}]/T1w[_{run}].nii.gz')
+    assert template is utils.Template.parse('sub-{subject}/[ses-{session}]/T1w[_{run}].nii.gz')
+    matchers = template.matchers()
+    assert len(matchers) == 4
+    assert template.matchers() is matchers
+
+    assert {'subject': '01', 'session': 'A', 'run': None} == template.extract_variables('sub-01/ses-A/T1w.nii.gz')
+    assert {'subject': '01', 'session': None, 'run': '2'} == template.extract_variables('sub-01/T1w_2.nii.gz')
+    assert {'subject': '02', 'session': 'A', 'run': '2'} == template.extract_variables(
+        'sub-02/ses-A/T1w_2.nii.gz', known_vars={'subject': '02'})
+    assert template.matchers() is matchers
+
+
+def test_extract_variables_many():
+    template = 'sub-{subject}/[ses-{session}]/T1w.nii.gz'
+    filenames = ['sub-01/ses-A/T1w.nii.gz',
+                 'sub-02/T1w.nii.gz',
+                 'sub-03/other/T1w.nii.gz']
+
+    assert utils.extract_variables_many(template, filenames[:2]) == [
+        {'subject': '01', 'session': 'A'},
+        {'subject': '02', 'session': None}]
+    assert utils.extract_variables_many(template, filenames, ignore_missing=True) == [
+        {'subject': '01', 'session': 'A'},
+        {'subject': '02', 'session': None},
+        None]
+    with pytest.raises(ValueError):
+        utils.extract_variables_many(template, filenames)
+
+    assert utils.extract_variables_many(template, ['sub-01/ses-A/T1w.nii.gz', 'sub-01/T1w.nii.gz'],
+                                        {'subject': '01'}) == [
+        {'subject': '01', 'session': 'A'},
+        {'subject': '01', 'session': None}]
+    assert utils.extract_variables_many(template, filenames[:2]) == \
+        [utils.extract_variables(template, f) for f in filenames[:2]]
+
+
+def test_resolve():
+    assert utils.resolve('{a}[_{b}]_c', {'a': 'x'}) == 'x_c'
+    assert utils.resolve('{a}[_{b}]_c', {'a': 'x', 'b': 'y'}) == 'x_y_c'
+    assert utils.resolve('{a:02d}[_{b}]', {'a': 3}) == '03'
+    # values which are themselves templates are filled in iteratively
+    assert utils.resolve('{a}_{b}', {'a': '{b}', 'b': 'x'}) == 'x_x'
+    assert utils.resolve('{a}[_{c}]', {'a': 'x[_{b}]', 'b': 'y'}) == 'x_y'
+    with pytest.raises(KeyError):
+        utils.resolve('{a}_{b}', {'a': 'x'})
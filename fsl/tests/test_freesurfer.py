@@ -18,6 +18,7 @@ import pytest
 
 import fsl.version         as fslver
 import fsl.data.freesurfer as fslfs
+import fsl.utils.path      as fslpath
 
 from fsl.tests.test_mesh import (CUBE_VERTICES, CUBE_TRIANGLES_CCW)
 
@@ -287,3 +288,72 @@ def test_findReferenceImage():
         os.remove(t1)
 
         assert fslfs.findReferenceImage(surf) is None
+
+
+def test_fileType():
+    assert fslfs.fileType('lh.pial')            == 'core'
+    assert fslfs.fileType('/a/b/rh.white')      == 'core'
+    assert fslfs.fileType('lh.orig.nofix')      == 'extra'
+    assert fslfs.fileType('lh.thickness')       == 'vdata'
+    assert fslfs.fileType('lh.blob.mgz')        == 'mgh'
+    assert fslfs.fileType('lh.what.label')      == 'label'
+    assert fslfs.fileType('lh.aparc.annot')     == 'annot'
+    assert fslfs.fileType('lhthickness')        is None
+    assert fslfs.isGeometryFile('lh.orig.nofix')
+    assert not fslfs.isCoreGeometryFile('lh.orig.nofix')
+
+
+def test_listDirectory_invalidation():
+    with tempdir():
+        touch('lh.pial')
+        touch('lh.white')
+
+        assert sorted(fslfs.relatedGeometryFiles('lh.pial')) == \
+            [op.abspath('lh.white')]
+
+        # listings must be refreshed when the directory changes,
+        # even if it changes within the mtime resolution
+        touch('lh.sphere')
+        assert sorted(fslfs.relatedGeometryFiles('lh.pial')) == \
+            [op.abspath('lh.sphere'), op.abspath('lh.white')]
+
+        # Simulate an old listing - it should be re-used
+        # while the directory mtime is unchanged
+        listing = fslfs.listDirectory('.')
+        fslfs._directoryCache[op.abspath('.')] = listing._replace(
+            scanned=listing.mtime + 10 * fslpath.RACY_INTERVAL,
+            names=('lh.pial',))
+        assert fslfs.relatedGeometryFiles('lh.pial') == []
+
+        fslfs.invalidateDirectoryCache('.')
+        assert len(fslfs.relatedGeometryFiles('lh.pial')) == 2
+
+        assert fslfs.listDirectory('nonexistent').names == ()
+
+
+def test_scanSubjectDirectory():
+    with tempdir():
+        os.mkdir('surf')
+        os.mkdir('label')
+        os.mkdir('mri')
+        for f in ['lh.pial', 'rh.pial', 'lh.orig.nofix', 'lh.thickness',
+                  'lh.blob.mgz', 'README']:
+            touch(op.join('surf', f))
+        touch(op.join('label', 'lh.aparc.annot'))
+        touch(op.join('label', 'lh.cortex.label'))
+
+        def a(paths):
+            return [op.abspath(p) for p in paths]
+
+        files = fslfs.scanSubjectDirectory('.')
+        assert files['core']      == a(['surf/lh.pial', 'surf/rh.pial'])
+        assert files['extra']     == a(['surf/lh.orig.nofix'])
+        assert files['vdata']     == a(['surf/lh.thickness'])
+        assert files['mgh']       == a(['surf/lh.blob.mgz'])
+        assert files['annot']     == a(['label/lh.aparc.annot'])
+        assert files['label']     == a(['label/lh.cortex.label'])
+        assert files['reference'] is None
+
+        touch(op.join('mri', 'T1.mgz'))
+        assert fslfs.scanSubjectDirectory('.')['reference'] == \
+            op.abspath(op.join('mri', 'T1.mgz'))
@@ -1365,3 +1365,13 @@ def test_winpath():
         assert fslpath.winpath("/home/fsl/myfile.dat") == '\\\\wsl$\\my cool linux distro v2.0\\home\\fsl\\myfile.dat'
     with mock.patch.dict('os.environ', **{ 'FSLDIR' : '/opt/fsl'}):
         assert fslpath.winpath("/home/fsl/myfile.dat") == '/home/fsl/myfile.dat'
+
+
+def test_isSettled():
+    interval = fslpath.RACY_INTERVAL
+    assert     fslpath.isSettled(0, interval + 1)
+    assert not fslpath.isSettled(0, interval)
+    with tempfile.NamedTemporaryFile() as f:
+        mtime = os.stat(f.name).st_mtime_ns
+        assert not fslpath.isSettled(mtime)
+        assert     fslpath.isSettled(mtime - 2 * interval)
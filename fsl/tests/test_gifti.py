@@ -41,6 +41,19 @@ def test_GiftiMesh_create():
     assert np.all(np.isclose(maxbounds, maxb))
 
 
+def test_GiftiMesh_create_compact():
+
+    testdir  = op.join(op.dirname(__file__), 'testdata')
+    testfile = op.join(testdir, 'example.surf.gii')
+    surf     = gifti.GiftiMesh(testfile, compact=True)
+    ref      = gifti.GiftiMesh(testfile)
+
+    assert surf.vertices.dtype == np.float32
+    assert surf.indices.dtype  == np.uint32
+    assert np.all(np.isclose(surf.vertices, ref.vertices))
+    assert np.all(surf.indices == ref.indices)
+
+
 def test_GiftiMesh_create_loadAll():
 
     testdir  = op.join(op.dirname(__file__), 'testdata')
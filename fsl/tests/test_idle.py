@@ -560,6 +560,91 @@ def _test_wait():
         assert waittaskcalled[0]
 
 
+def test_IdleLoop_runPending():
+
+    # Drive an IdleLoop headlessly - with
+    # _haveGui patched, tasks are queued,
+    # and we run them via runPending
+    loop   = idle.IdleLoop()
+    called = []
+
+    def task(i):
+        time.sleep(0.002)
+        called.append(i)
+
+    with mock.patch('fsl.utils.idle._haveGui', return_value=True):
+
+        for i in range(50):
+            loop.idle(task, i)
+
+        assert called == []
+        assert loop.metrics()['queued'] == 50
+
+        # Time budget is respected, but at
+        # least one task is always run
+        assert loop.runPending(budget=20)
+        assert 0 < len(called) < 50
+        assert loop.runPending(budget=0)
+        nrun = len(called)
+
+        while loop.runPending(budget=20):
+            pass
+
+        assert called == list(range(50))
+        assert nrun < 50
+
+        metrics = loop.metrics()
+        assert metrics['tasks']       == 50
+        assert metrics['queued']      == 0
+        assert metrics['calls']       >= 3
+        assert metrics['maxLatency']  >= metrics['meanLatency'] > 0
+
+        loop.resetMetrics()
+        assert loop.metrics()['tasks'] == 0
+
+
+def test_IdleLoop_delayed():
+
+    loop   = idle.IdleLoop()
+    called = []
+
+    def task(name):
+        called.append(name)
+
+    with mock.patch('fsl.utils.idle._haveGui', return_value=True):
+
+        loop.idle(task, 'a',      after=0.4)
+        loop.idle(task, 'b',      after=0.2)
+        loop.idle(task, 'c')
+        loop.idle(task, 'd',      after=0.2, name='d')
+        loop.idle(task, 'e',      after=5,   timeout=0.1)
+        loop.idle(task, 'd2',     after=0.2, name='d', dropIfQueued=True)
+
+        assert loop.inIdle('d')
+        assert loop.metrics()['delayed'] == 5
+
+        # only the task without a delay is due
+        assert not loop.runPending()
+        assert called == ['c']
+
+        time.sleep(0.25)
+        loop.runPending()
+        assert called == ['c', 'b', 'd2']
+        assert not loop.inIdle('d')
+
+        time.sleep(0.2)
+        loop.runPending()
+        assert called == ['c', 'b', 'd2', 'a']
+
+        metrics = loop.metrics()
+        assert metrics['tasks']   == 4
+        assert metrics['dropped'] == 1
+        assert metrics['delayed'] == 1
+
+        loop.reset()
+        assert loop.metrics()['delayed'] == 0
+
+
 def test_TaskThread():
 
     called = [False]
@@ -719,6 +804,132 @@ def test_TaskThread_TaskVeto():
     assert not onFinishCalled[0]
 
 
+def test_TaskPool():
+
+    called = []
+    lock   = threading.Lock()
+
+    def task(i):
+        time.sleep(0.1)
+        with lock:
+            called.append(i)
+
+    pool = idle.TaskPool(4)
+    pool.start()
+
+    start = time.time()
+    for i in range(8):
+        pool.enqueue(task, i, taskName=i)
+    pool.waitUntilIdle()
+    elapsed = time.time() - start
+
+    pool.stop()
+    pool.join()
+
+    assert sorted(called) == list(range(8))
+    assert elapsed < 0.7
+    assert not pool.is_alive()
+
+    stats = pool.stats()
+    assert stats['enqueued']  == 8
+    assert stats['completed'] == 8
+    assert stats['failed']    == 0
+    assert stats['queued']    == 0
+    assert stats['runTime']   >= 0.8
+    assert len(pool.history()) == 8
+
+
+def test_TaskPool_priority_coalesce():
+
+    called = []
+    block  = threading.Event()
+
+    def busyTask():
+        block.wait()
+
+    def task(name):
+        called.append(name)
+
+    pool = idle.TaskPool(1)
+    pool.start()
+
+    # block the only worker while we fill the queue
+    pool.enqueue(busyTask)
+    time.sleep(0.1)
+
+    pool.enqueue(task, 'low1',  taskName='low1',  priority=10)
+    pool.enqueue(task, 'read1', taskName='read1', coalesce='read')
+    pool.enqueue(task, 'high',  taskName='high',  priority=-1)
+    pool.enqueue(task, 'read2', taskName='read2', coalesce='read')
+    pool.enqueue(task, 'low2',  taskName='low2',  priority=10)
+    pool.enqueue(task, 'drop',  taskName='drop',  priority=10)
+    pool.enqueue(task, 'gone',  taskName='gone',  priority=20)
+
+    assert not pool.isQueued('read1')
+    assert     pool.isQueued('read2')
+
+    pool.dequeue('drop')
+    assert not pool.isQueued('drop')
+
+    block.set()
+    time.sleep(0.1)
+    pool.waitUntilIdle()
+
+    # clear cancels everything that is queued
+    block.clear()
+    pool.enqueue(busyTask)
+    time.sleep(0.1)
+    pool.enqueue(task, 'x', taskName='x')
+    pool.enqueue(task, 'y', taskName='y')
+    pool.clear()
+    block.set()
+    pool.waitUntilIdle()
+
+    pool.stop()
+    pool.join()
+
+    assert called == ['high', 'read2', 'low1', 'low2', 'gone']
+
+    stats = pool.stats()
+    assert stats['coalesced'] == 1
+    assert stats['cancelled'] == 3
+    assert stats['completed'] == 7
+
+
+def test_TaskPool_onFinish_onError():
+
+    finished = [False]
+    errored  = [None]
+
+    def good():
+        pass
+
+    def bad():
+        raise Exception('Task error')
+
+    def onFinish():
+        finished[0] = True
+
+    def onError(e):
+        errored[0] = str(e)
+
+    pool = idle.TaskPool(2)
+    pool.start()
+
+    pool.enqueue(good, onFinish=onFinish)
+    pool.enqueue(bad,  onError=onError)
+    pool.waitUntilIdle()
+    _wait_for_idle_loop_to_clear()
+
+    pool.stop()
+    pool.join()
+
+    assert finished[0]
+    assert errored[0] == 'Task error'
+    assert pool.stats()['failed'] == 1
+    assert sorted(h[3] for h in pool.history()) == [False, True]
+
+
 def test_mutex():
 
     class Thing(object):
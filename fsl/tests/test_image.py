@@ -1025,6 +1025,64 @@ def _test_Image_changeData(imgtype):
         img = None
 
 
+def test_Image_changeData_batch():
+
+    img      = fslimage.Image(np.zeros((10, 10, 10, 3)))
+    notified = []
+
+    def onData(i, topic, value):
+        notified.append(value)
+
+    img.register('name', onData, 'data')
+
+    # slice-by-slice writes are merged
+    # into a single notification
+    with img.batch():
+        for z in range(2, 5):
+            img[:, :, z, 1] = z
+        img[1, 8, 3, 0] = 1
+        assert notified == []
+
+    assert notified == [(slice(0, 10), slice(0, 10), slice(2, 5), slice(0, 2))]
+    assert np.all(img[:, :, 2:5, 1] == [2, 3, 4])
+
+    # a single write is passed through as-is
+    notified.clear()
+    with img.batch():
+        img[2, 3, 4, 0] = 5
+    assert notified == [(2, 3, 4, 0)]
+
+    notified.clear()
+    with img.batch():
+        img[0, 0, 0, 0] = 1
+        img[img.data > 4] = 6
+    assert notified == [tuple(slice(0, s) for s in img.shape)]
+
+
+def test_Image_changeData_batch_shape():
+
+    # merged notifications must be in terms
+    # of the image shape, like unbatched ones
+    for shape in [(10, 10), (4, 4, 4, 1)]:
+        img      = fslimage.Image(np.zeros(shape))
+        notified = []
+
+        def onData(i, topic, value):
+            notified.append(value)
+
+        img.register('name', onData, 'data')
+
+        img[1, 2, 0] = 1
+        with img.batch():
+            img[1, 2, 0] = 1
+            img[3, 1, 0] = 1
+
+        ndims = len(img.shape)
+        assert len(notified[0]) == ndims
+        assert len(notified[1]) == ndims
+        assert notified[1] == (slice(1, 4), slice(1, 3), slice(0, 1))
+
+
 def  test_Image_2D_analyze(): _test_Image_2D(0)
 def  test_Image_2D_nifti1():  _test_Image_2D(1)
 def  test_Image_2D_nifti2():  _test_Image_2D(2)
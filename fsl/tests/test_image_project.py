@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+#
+# test_image_project.py -
+#
+# Author: Paul McCarthy <pauldmccarthy@gmail.com>
+#
+
+
+import numpy as np
+
+import pytest
+
+import fsl.data.image        as fslimage
+import fsl.data.mesh         as fslmesh
+import fsl.transform.affine  as affine
+from   fsl.utils.image import project
+
+from fsl.tests.test_mesh import CUBE_VERTICES, CUBE_TRIANGLES_CCW
+
+
+def test_samplingWeights():
+
+    shape = (10, 11, 12)
+    xform = affine.scaleOffsetXform((2, 2, 2), (-10, -10, -10))
+    img   = fslimage.Image(np.zeros(shape), xform=xform)
+
+    # vertices at voxel centres, half-way
+    # between voxels, and outside the FOV
+    voxels = np.array([[1,   2,   3],
+                       [1.5, 2,   3],
+                       [1.5, 2.5, 3.5],
+                       [50,  50,  50]])
+    verts  = affine.transform(voxels, xform)
+
+    weights = project.samplingWeights(img, verts, usecache=False).toarray()
+
+    assert weights.shape == (4, np.prod(shape))
+    assert np.isclose(weights[0, np.ravel_multi_index((1, 2, 3), shape)], 1)
+    assert np.isclose(weights[1, np.ravel_multi_index((1, 2, 3), shape)], 0.5)
+    assert np.isclose(weights[1, np.ravel_multi_index((2, 2, 3), shape)], 0.5)
+    assert np.isclose(weights[2].sum(), 1)
+    assert np.count_nonzero(weights[2]) == 8
+    assert np.all(weights[3] == 0)
+
+    # cached weights are re-used
+    w1 = project.samplingWeights(img, verts)
+    w2 = project.samplingWeights(img, verts)
+    assert w1 is w2
+
+    # chunked calculation gives the same result
+    w3 = project.samplingWeights(img, verts, chunksize=1, njobs=2,
+                                 usecache=False)
+    assert np.all(np.isclose(w3.toarray(), weights))
+
+
+def test_volumeToSurface():
+
+    shape = (10, 10, 10, 7)
+    data  = np.random.random(shape)
+    img   = fslimage.Image(data)
+
+    # sample at voxel centres
+    voxels = np.random.randint(0, 10, (50, 3))
+    verts  = affine.transform(voxels, img.voxToWorldMat)
+    result = project.volumeToSurface(img, verts, chunksize=3, njobs=2)
+
+    assert result.shape == (50, 7)
+    assert np.all(np.isclose(result, data[tuple(voxels.T)]))
+
+    # 3D data
+    result = project.volumeToSurface(img, verts, data=data[..., 0])
+    assert result.shape == (50, )
+    assert np.all(np.isclose(result, data[tuple(voxels.T) + (0,)]))
+
+    # trilinear sampling of a linear
+    # gradient is exact
+    grad   = np.arange(10)[:, None, None] * np.ones((10, 10, 10))
+    coords = np.random.random((50, 3)) * 9
+    verts  = affine.transform(coords, img.voxToWorldMat)
+    result = project.volumeToSurface(fslimage.Image(grad), verts)
+    assert np.all(np.isclose(result, coords[:, 0]))
+
+    with pytest.raises(ValueError):
+        project.volumeToSurface(img, verts, data=np.zeros((5, 5, 5)))
+
+
+def test_ribbon():
+
+    grad  = np.arange(10)[:, None, None] * np.ones((10, 10, 10))
+    img   = fslimage.Image(grad)
+    inner = np.array([[2, 5, 5], [4, 5, 5]], dtype=float)
+    outer = inner + [4, 0, 0]
+
+    result = project.volumeToSurface(img, inner, outer=outer, nsteps=5)
+    assert np.all(np.isclose(result, [4, 6]))
+
+    with pytest.raises(ValueError):
+        project.samplingWeights(img, inner, outer=outer[:1])
+
+
+def test_mesh_and_surfaceToVolume():
+
+    img   = fslimage.Image(np.zeros((10, 10, 10)))
+    vox   = np.array(CUBE_VERTICES, dtype=int) * 2 + 4
+    verts = affine.transform(vox, img.voxToWorldMat)
+    mesh  = fslmesh.Mesh(np.array(CUBE_TRIANGLES_CCW), vertices=verts)
+    proj  = project.Projector(img, mesh)
+    vdata = np.arange(8, dtype=float)
+
+    vol = proj.surfaceToVolume(vdata, fill=-1)
+    assert vol.shape == (10, 10, 10)
+    for v, val in zip(vox, vdata):
+        assert np.isclose(vol[tuple(v)], val)
+    assert (vol == -1).sum() == 1000 - 8
+
+    # round trip
+    assert np.all(np.isclose(proj.volumeToSurface(vol), vdata))
+
+    vol = proj.surfaceToVolume(np.stack([vdata, vdata * 2], axis=1))
+    assert vol.shape == (10, 10, 10, 2)
+
+    with pytest.raises(ValueError):
+        proj.surfaceToVolume(vdata[:4])
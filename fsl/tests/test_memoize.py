@@ -10,6 +10,7 @@ import collections
 import numpy as np
 
 import fsl.utils.memoize as memoize
+import fsl.utils.cache   as cache
 
 
 def test_memoize():
@@ -116,6 +117,33 @@ def test_memoize_invalidate():
 
 
 
+def test_memoize_cache():
+
+    timesCalled = [0]
+    store       = cache.Cache(maxsize=2)
+
+    @memoize.memoize(cache=store)
+    def func(arg):
+        timesCalled[0] += 1
+        return arg * 2
+
+    assert [func(i) for i in (1, 2, 1, 2)] == [2, 4, 2, 4]
+    assert timesCalled[0] == 2
+    assert len(store)     == 2
+
+    # oldest value is dropped from the cache
+    func(3)
+    func(1)
+    assert timesCalled[0] == 4
+
+    func.invalidate(1)
+    func(1)
+    assert timesCalled[0] == 5
+
+    func.invalidate()
+    assert len(store) == 0
+
+
 def test_memoizeMD5():
     timesCalled = [0]
 
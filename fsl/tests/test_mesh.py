@@ -286,6 +286,71 @@ def test_needsFixing():
     blo      = verts.min(axis=0)
     bhi      = verts.max(axis=0)
     assert not fslmesh.needsFixing(verts, tris, fnormals, blo, bhi)
+    assert not fslmesh.needsFixing(verts, tris, None, blo, bhi,
+                                   fslmesh.calcAdjacency(tris))
+
+
+def test_adjacency():
+
+    verts = np.array(CUBE_VERTICES)
+    tris  = np.array(CUBE_TRIANGLES_CCW)
+    mesh  = fslmesh.Mesh(tris, vertices=verts)
+
+    offsets, triangles = mesh.adjacency
+    assert offsets.shape   == (8 + 1, )
+    assert triangles.shape == (tris.size, )
+    assert mesh.adjacency[0] is offsets
+
+    for i in range(8):
+        exptris  = np.where((tris == i).any(axis=1))[0]
+        expneigh = np.unique(tris[exptris])
+        expneigh = expneigh[expneigh != i]
+        assert np.all(np.sort(mesh.vertexTriangles(i)) == exptris)
+        assert np.all(mesh.vertexNeighbours(i) == expneigh)
+
+    # adjacency is shared across vertex sets
+    mesh.addVertices(verts * 2, 'big')
+    assert mesh.adjacency[1] is triangles
+
+
+def test_compact():
+
+    verts    = np.array(CUBE_VERTICES, dtype=np.float64)
+    tris     = np.array(CUBE_TRIANGLES_CW)
+    fnormals = np.array(CUBE_CCW_FACE_NORMALS)
+    vdata    = np.random.random(8)
+
+    mesh = fslmesh.Mesh(tris, vertices=verts, fixWinding=True, compact=True)
+    mesh.addVertexData('vdata', vdata)
+    mesh.addVertexData('labels', np.arange(8))
+
+    assert mesh.compact
+    assert mesh.vertices.dtype                 == np.float32
+    assert mesh.indices .dtype                 == np.uint32
+    assert mesh.normals .dtype                 == np.float32
+    assert mesh.vnormals.dtype                 == np.float32
+    assert mesh.getVertexData('vdata').dtype   == np.float32
+    assert mesh.getVertexData('labels').dtype  == np.arange(8).dtype
+    assert mesh.vertices.flags.c_contiguous
+    assert np.all(np.isclose(mesh.vertices, verts))
+    assert np.all(np.isclose(mesh.normals,  fnormals))
+    assert np.all(mesh.indices == np.array(CUBE_TRIANGLES_CCW))
+
+    # float32/int32 inputs should not be copied
+    verts32 = verts.astype(np.float32)
+    tris32  = tris.astype(np.int32)
+    mesh    = fslmesh.Mesh(tris32, vertices=verts32, compact=True)
+    assert np.shares_memory(mesh.vertices, verts32)
+    assert np.shares_memory(mesh.indices,  tris32)
+
+    # default is taken from the COMPACT flag
+    assert not fslmesh.Mesh(tris, vertices=verts).compact
+    old = fslmesh.COMPACT
+    try:
+        fslmesh.COMPACT = True
+        assert fslmesh.Mesh(tris, vertices=verts).compact
+    finally:
+        fslmesh.COMPACT = old
 
 
 def test_trimesh_no_trimesh():
@@ -6,6 +6,8 @@
 #
 
 
+import threading
+
 import pytest
 
 import fsl.utils.notifier as notifier
@@ -209,6 +211,131 @@ def test_skip():
 # Make sure there is no error
 # if a callback function is GC'd
 # fsl/fslpy!470
+def test_batch():
+
+    class Thing(notifier.Notifier):
+        pass
+
+    t = Thing()
+
+    default_called = []
+    topic_called   = []
+
+    def default_callback(thing, topic, value):
+        default_called.append((topic, value))
+
+    def topic_callback(thing, topic, value):
+        topic_called.append((topic, value))
+
+    def merge(thing, topic, values):
+        assert thing is t
+        return sum(values)
+
+    t.register('default_callback', default_callback)
+    t.register('topic_callback',   topic_callback, topic='topic')
+    t.coalesce('topic', merge)
+    t.coalesce(None)
+
+    assert t.isCoalesced('topic')
+    assert not t.isCoalesced('other')
+
+    with t.batch():
+        t.notify(topic='topic', value=1)
+        t.notify(value='a')
+        t.notify(topic='other', value='x')
+        with t.batch():
+            t.notify(topic='topic', value=2)
+            t.notify(value='b')
+            t.notify(topic='other', value='y')
+        assert default_called == []
+        assert topic_called   == []
+        t.notify(topic='topic', value=3)
+
+    assert topic_called   == [('topic', 6)]
+    # coalesced topics are delivered at
+    # the position of their last occurrence
+    assert default_called == [('other', 'x'),
+                              (None,   'b'),
+                              ('other', 'y'),
+                              ('topic', 6)]
+
+    # notifications are delivered normally outside of a batch
+    default_called.clear()
+    topic_called  .clear()
+    t.uncoalesce('topic')
+    t.notify(topic='topic', value=1)
+    with t.batch():
+        t.notify(topic='topic', value=2)
+        t.notify(topic='topic', value=3)
+    assert topic_called == [('topic', 1), ('topic', 2), ('topic', 3)]
+
+    # non-coalesced notifications are
+    # delivered in the order they were made
+    default_called.clear()
+    t.uncoalesce(None)
+    with t.batch():
+        t.notify(topic='a', value=1)
+        t.notify(topic='b', value=2)
+        t.notify(topic='a', value=3)
+    assert default_called == [('a', 1), ('b', 2), ('a', 3)]
+
+
+def test_batch_threads():
+
+    class Thing(notifier.Notifier):
+        pass
+
+    t      = Thing()
+    called = []
+
+    def callback(thing, topic, value):
+        called.append((threading.get_ident(), value))
+
+    t.register('callback', callback)
+
+    # notifications from other threads are not
+    # deferred into this thread's batch
+    def notify():
+        t.notify(value='thread')
+
+    with t.batch():
+        t.notify(value='batch')
+        thread = threading.Thread(target=notify)
+        thread.start()
+        thread.join()
+        assert called == [(thread.ident, 'thread')]
+
+    assert called == [(thread.ident,          'thread'),
+                      (threading.get_ident(), 'batch')]
+
+
+def test_listener_cache():
+
+    class Thing(notifier.Notifier):
+        pass
+
+    t      = Thing()
+    called = []
+
+    def callback1():
+        called.append(1)
+
+    def callback2():
+        called.append(2)
+
+    t.register('callback1', callback1, topic='topic')
+    t.notify(topic='topic')
+    t.register('callback2', callback2, topic='topic')
+    t.notify(topic='topic')
+    t.disableAll('topic')
+    t.notify(topic='topic')
+    t.enableAll('topic')
+    t.deregister('callback1', topic='topic')
+    t.notify(topic='topic')
+
+    assert called == [1, 1, 2, 2]
+
+
 def test_gc():
 
     class Thing(notifier.Notifier):
@@ -6,14 +6,18 @@
 #
 
 
-import os.path    as op
-import               os
-import               shutil
-import               threading
-import               time
-import               shlex
-import subprocess as sp
-import textwrap   as tw
+import os.path            as op
+import                       io
+import                       asyncio
+import                       os
+import                       shutil
+import                       threading
+import                       time
+import                       shlex
+import                       glob
+import subprocess         as sp
+import concurrent.futures as futures
+import textwrap           as tw
 
 from unittest import mock
 
@@ -428,6 +432,56 @@ def test_run_streams():
         assert gotstdout == [expstdout]
         assert gotstderr == [expstderr]
 
+        # in-memory binary and text streams
+        bstdout = io.BytesIO()
+        tstderr = io.StringIO()
+        stdout, stderr = run.run('./script.sh',
+                                 stderr=True,
+                                 log={'stdout' : bstdout,
+                                      'stderr' : tstderr})
+        assert stdout             == expstdout
+        assert stderr             == expstderr
+        assert bstdout.getvalue() == expstdout.encode()
+        assert tstderr.getvalue() == expstderr
+
+
+def test_run_large_output():
+
+    # > pipe buffer size, with a multi-byte
+    # character straddling chunk boundaries
+    test_script = tw.dedent("""
+    #!/usr/bin/env python
+    import sys
+    sys.stdout.write('\u00e9' * 100000)
+    sys.stderr.write('x' * 100000)
+    """).strip()
+
+    expstdout = '\u00e9' * 100000
+    expstderr = 'x' * 100000
+
+    with tempdir.tempdir():
+        mkexec('script.py', test_script)
+
+        for canSelect in [True, False]:
+            with mock.patch('fsl.utils.run._canSelect',
+                            return_value=canSelect):
+
+                stdout, stderr = run.run('./script.py', stderr=True,
+                                         log={'tee' : False})
+                assert stdout == expstdout
+                assert stderr == expstderr
+
+                with open('my_stdout', 'wt') as outf, \
+                     open('my_stderr', 'wb') as errf:
+                    stdout, stderr = run.run('./script.py', stderr=True,
+                                             log={'tee'    : False,
+                                                  'stdout' : outf,
+                                                  'stderr' : errf})
+
+                assert stdout                         == expstdout
+                assert stderr                         == expstderr
+                assert open('my_stdout', 'rt').read() == expstdout
+                assert open('my_stderr', 'rt').read() == expstderr
 
 
 def test_run_logcmd():
@@ -469,6 +523,335 @@ def test_run_logcmd():
         assert logged[1] == expcmd
 
 
+def test_arun():
+
+    test_script = tw.dedent("""
+    #!/bin/bash
+
+    echo "standard output - arguments: $@"
+    echo "standard error" >&2
+    exit {}
+    """).strip()
+
+    expstdout = "standard output - arguments: 1 2 3\n"
+    expstderr = "standard error\n"
+
+    with tempdir.tempdir():
+        mkexec('script.sh', test_script.format(0))
+
+        capture = CaptureStdout()
+        with capture:
+            stdout = asyncio.run(run.arun('./script.sh 1 2 3'))
+        assert stdout         == expstdout
+        assert capture.stdout == expstdout
+        assert capture.stderr == expstderr
+
+        gotstderr = []
+        with open('my_stdout', 'wt') as logf, capture.reset():
+            stdout, stderr, ret = asyncio.run(run.arun(
+                './script.sh', '1', '2', '3',
+                stderr=True,
+                exitcode=True,
+                log={'tee'    : False,
+                     'cmd'    : logf,
+                     'stdout' : logf,
+                     'stderr' : gotstderr.append}))
+
+        assert (stdout, stderr, ret) == (expstdout, expstderr, 0)
+        assert capture.stdout == ''
+        assert gotstderr      == [expstderr]
+        assert open('my_stdout', 'rt').read() == \
+            './script.sh 1 2 3\n' + expstdout
+
+        mkexec('script.sh', test_script.format(255))
+        with pytest.raises(RuntimeError):
+            asyncio.run(run.arun('./script.sh 1 2 3', silent=True))
+
+        stdout, ret = asyncio.run(run.arun('./script.sh 1 2 3', silent=True,
+                                           exitcode=True))
+        assert stdout == expstdout
+        assert ret    == 255
+
+        assert asyncio.run(run.arun('./script.sh 1 2', cmdonly=True)) == \
+            ['./script.sh', '1', '2']
+
+
+def test_arun_limit():
+
+    test_script = tw.dedent("""
+    #!/bin/bash
+    touch "running_$1"
+    sleep 0.5
+    ls running_* | wc -l
+    rm "running_$1"
+    """).strip()
+
+    async def runall(n, **kwargs):
+        return await asyncio.gather(*[run.arun('./script.sh', str(i),
+                                               silent=True, **kwargs)
+                                      for i in range(n)])
+
+    with tempdir.tempdir():
+        mkexec('script.sh', test_script)
+
+        async def withsemaphore():
+            return await runall(6, semaphore=asyncio.Semaphore(2))
+
+        assert max(int(r) for r in asyncio.run(withsemaphore())) <= 2
+
+        with mock.patch('fsl.utils.run.ARUN_LIMIT', 3):
+            assert max(int(r) for r in asyncio.run(runall(6))) == 3
+
+        assert max(int(r) for r in asyncio.run(runall(6))) == 6
+
+
+def test_arunfsl():
+
+    test_script = tw.dedent("""
+    #!/bin/bash
+    echo {}
+    exit 0
+    """).strip()
+
+    with mockFSLDIR() as fsldir:
+        fslhd = op.join(fsldir, 'bin', 'fslhd')
+        mkexec(fslhd, test_script.format('fsldir'))
+        assert asyncio.run(run.arunfsl('fslhd')).strip() == 'fsldir'
+
+        with pytest.raises(FileNotFoundError):
+            asyncio.run(run.arunfsl('notafsltool'))
+
+
+class FakeFslSub:
+    """Fake fsl_sub which runs each job in a background thread, honouring
+    jobhold dependencies.
+    """
+    def __init__(self):
+        self.jobs = {}
+
+    def __call__(self, *cmd, jobhold=None, log=None, array_task=None,
+                 **kwargs):
+        jid   = str(len(self.jobs) + 1)
+        holds = []
+        if jobhold:
+            holds = [self.jobs[j] for j in jobhold.split(',')]
+
+        if array_task is not None:
+            with open(array_task, 'rt') as f:
+                cmds = [shlex.split(line) for line in f]
+        else:
+            cmds = [cmd]
+
+        def job():
+            for h in holds:
+                h.join()
+            for cmd in cmds:
+                sp.run(cmd, check=False)
+
+        self.jobs[jid] = threading.Thread(target=job)
+        self.jobs[jid].start()
+        return (jid, '')
+
+
+@pytest.mark.parametrize('inotify', [True, False])
+def test_JobTracker(inotify):
+
+    fslsub = FakeFslSub()
+    create = run._Inotify.create if inotify else (lambda : None)
+
+    with tempdir.tempdir(), \
+         mock.patch('fsl.wrappers.fsl_sub', fslsub), \
+         mock.patch('fsl.utils.run._Inotify.create', create):
+
+        jids = [run.run(['sleep', str(s)], submit=True)
+                for s in (3, 0.5, 1.5)]
+
+        finished = []
+        with run.JobTracker(maxinterval=0.5) as tracker:
+
+            # one marker job for all jobs
+            fut = tracker.track(jids)
+            assert len(fslsub.jobs) == 4
+            assert fut.result(timeout=10) == jids
+            # the marker job thread may still be
+            # running, but the jobs it was held
+            # on must have finished
+            assert all(not fslsub.jobs[j].is_alive() for j in jids)
+
+        jids = [run.run(['sleep', str(s)], submit=True)
+                for s in (3, 0.5, 1.5)]
+
+        with run.JobTracker(maxinterval=0.5) as tracker:
+
+            # one marker job per job
+            futs = tracker.trackEach(jids)
+            assert len(fslsub.jobs) == 10
+            assert sorted(futs.keys()) == sorted(jids)
+            for fut in futs.values():
+                fut.add_done_callback(lambda f: finished.append(f.result()))
+            _, notdone = futures.wait(futs.values(), timeout=10)
+            assert len(notdone) == 0
+            assert finished == [jids[1], jids[2], jids[0]]
+
+            # marker job files are removed
+            # as each job completes
+            markerdir = tracker.markerdir
+            assert len(os.listdir(markerdir)) == 0
+
+            assert tracker.wait(jids, timeout=10)
+            assert len(fslsub.jobs) == 11
+
+        assert not op.exists(markerdir)
+
+
+@pytest.mark.parametrize('inotify', [True, False])
+def test_JobTracker_watch(inotify):
+
+    create = run._Inotify.create if inotify else (lambda : None)
+
+    def touch_later(fname, delay):
+        def func():
+            time.sleep(delay)
+            touch(fname)
+        threading.Thread(target=func).start()
+
+    with tempdir.tempdir(), \
+         mock.patch('fsl.utils.run._Inotify.create', create):
+
+        os.mkdir('subdir')
+        touch('removeme')
+
+        with run.JobTracker(maxinterval=10) as tracker:
+            created = tracker.watch('created')
+            subdir  = tracker.watch(op.join('subdir', 'created'), result=1)
+            removed = tracker.watch('removeme', removed=True)
+            never   = tracker.watch('never')
+
+            start = time.time()
+            touch_later('created', 0.5)
+            touch_later(op.join('subdir', 'created'), 1)
+            assert created.result(5) == op.abspath('created')
+            assert subdir.result(5)  == 1
+
+            os.remove('removeme')
+            assert removed.result(5) == op.abspath('removeme')
+
+            # we shouldn't have to
+            # wait for maxinterval
+            assert time.time() - start < 5
+
+        assert never.cancelled()
+        with pytest.raises(RuntimeError):
+            tracker.watch('never')
+
+
+def test_submitmap():
+
+    # defined locally so it is
+    # serialised by value
+    def _square(x):
+        if x == 3:
+            raise ValueError('three')
+        return x * x
+
+    fslsub = FakeFslSub()
+
+    with tempdir.tempdir(), \
+         mock.patch('fsl.wrappers.fsl_sub', fslsub):
+
+        futs, jid = run.submitmap(_square, range(10), chunksize=4,
+                                  clean='always')
+
+        # one array job, plus one
+        # marker job for the tracker
+        assert len(fslsub.jobs) == 2
+
+        for i, fut in enumerate(futs):
+            if i == 3:
+                with pytest.raises(ValueError):
+                    fut.result(10)
+            else:
+                assert fut.result(10) == i * i
+
+        # clean='always' - working dir is removed
+        # after all results have been loaded
+        for _ in range(20):
+            if len(glob.glob('.submitmap.*')) == 0:
+                break
+            time.sleep(0.1)
+        assert len(glob.glob('.submitmap.*')) == 0
+
+        assert run.submitmap(_square, []) == ([], None)
+
+
+def test_submitmap_failed_task():
+
+    # array tasks which don't save any
+    # results cause their futures to fail
+    class BrokenFslSub(FakeFslSub):
+        def __call__(self, *cmd, array_task=None, **kwargs):
+            if array_task is not None:
+                with open(array_task, 'wt') as f:
+                    f.write('true\n')
+            return super().__call__(*cmd, array_task=array_task, **kwargs)
+
+    with tempdir.tempdir(), \
+         mock.patch('fsl.wrappers.fsl_sub', BrokenFslSub()):
+        futs, jid = run.submitmap(str, [1, 2], clean='on_success')
+        with pytest.raises(RuntimeError):
+            futs[0].result(10)
+        with pytest.raises(RuntimeError):
+            futs[1].result(10)
+
+        # not cleaned up on error
+        assert len(glob.glob('.submitmap.*')) == 1
+
+
+def test_LocalBackend():
+
+    backend = run.LocalBackend(nprocs=2)
+
+    with tempdir.tempdir(), \
+         mock.patch('fsl.utils.run.SUBMIT_BACKEND', backend):
+
+        # jobhold dependencies are honoured
+        jid1 = run.run(['sh', '-c', 'sleep 1 && echo first > first.txt'],
+                       submit=True)
+        jid2 = run.run('cat first.txt', submit={'jobhold' : jid1,
+                                                'name'    : 'second'})
+        jid3 = run.run('false', submit={'jobhold' : [jid1, jid2]})
+        run.hold([jid3], timeout=1)
+
+        assert backend.exitcodes(jid1) == [0]
+        assert backend.exitcodes(jid2) == [0]
+        assert backend.exitcodes(jid3) == [1]
+        assert run.job_output(jid2) == ('first\n', '')
+        assert op.exists(f'second.o{jid2}')
+
+        with pytest.raises(ValueError):
+            run.run('true', submit={'jobhold' : 'abc'})
+
+        # at most nprocs jobs run concurrently
+        start = time.time()
+        jids  = [run.run('sleep 0.5', submit=True) for _ in range(4)]
+        assert backend.wait(jids, timeout=10)
+        assert time.time() - start >= 1
+
+        # submitfunc and submitmap use the backend
+        def func(a, b):
+            return a + b
+
+        result, jid = run.submitfunc(func, (1, 2), clean='always')
+        assert result() == 3
+
+        futs, jid = run.submitmap(abs, [-1, -2, -3], chunksize=2)
+        assert [f.result(10) for f in futs] == [1, 2, 3]
+        assert backend.wait([jid], timeout=10)
+        assert backend.exitcodes(jid) == [0, 0]
+
+    backend.shutdown()
+
+
 def test_hold():
 
     with tempdir.tempdir():
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+#
+# test_run_benchmark.py - Micro-benchmarks for fsl.utils.run.run
+#
+# Author: Paul McCarthy <pauldmccarthy@gmail.com>
+#
+"""Micro-benchmarks for the :func:`fsl.utils.run.run` function, measuring
+the per-call latency of short commands, and the throughput of commands which
+produce large amounts of output, through each of the stream handling
+strategies used by ``run``. Timings are printed - run with
+``pytest -s -m longtest fsl/tests/test_run_benchmark.py`` to see them.
+"""
+
+
+import                    time
+import textwrap        as tw
+from   unittest import mock
+
+import pytest
+
+import fsl.utils.tempdir as tempdir
+import fsl.utils.run     as run
+
+from fsl.tests.test_run import mkexec
+
+
+pytestmark = [pytest.mark.unixtest, pytest.mark.longtest]
+
+
+class Discard:
+    """Text stream which discards everything written to it. """
+    def write(self, text):
+        pass
+
+
+# (label, log options, run._canSelect)
+MODES = [
+    ('capture', {'tee' : False},                        True),
+    ('select',  {'tee' : False, 'stdout' : Discard()},  True),
+    ('threads', {'tee' : False, 'stdout' : Discard()},  False),
+]
+
+
+def benchmark(func, ncalls):
+    """Calls ``func`` ``ncalls`` times, returns the mean time per call in
+    seconds.
+    """
+    func()
+    start = time.perf_counter()
+    for _ in range(ncalls):
+        func()
+    return (time.perf_counter() - start) / ncalls
+
+
+@pytest.mark.parametrize('label,log,canSelect', MODES)
+def test_run_latency(label, log, canSelect):
+
+    with mock.patch('fsl.utils.run._canSelect', return_value=canSelect):
+        elapsed = benchmark(lambda : run.run('echo', 'abc', log=log), 200)
+
+    print(f'run latency [{label}]: {elapsed * 1000:0.3f}ms per call')
+
+
+@pytest.mark.parametrize('label,log,canSelect', MODES)
+def test_run_throughput(label, log, canSelect):
+
+    nbytes      = 64 * 1024 * 1024
+    test_script = tw.dedent(f"""
+    #!/usr/bin/env python
+    import sys
+    line = ('x' * 79 + '\\n').encode()
+    for _ in range({nbytes // 80}):
+        sys.stdout.buffer.write(line)
+    """).strip()
+
+    with tempdir.tempdir():
+        mkexec('script.py', test_script)
+        with mock.patch('fsl.utils.run._canSelect', return_value=canSelect):
+            elapsed = benchmark(lambda : run.run('./script.py', log=log), 3)
+
+    print(f'run throughput [{label}]: '
+          f'{nbytes / elapsed / 1048576:0.1f}MB/s')
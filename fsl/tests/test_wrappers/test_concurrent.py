@@ -40,3 +40,137 @@ def test_wrappers_concurrent():
             pool.starmap(myfunc, args)
 
         assert all(op.exists(f) for f in outfiles)
+
+
+def test_wrappers_asynchronous():
+
+    import threading
+    import concurrent.futures as futures
+    import numpy   as np
+    import nibabel as nib
+    from fsl.data.image import Image
+
+    running = [0, 0]
+    lock    = threading.Lock()
+
+    @wutils.fileOrImage('infile', 'outfile')
+    def addone(infile, outfile):
+        with lock:
+            running[0] += 1
+            running[1]  = max(running)
+        time.sleep(0.1)
+        img = nib.load(infile)
+        nib.Nifti1Image(img.get_fdata() + 1, np.eye(4)).to_filename(outfile)
+        with lock:
+            running[0] -= 1
+        return threading.current_thread().name
+
+    data = [np.random.random((5, 5, 5)) for _ in range(12)]
+    imgs = [nib.Nifti1Image(d, np.eye(4)) for d in data]
+
+    # return types of concurrent calls must
+    # not interfere with each other
+    imgs = [Image(img) if i % 2 else img for i, img in enumerate(imgs)]
+
+    with futures.ThreadPoolExecutor(3) as pool:
+        with wutils.wrapperconfig(executor=pool):
+            results = [addone(img, wutils.LOAD) for img in imgs]
+
+        assert all(isinstance(r, futures.Future) for r in results)
+        results = [r.result() for r in results]
+
+    assert running[1] == 3
+    assert all(r.stdout != threading.current_thread().name for r in results)
+
+    for i, (d, r) in enumerate(zip(data, results)):
+        if i % 2:
+            assert isinstance(r.outfile, Image)
+            assert np.allclose(r.outfile.data, d + 1)
+        else:
+            assert isinstance(r.outfile, nib.Nifti1Image)
+            assert np.allclose(r.outfile.get_fdata(), d + 1)
+
+    # default executor, and explicitly
+    # synchronous calls
+    result = addone(imgs[0], wutils.LOAD, asynchronous=True)
+    assert isinstance(result, futures.Future)
+    assert np.allclose(result.result().outfile.get_fdata(), data[0] + 1)
+
+    with futures.ThreadPoolExecutor(1) as pool:
+        with wutils.wrapperconfig(executor=pool):
+            result = addone(imgs[0], wutils.LOAD, asynchronous=False)
+    assert np.allclose(result.outfile.get_fdata(), data[0] + 1)
+
+
+def test_wrappers_asynchronous_false_decorator_stack():
+
+    import concurrent.futures as futures
+    import numpy   as np
+    import nibabel as nib
+
+    import sys
+
+    @wutils.fileOrImage('infile', 'outfile')
+    @wutils.cmdwrapper
+    def copy(infile, outfile):
+        return [sys.executable, '-c',
+                'import nibabel as nib; '
+                f'nib.load("{infile}").to_filename("{outfile}")']
+
+    data = np.random.random((5, 5, 5))
+    img  = nib.Nifti1Image(data, np.eye(4))
+
+    # Inner decorator layers must not
+    # submit the call to the executor
+    with futures.ThreadPoolExecutor(1) as pool:
+        with wutils.wrapperconfig(executor=pool):
+            result = copy(img, wutils.LOAD, asynchronous=False)
+            assert not isinstance(result, futures.Future)
+            assert np.allclose(result.outfile.get_fdata(), data)
+
+            result = copy(img, wutils.LOAD)
+            assert isinstance(result, futures.Future)
+            assert np.allclose(result.result().outfile.get_fdata(), data)
+
+
+def test_wrappers_asynchronous_cmdwrapper():
+
+    import concurrent.futures as futures
+
+    @wutils.cmdwrapper
+    def echo(msg):
+        return ['echo', msg]
+
+    results = [echo(str(i), asynchronous=True, log={'tee' : False})
+               for i in range(5)]
+    assert [r.result()[0].strip() for r in results] == \
+        [str(i) for i in range(5)]
+
+    with futures.ThreadPoolExecutor(2) as pool:
+        with wutils.wrapperconfig(executor=pool, stderr=False):
+            result = echo('abc', log={'tee' : False})
+        # options active at submission
+        # time are used by the call
+        assert result.result().strip() == 'abc'
+
+
+def test_wrappers_asynchronous_asyncio():
+
+    import asyncio
+    from unittest import mock
+    import fsl.utils.run as run
+
+    @wutils.cmdwrapper
+    def echo(msg):
+        return ['echo', msg]
+
+    async def main():
+        futs = [echo(str(i), asynchronous='asyncio', stderr=False,
+                     log={'tee' : False}) for i in range(5)]
+        return await asyncio.gather(*futs)
+
+    with mock.patch('fsl.utils.run.arun', wraps=run.arun) as arun:
+        results = asyncio.run(main())
+
+    assert [r.strip() for r in results] == [str(i) for i in range(5)]
+    assert arun.call_count == 5
@@ -8,11 +8,16 @@
 import             os
 import os.path  as op
 import textwrap as tw
+from unittest import mock
+
 import numpy    as np
+import nibabel  as nib
 
 from fsl.utils.tempdir import tempdir
+from fsl.data.image    import Image
 
 import fsl.wrappers as fw
+from   fsl.wrappers.fslmaths import evaluate
 
 from fsl.tests import mockFSLDIR, make_random_image
 from fsl.tests.test_wrappers import testenv
@@ -101,3 +106,105 @@ def test_fslmaths_load():
         assert np.all(expect.dataobj[:] == got.dataobj[:])
         got = fw.fslmaths('input').run(fw.LOAD)
         assert np.all(expect.dataobj[:] == got.dataobj[:])
+
+
+def test_fslmaths_executor():
+    import concurrent.futures as futures
+    with tempdir() as td, mockFSLDIR(bin=('fslmaths',)) as fsldir:
+        expect = make_random_image(op.join(td, 'output.nii.gz'))
+
+        with open(op.join(fsldir, 'bin', 'fslmaths'), 'wt') as f:
+            f.write(tw.dedent("""
+            #!/usr/bin/env python
+            import sys
+            import shutil
+            shutil.copy('{}', sys.argv[-1])
+            """.format(op.join(td, 'output.nii.gz'))).strip())
+            os.chmod(op.join(fsldir, 'bin', 'fslmaths'), 0o755)
+
+        with futures.ThreadPoolExecutor(1) as pool, \
+             fw.wrapperconfig(executor=pool):
+            got = fw.fslmaths('input').add(1).run()
+        assert np.all(expect.dataobj[:] == got.dataobj[:])
+
+
+def test_fslmaths_inprocess():
+    with tempdir():
+        data = np.random.randn(10, 11, 12, 5).astype(np.float32)
+        mask = (np.random.random((10, 11, 12)) > 0.5).astype(np.uint8)
+        xform = np.diag([2, 2, 2, 1])
+        img   = nib.Nifti1Image(data, xform)
+        mimg  = nib.Nifti1Image(mask, xform)
+        mimg.to_filename('mask.nii.gz')
+
+        exp = data.copy()
+        exp[exp < np.float32(0.25)] = 0
+        exp = exp * np.float32(-2) + data
+        exp[mask == 0] = 0
+        exp = np.sqrt(np.abs(exp))
+
+        # small chunks, so multiple threads are used
+        with mock.patch.object(fw.fslmaths, 'CHUNK_SIZE', 100), \
+             mock.patch.object(fw.fslmaths, 'NUM_THREADS', 4):
+            got = fw.fslmaths(img).thr(0.25).mul(-2).add(img) \
+                    .mas('mask').abs().sqrt().run(inprocess=True)
+
+        assert isinstance(got, nib.Nifti1Image)
+        assert got.get_data_dtype() == np.float32
+        assert np.array_equal(np.asanyarray(got.dataobj), exp)
+        assert np.array_equal(got.affine, xform)
+        assert np.array_equal(evaluate(img, [('thr', (0.5,), {})]).affine,
+                              xform)
+
+        # fsl Images in -> fsl Image out
+        got = fw.fslmaths(Image(img)).bin().run(odt='char', inprocess=True)
+        assert isinstance(got, Image)
+        assert got.dtype == np.uint8
+        assert np.array_equal(got.data, data > 0)
+        assert np.array_equal(got.voxToWorldMat, xform)
+
+        # output saved to file
+        fw.fslmaths(img).mas(mimg).range().run('out', inprocess=True)
+        got = nib.load('out.nii.gz')
+        exp = data * (mask > 0)[..., None]
+        assert np.array_equal(np.asanyarray(got.dataobj), exp)
+        assert np.isclose(got.header['cal_max'], exp.max())
+
+
+def test_fslmaths_inprocess_fallback():
+    with testenv('fslmaths') as fslmaths:
+
+        # unsupported operation
+        result = fw.fslmaths('input').mul(2).fmedian() \
+                   .run('output', inprocess=True)
+        assert result.stdout[0] == f'{fslmaths} input -mul 2 -fmedian output'
+
+        # input file does not exist
+        result = fw.fslmaths('input').mul(2).run('output', inprocess=True)
+        assert result.stdout[0] == f'{fslmaths} input -mul 2 output'
+
+        with tempdir():
+            data = np.random.randn(10, 10, 10).astype(np.float32)
+            nib.Nifti1Image(data, np.eye(4)).to_filename('input.nii.gz')
+
+            # undefined result (log of negative values)
+            result = fw.fslmaths('input').log().run('output', inprocess=True)
+            assert result.stdout[0] == f'{fslmaths} input -log output'
+
+            # result would need to be rounded
+            result = fw.fslmaths('input').run('output', 'short',
+                                               inprocess=True)
+            assert result.stdout[0] == f'{fslmaths} input output -odt short'
+
+            # integer calculations with dt=input
+            idata = np.random.randint(0, 10, (10, 10, 10)).astype(np.uint8)
+            iimg  = nib.Nifti1Image(idata, np.eye(4))
+            assert evaluate(iimg, [('div', (3,), {})], dt='input') is None
+            got = evaluate(iimg, [('div', (3,), {})], dt='float')
+            assert np.allclose(np.asanyarray(got.dataobj),
+                               idata / np.float32(3))
+
+            # run options are passed to fslmaths
+            result = fw.fslmaths('input').abs().run('output', inprocess=True,
+                                                    log={'tee' : False})
+            assert result.stdout[0] == f'{fslmaths} input -abs output'
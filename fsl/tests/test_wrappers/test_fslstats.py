@@ -9,11 +9,13 @@ import contextlib
 
 import pytest
 
-import numpy as np
+import numpy   as np
+import nibabel as nib
 
 import fsl.utils.run as run
 import fsl.utils.tempdir as tempdir
 import fsl.wrappers  as fw
+from   fsl.data.image import Image
 
 from fsl.tests import mockFSLDIR as mockFSLDIR_base, make_random_image
 
@@ -117,6 +119,15 @@ def test_fslstats_result():
             assert result.shape == (4,)
 
 
+def test_fslstats_executor():
+    import concurrent.futures as futures
+    with tempdir.tempdir(), mockFSLDIR('(2,)'):
+        with futures.ThreadPoolExecutor(1) as pool, \
+             fw.wrapperconfig(executor=pool):
+            result = fw.fslstats('image').m.r.run()
+        assert result.shape == (2,)
+
+
 def test_fslstats_index_mask_missing_labels():
     script = tw.dedent("""
     #!/usr/bin/env bash
@@ -157,3 +168,92 @@ def test_fslstats_index_mask_missing_labels_nd():
             namask = np.isnan(expect)
             assert np.all(result[~namask]  == expect[~namask])
             assert np.all(np.isnan(expect) == np.isnan(result))
+
+
+def test_fslstats_inprocess():
+    with tempdir.tempdir():
+        data = np.random.randn(10, 11, 12, 4).astype(np.float32)
+        data[data < -1.5] = 0
+        mask = (np.random.random((10, 11, 12)) > 0.3).astype(np.uint8)
+        lbls = np.random.randint(0, 5, (10, 11, 12)).astype(np.int16)
+        lbls[lbls == 3] = 0
+        img  = nib.Nifti1Image(data, np.diag([2, 2, 2, 1]))
+        nib.Nifti1Image(mask, np.eye(4)).to_filename('mask.nii.gz')
+        nib.Nifti1Image(lbls, np.eye(4)).to_filename('lbls.nii.gz')
+
+        def stats(vals, p):
+            vals  = np.sort(vals)
+            pidx  = int(np.float32(len(vals)) * np.float32(p / 100))
+            return [vals.mean(), vals.std(ddof=1),
+                    vals[0], vals[-1], vals[pidx]]
+
+        # no pre-options
+        result = fw.fslstats(img).m.s.R.p(95).run(inprocess=True)
+        assert np.allclose(result, stats(data.flatten(), 95))
+
+        # a single value should be
+        # returned as a scalar
+        result = fw.fslstats(img).k('mask').M.run(inprocess=True)
+        vals   = data[mask > 0]
+        assert np.isscalar(result)
+        assert np.isclose(result, vals[vals != 0].mean())
+
+        # per-volume, thresholds, abs
+        result = fw.fslstats(img, t=True).a.l(0.5).u(2).m.S.R.P(50).V \
+                   .run(inprocess=True)
+        assert result.shape == (4, 7)
+        for vol in range(4):
+            vals = np.abs(data[..., vol])
+            vals = vals[(vals > 0.5) & (vals < 2)]
+            exp  = stats(vals, 50) + [len(vals), len(vals) * 8]
+            assert np.allclose(result[vol], exp)
+
+        # per-label with missing labels
+        result = fw.fslstats(Image(img), K='lbls').m.p(10).run(inprocess=True)
+        assert result.shape == (4, 2)
+        assert np.all(np.isnan(result[2]))
+        for lbl in (1, 2, 4):
+            vals = data[lbls == lbl].flatten()
+            assert np.allclose(result[lbl - 1], stats(vals, 10)[::4])
+
+        # per-volume and per-label
+        result = fw.fslstats(img, t=True, K='lbls').k('mask').R \
+                   .run(inprocess=True)
+        assert result.shape == (4, 4, 2)
+        assert np.all(np.isnan(result[:, 2]))
+        for vol in range(4):
+            for lbl in (1, 2, 4):
+                vals = data[..., vol][(lbls == lbl) & (mask > 0)]
+                assert np.allclose(result[vol, lbl - 1],
+                                   [vals.min(), vals.max()])
+
+        # robust range is approximately
+        # the 2nd/98th percentiles
+        result = fw.fslstats(img).r.run(inprocess=True)
+        assert np.allclose(result, np.percentile(data, [2, 98]), atol=0.05)
+
+
+def test_fslstats_inprocess_fallback():
+    script = tw.dedent("""
+    #!/usr/bin/env bash
+    echo "12345"
+    """).strip()
+    with tempdir.tempdir(), mockFSLDIR(fslstats=script):
+
+        data = np.random.randn(10, 10, 10).astype(np.float32)
+        data[0, 0, 0] = np.nan
+        nib.Nifti1Image(data, np.eye(4)).to_filename('image.nii.gz')
+
+        # unsupported option
+        assert fw.fslstats('image').m.x.run(inprocess=True) == 12345
+
+        # non-finite values
+        assert fw.fslstats('image').m.run(inprocess=True) == 12345
+
+        # input does not exist
+        assert fw.fslstats('nope').m.run(inprocess=True) == 12345
+
+        # non-finite values can be removed with -n
+        result = fw.fslstats('image').n.R.run(inprocess=True)
+        assert np.allclose(result, [min(0, np.nanmin(data)),
+                                    max(0, np.nanmax(data))])
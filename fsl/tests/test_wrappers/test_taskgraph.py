@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+#
+# test_taskgraph.py -
+#
+# Author: Paul McCarthy <pauldmccarthy@gmail.com>
+#
+
+
+import os
+import time
+
+from unittest import mock
+
+import pytest
+
+import fsl.utils.run             as run
+import fsl.wrappers.wrapperutils as wutils
+from   fsl.utils.tempdir     import tempdir
+from   fsl.wrappers.taskgraph import TaskGraph
+
+
+pytestmark = pytest.mark.unixtest
+
+
+@wutils.cmdwrapper
+def copy(input, output, delay=0.2):
+    return ['sh', '-c', f'sleep {delay} && cat {input} > {output}']
+
+
+@wutils.cmdwrapper
+def split(input, out):
+    return ['sh', '-c', f'cat {input} > {out}_a.txt && '
+                        f'cat {input} > {out}_b.txt']
+
+
+@wutils.cmdwrapper
+def fail(input, output):
+    return ['false', input, output]
+
+
+def write(fname, content):
+    with open(fname, 'wt') as f:
+        f.write(content)
+
+
+def read(fname):
+    with open(fname, 'rt') as f:
+        return f.read()
+
+
+def make_graph(**kwargs):
+    graph = TaskGraph(**kwargs)
+    a = graph.add(copy,  'in.txt',      'a.txt',   name='a', silent=True)
+    b = graph.add(split, 'a.txt',       out='b',   name='b', silent=True)
+    c = graph.add(copy,  'b_a.txt',     'c.txt',   name='c', silent=True)
+    d = graph.add(copy,  'other.txt',   'd.txt',   name='d', silent=True)
+    return graph, (a, b, c, d)
+
+
+def test_TaskGraph_dependencies():
+    with tempdir():
+        graph, (a, b, c, d) = make_graph()
+        assert a.deps == []
+        assert b.deps == [a]
+        assert c.deps == [b]
+        assert d.deps == []
+
+        # explicit inputs/outputs
+        e = graph.add(copy, 'x.txt', 'y.txt', inputs=['d.txt'])
+        f = graph.add(copy, 'z.txt', 'zz.txt', outputs=['extra.txt'])
+        g = graph.add(copy, 'extra.txt', 'g.txt')
+        assert e.deps == [d]
+        assert g.deps == [f]
+
+
+def test_TaskGraph_run():
+    with tempdir():
+        write('in.txt',    'input')
+        write('other.txt', 'other')
+        graph, tasks = make_graph()
+
+        graph.run(nworkers=2)
+        assert [t.status for t in tasks] == ['done'] * 4
+        assert read('c.txt') == 'input'
+        assert read('d.txt') == 'other'
+
+        # up to date - nothing is re-run
+        graph.run()
+        assert [t.status for t in tasks] == ['skipped'] * 4
+
+        # make input newer than outputs - all
+        # tasks which depend on it are re-run
+        now = time.time() + 10
+        os.utime('in.txt', (now, now))
+        graph.run()
+        assert [t.status for t in tasks] == ['done'] * 3 + ['skipped']
+
+        # cache=False - everything is re-run
+        graph.run(cache=False)
+        assert [t.status for t in tasks] == ['done'] * 4
+
+        # critical path is the a->b->c chain
+        path, dur = graph.criticalPath()
+        assert path == list(tasks[:3])
+        assert dur  == pytest.approx(sum(t.duration for t in tasks[:3]))
+        assert 'Critical path' in graph.report()
+
+
+def test_TaskGraph_hash():
+    with tempdir():
+        write('in.txt',    'input')
+        write('other.txt', 'other')
+        graph, tasks = make_graph(check='hash')
+        graph.run()
+        assert [t.status for t in tasks] == ['done'] * 4
+
+        # same content, newer mtime - not re-run
+        now = time.time() + 10
+        os.utime('in.txt', (now, now))
+        graph.run()
+        assert [t.status for t in tasks] == ['skipped'] * 4
+
+        # new content - re-run
+        write('other.txt', 'changed')
+        graph.run()
+        assert [t.status for t in tasks] == ['skipped'] * 3 + ['done']
+        assert read('d.txt') == 'changed'
+
+        # hashes are not recorded for submitted tasks
+        with pytest.raises(ValueError):
+            graph.run(submit=True)
+
+
+def test_TaskGraph_failure():
+    with tempdir():
+        write('in.txt',    'input')
+        write('other.txt', 'other')
+
+        graph = TaskGraph()
+        a = graph.add(fail, 'in.txt',    'a.txt', silent=True)
+        b = graph.add(copy, 'a.txt',     'b.txt', silent=True)
+        c = graph.add(copy, 'other.txt', 'c.txt', silent=True)
+
+        with pytest.raises(RuntimeError):
+            graph.run()
+
+        assert a.status == 'failed'
+        assert b.status == 'cancelled'
+        assert c.status == 'done'
+
+
+def test_TaskGraph_submit():
+
+    backend = run.LocalBackend(2)
+
+    with tempdir(), mock.patch('fsl.utils.run.SUBMIT_BACKEND', backend):
+        write('in.txt',    'input')
+        write('other.txt', 'other')
+        graph, (a, b, c, d) = make_graph()
+
+        jobids = graph.run(submit=True)
+        assert sorted(jobids.keys()) == ['a', 'b', 'c', 'd']
+        assert backend.wait(list(jobids.values()), timeout=10)
+        assert read('c.txt') == 'input'
+        assert read('d.txt') == 'other'
+
+        graph.run()
+        assert [t.status for t in (a, b, c, d)] == ['skipped'] * 4
+
+    backend.shutdown()
@@ -1155,3 +1155,296 @@ def test_fileOrText_all_tempfiles_cleared():
     assert txtout == '123456'
     assert len(tempfiles) == 2
     assert not any(op.exists(f) for f in tempfiles)
+
+
+def test_fileOrImage_tempfiles():
+
+    tempfiles = []
+
+    @wutils.fileOrImage('in_', 'out')
+    def image(in_, out):
+        tempfiles[:] = [in_, out]
+        i = nib.load(in_)
+        i = nib.Nifti1Image(i.get_fdata() + 1, np.eye(4))
+        i.to_filename(out)
+
+    arr = np.array([[1, 2], [ 3, 4]], dtype=np.int32)
+    img = nib.nifti1.Nifti1Image(arr, np.eye(4))
+
+    # temporary inputs are saved uncompressed
+    # in the scratch directory, if set
+    with tempdir.tempdir() as td:
+        with mock.patch.object(wutils.FileOrThing, 'SCRATCH_DIR', td):
+            image(img, wutils.LOAD)
+            assert tempfiles[0].endswith('.nii')
+            assert op.dirname(op.dirname(tempfiles[0])) == td
+            assert len(os.listdir(td)) == 0
+
+        with mock.patch.dict(os.environ, FSLPY_SCRATCHDIR=td):
+            image(img, wutils.LOAD)
+            assert op.dirname(op.dirname(tempfiles[0])) == td
+
+        # non-existent scratch dir - system default is used
+        with mock.patch.dict(os.environ, FSLPY_SCRATCHDIR=op.join(td, 'nope')):
+            image(img, wutils.LOAD)
+            assert op.dirname(op.dirname(tempfiles[0])) != td
+
+    # uncompressed outputs are memory-mapped
+    # on platforms which support it
+    with mock.patch.dict(os.environ, FSLOUTPUTTYPE='NIFTI'):
+        out = image(img, wutils.LOAD).out
+        assert tempfiles[1].endswith('.nii')
+        assert not op.exists(tempfiles[1])
+        assert np.all(np.asanyarray(out.dataobj) == arr + 1)
+        if os.name == 'posix':
+            assert isinstance(np.asanyarray(out.dataobj), np.memmap)
+
+    with mock.patch.dict(os.environ, FSLOUTPUTTYPE='NIFTI_GZ'):
+        out = image(fslimage.Image(img), wutils.LOAD).out
+        assert isinstance(out, fslimage.Image)
+        assert not isinstance(out.data, np.memmap)
+        assert np.all(out.data.squeeze() == arr + 1)
+
+
+_cache_script = textwrap.dedent("""
+#!/usr/bin/env bash
+# usage: cachecmd input output [-m]
+echo "called" >> {calls}
+cat $1        >  $2.txt
+echo "extra"  >  $2_extra.txt
+if [ "$3" == "-m" ]; then
+  echo "mask" > $2_mask.txt
+fi
+echo "done $2"
+""").strip()
+
+
+def test_ResultCache():
+
+    with tempdir.tempdir() as td:
+
+        calls  = op.join(td, 'calls')
+        script = op.join(td, 'cachecmd')
+        with open(script, 'wt') as f:
+            f.write(_cache_script.format(calls=calls))
+        os.chmod(script, 0o755)
+
+        def ncalls():
+            if not op.exists(calls): return 0
+            with open(calls, 'rt') as f:
+                return len(f.read().split())
+
+        def readfile(fname):
+            with open(fname, 'rt') as f:
+                return f.read().strip()
+
+        @wutils.fileOrArray('input', outprefix='output')
+        @wutils.cmdwrapper
+        def cachecmd(input, output, m=False):
+            cmd = [script, input, output]
+            if m: cmd.append('-m')
+            return cmd
+
+        cache = wutils.ResultCache(op.join(td, 'cache'))
+
+        with open('input.txt', 'wt') as f:
+            f.write('abc')
+
+        # miss
+        result = cachecmd('input.txt', 'output', cache=cache)
+        assert result.stdout[0].strip() == 'done output'
+        assert ncalls() == 1
+        assert readfile('output.txt')       == 'abc'
+        assert readfile('output_extra.txt') == 'extra'
+
+        # hit - outputs of the first
+        # call are still present
+        result = cachecmd('input.txt', 'output', cache=cache)
+        assert result.stdout[0].strip() == 'done output'
+        assert ncalls() == 1
+
+        # hit - outputs restored,
+        # command not executed
+        os.remove('output.txt')
+        os.remove('output_extra.txt')
+        with wutils.wrapperconfig(cache=cache):
+            result = cachecmd('input.txt', 'output')
+        assert result.stdout[0].strip() == 'done output'
+        assert ncalls() == 1
+        assert readfile('output.txt')       == 'abc'
+        assert readfile('output_extra.txt') == 'extra'
+
+        # outputs restored to a
+        # different location
+        os.mkdir('sub')
+        cachecmd('input.txt', op.join('sub', 'output'), cache=cache)
+        assert ncalls() == 1
+        assert readfile(op.join('sub', 'output.txt')) == 'abc'
+
+        # different arguments - miss
+        cachecmd('input.txt', 'output', m=True, cache=cache)
+        assert ncalls() == 2
+        assert readfile('output_mask.txt') == 'mask'
+
+        # different input contents - miss
+        with open('input.txt', 'wt') as f:
+            f.write('def')
+        cachecmd('input.txt', 'output', cache=cache)
+        assert ncalls() == 3
+        assert readfile('output.txt') == 'def'
+
+        # no cache
+        cachecmd('input.txt', 'output')
+        assert ncalls() == 4
+
+        stats = cache.stats()
+        assert stats['hits']   == 3
+        assert stats['misses'] == 3
+        assert stats['stores'] == 3
+        assert stats['size']   >  0
+
+        cache.resetStats()
+        assert cache.stats()['hits'] == 0
+
+        # hard links
+        cache = wutils.ResultCache(op.join(td, 'cache'), link=True)
+        os.remove('output.txt')
+        cachecmd('input.txt', 'output', cache=cache)
+        assert ncalls() == 4
+        assert readfile('output.txt') == 'def'
+        if os.name == 'posix':
+            assert os.stat('output.txt').st_nlink == 2
+
+        # cleared cache - miss
+        cache.clear()
+        cachecmd('input.txt', 'output', cache=cache)
+        assert ncalls() == 5
+        assert cache.stats()['misses'] == 1
+
+
+def test_ResultCache_evict():
+
+    with tempdir.tempdir() as td:
+
+        @wutils.fileOrArray('output')
+        @wutils.cmdwrapper
+        def writefile(content, output):
+            return ['bash', '-c', f'printf "{content}" > "$0"', output]
+
+        # each output is 100 bytes - the cache
+        # has room for two of them
+        cache = wutils.ResultCache(op.join(td, 'cache'), maxsize=250)
+
+        for i in range(3):
+            writefile(str(i) * 100, f'out{i}', cache=cache)
+
+        assert cache.stats()['evictions'] == 1
+        assert cache.stats()['size']      == 200
+
+        # out0 was evicted
+        for i in range(3):
+            os.remove(f'out{i}')
+        writefile('1' * 100, 'out1', cache=cache)
+        writefile('2' * 100, 'out2', cache=cache)
+        assert cache.stats()['hits'] == 2
+        writefile('0' * 100, 'out0', cache=cache)
+        assert cache.stats()['misses'] == 4
+
+
+def test_ResultCache_not_cached():
+
+    with tempdir.tempdir() as td:
+
+        cache = wutils.ResultCache(op.join(td, 'cache'))
+
+        @wutils.fileOrArray('output')
+        @wutils.cmdwrapper
+        def mkdir(output):
+            return ['mkdir', output]
+
+        @wutils.fileOrArray('output')
+        @wutils.cmdwrapper
+        def fail(output):
+            return ['bash', '-c', 'touch "$0"; exit 1', output]
+
+        # commands which create directories
+        mkdir('outdir', cache=cache)
+        assert cache.stats()['stores'] == 0
+
+        # failed commands
+        with pytest.raises(RuntimeError):
+            fail('out', cache=cache)
+        fail('out', cache=cache, exitcode=True)
+        assert cache.stats()['stores'] == 0
+
+        # dry run / cmdonly
+        with run.dryrun():
+            mkdir('outdir2', cache=cache)
+        assert mkdir('outdir2', cache=cache, cmdonly=True) == \
+            ['mkdir', 'outdir2']
+        assert cache.stats()['misses'] == 3
+
+        # functions which do not declare their outputs
+        @wutils.cmdwrapper
+        def touch(output):
+            return ['touch', output]
+
+        touch('out2', cache=cache)
+        touch('out2', cache=cache)
+        assert cache.stats()['misses'] == 3
+        assert cache.stats()['hits']   == 0
+
+
+def test_ResultCache_declared_outputs():
+
+    with tempdir.tempdir() as td:
+
+        cache = wutils.ResultCache(op.join(td, 'cache'))
+
+        # only the declared output, and the same
+        # name with an image file extension, are
+        # outputs - other files which begin with
+        # the output name, or which are named
+        # after other arguments, are not
+        @wutils.fileOrImage('output')
+        @wutils.cmdwrapper
+        def writefiles(output, value):
+            script = ('echo a > "$0"; echo b > "$0".nii.gz; '
+                      'echo c > "$0"_extra; echo d > "$1"_other')
+            return ['bash', '-c', script, output, value]
+
+        writefiles('output', '1', cache=cache)
+        assert cache.stats()['stores'] == 1
+
+        # outputs of the first call are
+        # present - they are not part of
+        # the cache key, so this is a hit
+        writefiles('output', '1', cache=cache)
+        assert cache.stats()['hits']   == 1
+        assert cache.stats()['misses'] == 1
+
+        for f in ['output', 'output.nii.gz', 'output_extra', '1_other']:
+            os.remove(f)
+
+        writefiles('output', '1', cache=cache)
+        assert cache.stats()['hits'] == 2
+        assert op.exists('output')
+        assert op.exists('output.nii.gz')
+        assert not op.exists('output_extra')
+        assert not op.exists('1_other')
+
+        # files which are modified in place are
+        # also inputs, so can't be cached
+        @wutils.fileOrImage('input', 'output')
+        @wutils.cmdwrapper
+        def append(input, output):
+            script = 'content=$(cat "$0"); printf "$content" >> "$1"'
+            return ['bash', '-c', script, input, output]
+
+        with open('inplace', 'wt') as f:
+            f.write('a')
+        append('inplace', 'inplace', cache=cache)
+        append('inplace', 'inplace', cache=cache)
+        assert cache.stats()['stores'] == 1
+        with open('inplace', 'rt') as f:
+            assert f.read() == 'aaaa'
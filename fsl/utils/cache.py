@@ -8,8 +8,14 @@
 """
 
 
-import time
-import collections
+import os.path as op
+import            os
+import            sys
+import            time
+import            pickle
+import            itertools
+import            threading
+import            collections
 
 
 class Expired(Exception):
@@ -18,16 +24,35 @@ class Expired(Exception):
     """
 
 
+def itemSize(value):
+    """Default function used by the :class:`Cache` to estimate the size of a
+    cached item. Returns ``value.nbytes`` if ``value`` has an integer
+    ``nbytes`` attribute (e.g. a ``numpy`` array), or ``sys.getsizeof(value)``
+    otherwise.
+    """
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(value)
+
+
 class CacheItem:
     """Internal container class used to store :class:`Cache` items. """
 
-    def __init__(self, key, value, expiry=0):
+    def __init__(self, key, value, expiry=0, nbytes=0):
         self.key       = key
         self.value     = value
         self.expiry    = expiry
+        self.nbytes    = nbytes
         self.storetime = time.time()
 
 
+    @property
+    def expired(self):
+        """Returns ``True`` if this item has expired, ``False`` otherwise. """
+        return self.expiry > 0 and (time.time() - self.storetime > self.expiry)
+
+
 class Cache:
     """The ``Cache`` is a simple in-memory cache built on a
     ``collections.OrderedDict``. The ``Cache`` class has the following
@@ -39,22 +64,125 @@ class Cache:
        - Expiration times can be specified for individual items. If a request
          is made to access an expired item, an :class:`Expired` exception is
          raised.
+
+       - The cache may be limited by the total size of its items, as well as
+         by their number. By default, the size of an item is given by its
+         ``nbytes`` attribute (e.g. for ``numpy`` arrays) - see the
+         :func:`itemSize` function.
+
+       - Items which are dropped from memory may optionally be *spilled* to a
+         directory on disk, from where they are loaded if they are accessed
+         again.
+
+       - A function may be called whenever an item is dropped from the cache,
+         and hit/miss statistics are available via the :meth:`stats` method.
+
+       - All operations are protected by a lock, so a ``Cache`` may be
+         accessed from multiple threads.
     """
 
-    def __init__(self, maxsize=100, lru=False):
+    def __init__(self,
+                 maxsize=100,
+                 lru=False,
+                 maxbytes=None,
+                 sizeof=None,
+                 onEvict=None,
+                 diskdir=None,
+                 maxdiskbytes=None):
         """Create a ``Cache``.
 
-        :arg maxsize: Maximum number of items allowed in the ``Cache`` before
-                      it starts dropping old items
+        :arg maxsize:      Maximum number of items allowed in the ``Cache``
+                           before it starts dropping old items. May be
+                           ``None``, in which case the number of items is not
+                           limited.
+
+        :arg lru:          (least recently used) If ``False`` (the default),
+                           items are dropped according to their insertion
+                           time. Otherwise, items are dropped according to
+                           their most recent access time.
+
+        :arg maxbytes:     Maximum total size (in bytes) of all items in
+                           memory. Items which are larger than ``maxbytes``
+                           are not stored in memory.
+
+        :arg sizeof:       Function which is passed a value, and returns its
+                           size in bytes. Defaults to :func:`itemSize`.
+
+        :arg onEvict:      Function which is called whenever an item is
+                           dropped from the cache, either because the cache is
+                           full, or because the item has expired. Passed two
+                           arguments - the item key and value. Not called
+                           when items are spilled to disk, or removed via
+                           :meth:`pop` or :meth:`clear`.
+
+        :arg diskdir:      Directory in which to store items which are dropped
+                           from memory. Items are saved with ``pickle`` - items
+                           which cannot be pickled are dropped. The directory
+                           is created if it does not exist.
+
+        :arg maxdiskbytes: Maximum total size (in bytes) of all items stored
+                           in ``diskdir``.
+        """
 
-        :arg lru:     (least recently used) If ``False`` (the default), items
-                      are dropped according to their insertion time. Otherwise,
-                      items are dropped according to their most recent access
-                      time.
+        if sizeof is None:
+            sizeof = itemSize
+
+        if diskdir is not None:
+            os.makedirs(diskdir, exist_ok=True)
+
+        self.__cache        = collections.OrderedDict()
+        self.__disk         = collections.OrderedDict()
+        self.__lock         = threading.RLock()
+        self.__counter      = itertools.count()
+        self.__maxsize      = maxsize
+        self.__lru          = lru
+        self.__maxbytes     = maxbytes
+        self.__sizeof       = sizeof
+        self.__onEvict      = onEvict
+        self.__diskdir      = diskdir
+        self.__maxdiskbytes = maxdiskbytes
+        self.__nbytes       = 0
+        self.__diskbytes    = 0
+        self.__stats        = {'hits'      : 0,
+                               'misses'    : 0,
+                               'diskHits'  : 0,
+                               'evictions' : 0,
+                               'expired'   : 0,
+                               'spilled'   : 0}
+
+
+    @property
+    def nbytes(self):
+        """Returns the total size, in bytes, of all items in memory. """
+        return self.__nbytes
+
+
+    @property
+    def diskbytes(self):
+        """Returns the total size, in bytes, of all items stored on disk. """
+        return self.__diskbytes
+
+
+    def stats(self):
+        """Returns a dictionary containing statistics about this ``Cache``:
+
+          - ``hits``:      Number of successful :meth:`get` calls
+          - ``misses``:    Number of :meth:`get` calls for items which were
+                           not in the cache, or had expired
+          - ``diskHits``:  Number of hits which were loaded from disk
+          - ``evictions``: Number of items dropped because the cache was full
+          - ``expired``:   Number of items dropped because they had expired
+          - ``spilled``:   Number of items which have been saved to disk
+          - ``items``:     Number of items currently in the cache
+          - ``nbytes``:    Total size of all items in memory
+          - ``diskbytes``: Total size of all items on disk
         """
-        self.__cache   = collections.OrderedDict()
-        self.__maxsize = maxsize
-        self.__lru     = lru
+        with self.__lock:
+            stats              = dict(self.__stats)
+            stats['items']     = len(self.__cache) + len(self.__disk)
+            stats['nbytes']    = self.__nbytes
+            stats['diskbytes'] = self.__diskbytes
+        return stats
 
 
     def put(self, key, value, expiry=0):
@@ -68,11 +196,13 @@ class Cache:
                      ``0`` will not expire.
         """
 
-        if len(self.__cache) == self.__maxsize and \
-           key not in self.__cache:
-            self.__cache.popitem(last=False)
+        item    = CacheItem(key, value, expiry, self.__sizeof(value))
+        evicted = []
 
-        self.__cache[key] = CacheItem(key, value, expiry)
+        with self.__lock:
+            self.__store(item, evicted)
+
+        self.__evicted(evicted)
 
 
     def get(self, key, *args, **kwargs):
@@ -85,51 +215,64 @@ class Cache:
 
         defaultSpecified, default = self.__parseDefault(*args, **kwargs)
 
-        # Default value specified - return
-        # it if the key is not in the cache
-        if defaultSpecified:
+        evicted = []
 
-            entry = self.__cache.get(key, None)
+        try:
+            with self.__lock:
+                entry = self.__lookup(key, evicted)
 
-            if entry is None:
-                return default
+        finally:
+            self.__evicted(evicted)
 
-        # No default value specified -
-        # allow KeyErrors to propagate
-        else:
-            entry = self.__cache[key]
+        if entry is None:
+            if defaultSpecified: return default
+            else:                raise KeyError(key)
 
-        # Check to see if the entry
-        # has expired
-        now = time.time()
+        if entry is Expired:
+            if defaultSpecified: return default
+            else:                raise Expired(key)
 
-        if entry.expiry > 0:
-            if now - entry.storetime > entry.expiry:
+        return entry.value
 
-                self.__cache.pop(key)
 
-                if defaultSpecified: return default
-                else:                raise Expired(key)
+    def pop(self, key, *args, **kwargs):
+        """Remove an item from the cache, and return its value.
 
-        # If we are an lru cache, update
-        # this entry's expiry, and update
-        # its order in the cache dict
-        if self.__lru:
-            entry.storetime = now
-            self.__cache.pop(key)
-            self.__cache[key] = entry
+        :arg key:     Item identifier.
+        :arg default: Default value to return if the item is not in the cache.
+                      If not provided, a ``KeyError`` is raised.
+        """
+
+        defaultSpecified, default = self.__parseDefault(*args, **kwargs)
+
+        with self.__lock:
+            entry = self.__cache.pop(key, None)
+
+            if entry is not None:
+                self.__nbytes -= entry.nbytes
+            elif key in self.__disk:
+                entry = self.__unspill(key)
+
+        if entry is None:
+            if defaultSpecified: return default
+            else:                raise KeyError(key)
 
         return entry.value
 
 
     def clear(self):
         """Remove all items from the cache. """
-        self.__cache = collections.OrderedDict()
+        with self.__lock:
+            for key in list(self.__disk.keys()):
+                self.__removeDiskItem(key)
+            self.__cache  = collections.OrderedDict()
+            self.__nbytes = 0
 
 
     def __len__(self):
         """Returns the number of items in the cache. """
-        return len(self.__cache)
+        with self.__lock:
+            return len(self.__cache) + len(self.__disk)
 
 
     def __getitem__(self, key):
@@ -146,24 +289,232 @@ class Cache:
         """Check whether an item is in the cache. Note that the item may
         be in the cache, but it may be expired.
         """
-        return key in self.__cache
+        with self.__lock:
+            return key in self.__cache or key in self.__disk
 
 
     def keys(self):
         """Return all keys in the cache. """
-        return self.__cache.keys()
+        with self.__lock:
+            return list(self.__cache.keys()) + list(self.__disk.keys())
 
 
     def values(self):
         """Return all values in the cache. """
-        for item in self.__cache.values():
-            yield item.value
+        for _, value in self.items():
+            yield value
 
 
     def items(self):
-        """Return all (key, value) pairs in the cache. """
-        for key, item in self.__cache.items():
-            yield key, item.value
+        """Return all (key, value) pairs in the cache. Items which have been
+        spilled to disk are loaded on demand.
+        """
+        with self.__lock:
+            items  = [(k, i.value) for k, i in self.__cache.items()]
+            ondisk = list(self.__disk.keys())
+
+        yield from items
+
+        for key in ondisk:
+            with self.__lock:
+                if key not in self.__disk:
+                    continue
+                item = self.__loadDiskItem(self.__disk[key])
+            if item is not None:
+                yield key, item.value
+
+
+    def __lookup(self, key, evicted):
+        """Used by :meth:`get`. Must be called with the lock held. Returns the
+        :class:`CacheItem` for the given ``key``, ``None`` if there is no such
+        item, or :class:`Expired` if the item has expired.
+        """
+
+        entry = self.__cache.get(key, None)
+
+        # Not in memory - is
+        # it on disk?
+        if entry is None and key in self.__disk:
+            entry = self.__unspill(key)
+            if entry is not None and not entry.expired:
+                self.__stats['diskHits'] += 1
+                self.__store(entry, evicted)
+
+        if entry is None:
+            self.__stats['misses'] += 1
+            return None
+
+        # Check to see if the entry
+        # has expired
+        if entry.expired:
+            if self.__cache.get(key, None) is entry:
+                self.__cache.pop(key)
+                self.__nbytes -= entry.nbytes
+            self.__stats['misses']  += 1
+            self.__stats['expired'] += 1
+            evicted.append(entry)
+            return Expired
+
+        # If we are an lru cache, update
+        # this entry's expiry, and update
+        # its order in the cache dict
+        if self.__lru:
+            entry.storetime = time.time()
+            if key in self.__cache:
+                self.__cache.move_to_end(key)
+
+        self.__stats['hits'] += 1
+        return entry
+
+
+    def __store(self, item, evicted):
+        """Used by :meth:`put` and :meth:`get`. Must be called with the lock
+        held. Stores the given item in memory, dropping or spilling old items
+        as needed. If an item with the same key is already in memory, the
+        new item takes its position in the cache.
+        """
+
+        key = item.key
+        old = self.__cache.get(key, None)
+
+        # Replace an existing item in place
+        if old is not None:
+            self.__nbytes -= old.nbytes
+        elif key in self.__disk:
+            self.__removeDiskItem(key)
+
+        # Item is too big to store in memory
+        if self.__maxbytes is not None and item.nbytes > self.__maxbytes:
+            if old is not None:
+                self.__cache.pop(key)
+            self.__drop(item, evicted)
+            return
+
+        self.__cache[key] = item
+        self.__nbytes += item.nbytes
+
+        # Drop the oldest items until we
+        # are within our count/size limits
+        while len(self.__cache) > 1:
+
+            overcount = self.__maxsize is not None and \
+                        len(self.__cache) > self.__maxsize
+            overbytes = self.__maxbytes is not None and \
+                        self.__nbytes > self.__maxbytes
+
+            if not (overcount or overbytes):
+                break
+
+            _, oldest = self.__cache.popitem(last=False)
+            self.__nbytes -= oldest.nbytes
+            self.__drop(oldest, evicted)
+
+
+    def __drop(self, item, evicted):
+        """Must be called with the lock held. Called when an item is dropped
+        from memory. The item is either spilled to disk, or added to the
+        ``evicted`` list.
+        """
+
+        if item.expired:
+            self.__stats['expired'] += 1
+            evicted.append(item)
+        elif not self.__spill(item, evicted):
+            self.__stats['evictions'] += 1
+            evicted.append(item)
+
+
+    def __spill(self, item, evicted):
+        """Must be called with the lock held. Saves the given item to disk,
+        if a disk tier is in use. Returns ``True`` if the item was saved,
+        ``False`` otherwise.
+        """
+
+        if self.__diskdir is None:
+            return False
+
+        if self.__maxdiskbytes is not None and \
+           item.nbytes > self.__maxdiskbytes:
+            return False
+
+        fname = op.join(self.__diskdir, 'cache_{}_{}.pkl'.format(
+            id(self), next(self.__counter)))
+
+        try:
+            with open(fname, 'wb') as f:
+                pickle.dump(item, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            if os.path.exists(fname):
+                os.remove(fname)
+            return False
+
+        # The disk tier stores CacheItems which
+        # contain the file name as their value
+        diskItem                 = CacheItem(
+            item.key, fname, item.expiry, item.nbytes)
+        diskItem.storetime       = item.storetime
+        self.__disk[item.key]    = diskItem
+        self.__diskbytes        += item.nbytes
+        self.__stats['spilled'] += 1
+
+        # Drop the oldest items from disk
+        # until we are within our budget
+        while self.__maxdiskbytes is not None and \
+              self.__diskbytes > self.__maxdiskbytes:
+            key = next(iter(self.__disk))
+            if self.__onEvict is not None:
+                oldest = self.__loadDiskItem(self.__disk[key])
+            else:
+                oldest = None
+            self.__removeDiskItem(key)
+            self.__stats['evictions'] += 1
+            if oldest is not None:
+                evicted.append(oldest)
+
+        return True
+
+
+    def __unspill(self, key):
+        """Must be called with the lock held. Removes the item with the given
+        key from disk, and returns it, or ``None`` if it could not be loaded.
+        """
+        item = self.__loadDiskItem(self.__disk[key])
+        self.__removeDiskItem(key)
+        return item
+
+
+    def __loadDiskItem(self, diskItem):
+        """Must be called with the lock held. Loads and returns the
+        :class:`CacheItem` that was saved to the given file, or ``None``
+        if it could not be loaded.
+        """
+        try:
+            with open(diskItem.value, 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            return None
+
+
+    def __removeDiskItem(self, key):
+        """Must be called with the lock held. Removes the item with the given
+        key from the disk tier.
+        """
+        diskItem          = self.__disk.pop(key)
+        self.__diskbytes -= diskItem.nbytes
+        try:
+            os.remove(diskItem.value)
+        except OSError:
+            pass
+
+
+    def __evicted(self, evicted):
+        """Calls the ``onEvict`` function (if one was provided) for each of
+        the given items. Called without the lock held.
+        """
+        if self.__onEvict is None:
+            return
+        for item in evicted:
+            self.__onEvict(item.key, item.value)
 
 
     def __parseDefault(self, *args, **kwargs):
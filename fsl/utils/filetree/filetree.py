@@ -1,5 +1,5 @@
 from pathlib import Path, PurePath
-from typing import Tuple, Optional, Dict, Any, Set
+from typing import Tuple, Optional, Dict, Any, Set, Sequence, List
 from . import parse
 import pickle
 import json
@@ -170,6 +170,64 @@ class FileTree(object):
             res.parents[0].mkdir(parents=True, exist_ok=True)
         return str(res)
 
+    def get_many(self, short_name: str, variables: Sequence[Dict[str, Any]], set_parent=True, make_dir=False) -> List[str]:
+        """
+        Gets the full filenames for many sets of variables
+
+        tree.get_many(short_name, variables) == [tree.update(**vars).get(short_name) for vars in variables]
+
+        The template is only parsed once, and no copies of the tree are made, so this is much faster than
+        calling `update` and `get` for every set of variables.
+
+        :param short_name: short name of the path template
+        :param variables: sequence of dictionaries with variables to update (see :meth:`update`)
+        :param set_parent: Update the variables of the top-level rather than current tree if True.
+            Ony relevant if `self` is a sub-tree.
+        :param make_dir: if True make sure that the directories leading to the files exist
+        :return: list of full filenames
+        """
+        template_tree, text = self._get_template_tree(short_name)
+        template = utils.Template.parse(text)
+
+        set_tree = self
+        while set_parent and set_tree.parent is not None:
+            set_tree = set_tree.parent
+
+        # variables from the trees above (before) and
+        # below (after) the tree that is being updated,
+        # in the chain of trees containing the template
+        chain = [template_tree]
+        while chain[0].parent is not None:
+            chain.insert(0, chain[0].parent)
+        before, after = {}, {}
+        target = before
+        for tree in chain:
+            if tree is set_tree:
+                target = after
+            else:
+                target.update(tree.variables)
+        if target is before:
+            set_tree = None
+
+        res = []
+        for new_vars in variables:
+            all_vars = dict(before)
+            if set_tree is not None:
+                all_vars.update(set_tree.variables)
+                for key, value in new_vars.items():
+                    if value is None:
+                        all_vars.pop(key, None)
+                        if key in before:
+                            all_vars[key] = before[key]
+                    else:
+                        all_vars[key] = value
+                all_vars.update(after)
+            filename = Path(template.resolve(all_vars))
+            if make_dir:
+                filename.parents[0].mkdir(parents=True, exist_ok=True)
+            res.append(str(filename))
+        return res
+
     def get_all(self, short_name: str, glob_vars=()) -> Tuple[str]:
         """
         Gets all existing directory/file names matching a specific pattern
@@ -180,8 +238,7 @@ class FileTree(object):
             If glob_vars is set to 'all', all undefined variables will be used to look up matches.
         :return: sequence of paths
         """
-        return tuple([self.update(**vars).get(short_name)
-                      for vars in self.get_all_vars(short_name, glob_vars=glob_vars)])
+        return tuple(self.get_many(short_name, self.get_all_vars(short_name, glob_vars=glob_vars)))
 
     def get_all_vars(self, short_name: str, glob_vars=()) -> Tuple[Dict[str, str]]:
         """
@@ -18,20 +18,32 @@ defined in this module:
    :nosignatures:
 
    scan
+   treeKey
    allVariables
 """
 
 
-import              logging
-import              collections
-import functools as ft
+import                   os
+import                   re
+import                   time
+import                   pickle
+import                   hashlib
+import                   logging
+import                   tempfile
+import                   collections
+import functools      as ft
+import concurrent.futures as futures
 
 import os.path as op
 from typing import Dict, List, Tuple
 
 import numpy as np
 
+import fsl.version    as fslversion
+import fsl.utils.path as fslpath
+
 from . import FileTree
+from . import utils
 
 
 log = logging.getLogger(__name__)
@@ -81,89 +93,120 @@ class FileTreeQuery(object):
     """
 
 
-    def __init__(self, tree):
+    def __init__(self, tree, nthreads=None, cachedir=None):
         """Create a ``FileTreeQuery``. The contents of the tree directory are
         scanned via the :func:`scan` function, which may take some time for
         large data sets.
 
-        :arg tree: The :class:`.FileTree` object
+        If a ``cachedir`` is provided, the ``FileTreeQuery`` is saved to a
+        file in that directory, named according to the :func:`treeKey` of
+        the tree. When a ``FileTreeQuery`` is subsequently created for the
+        same tree, the cache file is loaded, and only those directories
+        which have been modified since it was saved are re-scanned. If no
+        directories have been modified, the cached ``FileTreeQuery`` is
+        used as-is.
+
+        :arg tree:     The :class:`.FileTree` object
+        :arg nthreads: Number of threads to use when scanning the directory -
+                       passed through to :func:`scan`.
+        :arg cachedir: Directory in which to store a persistent cache.
         """
         # Hard-code into the templates any pre-defined variables
         tree = tree.partial_fill()
 
-        # Find all files present in the directory
-        # (as Match objects), and find all variables,
-        # plus their values, and all templates,
-        # that are present in the directory.
-        matches               = scan(tree)
+        if cachedir is None:
+            self.__build(tree, scan(tree, nthreads))
+            return
+
+        cachefile = op.join(cachedir, '{}.pkl'.format(treeKey(tree)))
+        cached    = _loadCache(cachefile)
+
+        if cached is None: index, state = ScanIndex(), None
+        else:              index, state = cached
+
+        matches = scan(tree, nthreads, index)
+
+        if state is not None and not index.changed:
+            log.debug('Using cached FileTreeQuery from %s', cachefile)
+            self.__dict__.update(state)
+        else:
+            self.__build(tree, matches)
+
+        if state is None or index.changed or index.rescanned > 0:
+            _saveCache(cachefile, index, self.__dict__)
+
+
+    def __build(self, tree, matches):
+        """Called by :meth:`__init__`. Builds the match index from the
+        given list of :class:`Match` objects.
+        """
+
+        # Find all variables, plus their
+        # values, and all templates, that
+        # are present in the directory.
         allvars, templatevars = allVariables(tree, matches)
 
-        # Now we are going to build a series of ND
-        # arrays to store Match objects. We create
-        # one array for each template. Each axis
-        # in an array corresponds to a variable
-        # present in files of that template type,
-        # and each position along an axis corresponds
-        # to one value of that variable.
+        # Now we are going to build a columnar
+        # index of Match objects for each
+        # template. Each template has a 2D
+        # array of integer codes, with one row
+        # for each Match, and one column for
+        # each variable present in files of
+        # that template type - the code is the
+        # index of the variable value in the
+        # sorted list of all values for that
+        # variable.
         #
-        # These arrays will be used to store and
-        # retrieve Match objects - given a template
-        # and a set of variable values, we can
-        # quickly find the corresponding Match
-        # object (or objects).
-
-        # matcharrays contains {template : ndarray}
-        # mappings, and varidxs contains
-        # {template : {varvalue : index}} mappings
-        matcharrays = {}
+        # These arrays are used to quickly
+        # find the Match objects for a given
+        # template and set of variable values,
+        # without having to store a dense array
+        # covering every possible combination
+        # of variable values.
+
+        # varidxs contains {template : {var :
+        # {varvalue : index}}} mappings
         varidxs     = {}
+        tmatches    = collections.defaultdict(list)
+        matchcodes  = {}
+        matchtables = {}
 
         for template, tvars in templatevars.items():
+            varidxs[template] = {v : {n : i for i, n in enumerate(allvars[v])}
+                                 for v in tvars}
 
-            tvarlens = [len(allvars[v]) for v in tvars]
-
-            # "Scalar" match objects - templates
-            # which have no variables, and for
-            # which zero or one file is present
-            if len(tvarlens) == 0:
-                tvarlens = 1
+        for match in matches:
+            tmatches[match.full_name].append(match)
 
-            # An ND array for this short
-            # name. Each element is a
-            # Match object, or nan.
-            matcharray    = np.zeros(tvarlens, dtype=object)
-            matcharray[:] = np.nan
+        for template, tvars in templatevars.items():
 
-            # indices into the match array
-            # for each variable value
-            tvaridxs = {}
-            for v in tvars:
-                tvaridxs[v] = {n : i for i, n in enumerate(allvars[v])}
+            tvaridxs = varidxs[template]
+            tmatch   = tmatches[template]
+            codes    = np.zeros((len(tmatch), len(tvars)), dtype=np.int32)
 
-            matcharrays[template] = matcharray
-            varidxs[    template] = tvaridxs
+            for i, match in enumerate(tmatch):
+                mvars = match.variables
+                for j, var in enumerate(tvars):
+                    codes[i, j] = tvaridxs[var][mvars[var]]
 
-        # Populate the match arrays
-        for match in matches:
-            tvars    = templatevars[match.full_name]
-            tvaridxs = varidxs[     match.full_name]
-            tarr     = matcharrays[ match.full_name]
-            idx      = []
+            # Store the matches in order of their
+            # variable values, so query results
+            # are returned in a consistent order.
+            order = np.lexsort(codes.T[::-1]) if len(tvars) > 0 \
+                    else np.arange(len(tmatch))
 
-            if len(match.variables) == 0:
-                idx = [0]
-            else:
-                for var in tvars:
-                    val = match.variables[var]
-                    idx.append(tvaridxs[var][val])
+            table    = np.empty(len(tmatch), dtype=object)
+            table[:] = tmatch
 
-            tarr[tuple(idx)] = match
+            matchcodes[ template] = codes[order]
+            matchtables[template] = table[order]
 
         self.__tree          = tree
         self.__allvars       = allvars
         self.__templatevars  = templatevars
         self.__matches       = matches
-        self.__matcharrays   = matcharrays
+        self.__matchcodes    = matchcodes
+        self.__matchtables   = matchtables
         self.__varidxs       = varidxs
 
 
@@ -229,29 +272,51 @@ class FileTreeQuery(object):
                   ``asarray=True``).
         """
 
-        varnames    = list(variables.keys())
         allvarnames = self.__templatevars[template]
         varidxs     = self.__varidxs[     template]
-        matcharray  = self.__matcharrays[ template]
-        slc         = []
+        codes       = self.__matchcodes[  template]
+        table       = self.__matchtables[ template]
+        mask        = np.ones(len(table), dtype=bool)
+        shape       = []
+        fixed       = []
+
+        for i, var in enumerate(allvarnames):
+
+            val = variables.get(var, '*')
+
+            # Variables which are specified retain
+            # an axis of length 1, so that the axis
+            # labels returned by the axes() method
+            # are valid for the array.
+            if val == '*':
+                shape.append(len(self.__allvars[var]))
+            else:
+                mask &= codes[:, i] == varidxs[var][val]
+                shape.append(1)
+                fixed.append(i)
 
-        for var in allvarnames:
+        hits = np.flatnonzero(mask)
 
-            if var in varnames: val = variables[var]
-            else:               val = '*'
+        if not asarray:
+            return list(table[hits])
 
-            # We're using np.newaxis to retain
-            # the full dimensionality of the
-            # array, so that the axis labels
-            # returned by the axes() method
-            # are valid.
-            if val == '*': slc.append(slice(None))
-            else:          slc.extend([np.newaxis, varidxs[var][val]])
+        # "Scalar" templates, which have no
+        # variables, and for which zero or
+        # one file is present
+        if len(shape) == 0:
+            result    = np.empty(1, dtype=object)
+            result[:] = np.nan
+            if len(hits) > 0:
+                result[0] = table[hits[0]]
+            return result
 
-        result = matcharray[tuple(slc)]
+        idxs           = codes[hits]
+        idxs[:, fixed] = 0
+        result         = np.empty(shape, dtype=object)
+        result[:]      = np.nan
+        result[tuple(idxs.T)] = table[hits]
 
-        if asarray: return result
-        else:       return [m for m in result.flat if isinstance(m, Match)]
+        return result
 
 
 @ft.total_ordering
@@ -344,30 +409,455 @@ class Match(object):
         return repr(self)
 
 
-def scan(tree : FileTree) -> List[Match]:
+class ScanIndex(object):
+    """A ``ScanIndex`` stores the results of a :func:`scan`, so that they can
+    be re-used by subsequent scans of the same directory. A ``ScanIndex``
+    contains:
+
+     - ``key``:         A key identifying the ``FileTree`` (see
+                        :func:`treeKey`). If a ``ScanIndex`` is passed
+                        to :func:`scan` with a different tree, it is
+                        cleared.
+     - ``layout``:      The directory layout of the tree (root directory,
+                        maximum depth, and sub-directory name patterns).
+     - ``directories``: A dict of ``{dirname : DirectoryRecord}`` mappings,
+                        for every directory that was traversed.
+     - ``candidates``:  A dict containing the templates/variables that were
+                        extracted from each file name.
+     - ``resolved``:    A dict containing the file names that were generated
+                        from each set of extracted variables.
+     - ``matches``:     The list of :class:`Match` objects from the most
+                        recent scan.
+     - ``changed``:     ``True`` if the contents of the directory changed
+                        during the most recent scan.
+     - ``rescanned``:   The number of directories which had to be re-read
+                        during the most recent scan.
+    """
+
+
+    def __init__(self, key=None):
+        """Create a ``ScanIndex``. """
+        self.key         = key
+        self.layout      = None
+        self.directories = {}
+        self.candidates  = {}
+        self.resolved    = {}
+        self.matches     = None
+        self.changed     = True
+        self.rescanned   = 0
+
+
+DirectoryRecord = collections.namedtuple(
+    'DirectoryRecord', ('mtime', 'scanned', 'files', 'subdirs'))
+"""Contents of a directory, as stored in a :class:`ScanIndex` by
+:func:`scan`. The ``mtime`` is the directory modification time (in
+nanoseconds), ``scanned`` is the time (in nanoseconds) at which the directory
+was read, ``files`` is a tuple containing the paths of all files in the
+directory, and ``subdirs`` is a tuple of ``(dirname, prefix)`` pairs for all
+sub-directories which need to be traversed.
+"""
+
+
+def treeKey(tree : FileTree) -> str:
+    """Generates a key which uniquely identifies the given ``FileTree``,
+    based on its templates, variables, and sub-trees, and the current
+    working directory (as tree templates may be relative paths).
+    """
+
+    def describe(tree):
+        return (type(tree).__name__,
+                tree.name,
+                sorted(tree.templates.items()),
+                sorted((k, repr(v)) for k, v in tree.all_variables.items()),
+                [(name, describe(sub_tree))
+                 for name, sub_tree in sorted(tree.sub_trees.items())])
+
+    desc = repr((os.getcwd(), describe(tree)))
+    return hashlib.sha256(desc.encode()).hexdigest()
+
+
+def scan(tree     : FileTree,
+         nthreads : int       = None,
+         index    : ScanIndex = None) -> List[Match]:
     """Scans the directory of the given ``FileTree`` to find all files which
     match a tree template.
 
-    :arg tree: :class:`.FileTree` to scan
-    :returns:  list of :class:`Match` objects
+    The directory is traversed once (see :func:`_walkDirectory`), and every
+    file that is found is compared against the templates of the tree and all
+    of its sub-trees. A file is matched against a template under the same
+    rules that would be applied by :meth:`.FileTree.get_all_vars` with
+    ``glob_vars='all'``, i.e. the same ``Match`` objects are returned as if
+    each template had been globbed separately.
+
+    If a :class:`ScanIndex` is provided, it is updated with the results of
+    the scan. If the same ``ScanIndex`` has been used in a previous scan of
+    the tree, directories whose modification time has not changed are not
+    re-read, and file names that have already been seen are not re-matched.
+    If nothing has changed, the ``Match`` objects from the previous scan are
+    returned.
+
+    :arg tree:     :class:`.FileTree` to scan
+    :arg nthreads: Number of threads to use when traversing the directory.
+                   If greater than one, the top-level sub-directories are
+                   traversed in parallel.
+    :arg index:    :class:`ScanIndex` to use and update.
+    :returns:      list of :class:`Match` objects
     """
 
-    matches = []
-    for template in tree.templates:
+    if index is None:
+        index = ScanIndex()
+
+    tkey = treeKey(tree)
+    if index.key != tkey:
+        index.__init__(tkey)
+
+    # [(tree, template, cleaned template, [(subset, pattern)])]
+    templates = None
+
+    if index.layout is None:
+        templates    = _templatePatterns(tree)
+        index.layout = _directoryLayout(templates)
+
+    if index.layout[0] is None:
+        index.matches = []
+        return []
+
+    rootdir, prefix, maxdepth, dirpats = index.layout
+    dirpats  = [re.compile(p) for p in dirpats]
+    previous = index.directories
+    records  = _walkDirectory(rootdir, prefix, dirpats, maxdepth,
+                              nthreads, previous)
+
+    index.directories = records
+    index.rescanned   = sum(records[d] is not previous.get(d)
+                            for d in records)
+    index.changed     = index.matches is None                    or \
+                        records.keys() != previous.keys()        or \
+                        any(records[d][2:] != previous[d][2:]
+                            for d in records)
+
+    if not index.changed:
+        return list(index.matches)
+
+    if templates is None:
+        templates = _templatePatterns(tree)
+
+    files = [f for record in records.values() for f in record.files]
+
+    # Group the patterns by number of path
+    # components, so each file is only
+    # compared against templates which
+    # could possibly match it.
+    bydepth = collections.defaultdict(list)
+    for tidx, (_, _, _, subsets) in enumerate(templates):
+        for to_fill, pat in subsets:
+            regex = re.compile('/'.join(_globComponentRegex(c) for c in pat))
+            bydepth[len(pat)].append((tidx, to_fill, regex))
+
+    # Optional variables which are not present
+    # in a file name are given a value of None
+    optionals = [t[2].optional_variables() for t in templates]
+
+    # {filename : [(tidx, tuple(variables))]}
+    candidates = {}
+    for filename in files:
+
+        fcands = index.candidates.get(filename)
+
+        if fcands is None:
+            fcands = []
+            for tidx, to_fill, regex in bydepth[filename.count('/') + 1]:
+                if regex.fullmatch(filename) is None:
+                    continue
+                try:
+                    variables = to_fill.extract_variables(filename)
+                except ValueError:
+                    continue
+                for name in optionals[tidx]:
+                    variables.setdefault(name, None)
+                fcands.append((tidx, tuple(sorted(variables.items(),
+                                                  key=lambda item: item[0]))))
+            fcands = tuple(fcands)
+
+        candidates[filename] = fcands
+
+    # {tidx : {tuple(variables) : None}} (dicts
+    # are used as insertion-ordered sets)
+    found = collections.defaultdict(dict)
+    for fcands in candidates.values():
+        for tidx, variables in fcands:
+            found[tidx][variables] = None
+
+    existing = {op.normpath(f) for f in files}
+    resolved = {}
+    matches  = []
+    for tidx, (ttree, template, _, _) in enumerate(templates):
+
+        # Generate file names for any new sets of
+        # variables - this is equivalent to calling
+        # tree.update(**variables).get(template)
+        keys = list(found[tidx])
+        new  = []
+        for key in keys:
+            if (tidx, key) in index.resolved:
+                resolved[tidx, key] = index.resolved[tidx, key]
+            else:
+                new.append(key)
+        filenames = ttree.get_many(template, [dict(k) for k in new])
+        for key, filename in zip(new, filenames):
+            resolved[tidx, key] = filename
+
+        tmatches = []
+        for key in keys:
+            filename = resolved[tidx, key]
+            if op.normpath(filename) not in existing and \
+               not op.isfile(filename):
+                continue
+            tmatches.append(Match(filename, template, ttree, dict(key)))
+        matches.extend(sorted(tmatches))
 
-        for variables in tree.get_all_vars(template, glob_vars='all'):
+    index.candidates = candidates
+    index.resolved   = resolved
+    index.matches    = matches
 
-            filename = tree.update(**variables).get(template)
+    return list(matches)
 
-            if not op.isfile(filename):
-                continue
 
-            matches.append(Match(filename, template, tree, variables))
+def _templatePatterns(tree : FileTree) -> List[Tuple]:
+    """Used by :func:`scan`. Generates glob patterns for every optional
+    subset of every template in the given ``tree`` and its sub-trees.
 
-    for tree_name, sub_tree in tree.sub_trees.items():
-        matches.extend(scan(sub_tree))
+    :returns: A list of ``(tree, template, cleaned, subsets)`` tuples, where
+              ``cleaned`` is the :class:`.Template` with known variables
+              filled in, and ``subsets`` is a list of ``(subset, pattern)``
+              tuples, where ``pattern`` is a list of path components of
+              the glob pattern for the subset.
+    """
+    templates = []
+    for template in tree.templates:
+        text, variables = tree.get_template(template)
+        cleaned         = utils.Template.parse(text).fill_known(variables)
+        globvars        = set.union(cleaned.required_variables(),
+                                    cleaned.optional_variables())
+        subsets         = []
+        for to_fill in cleaned.optional_subsets():
+            pattern = str(to_fill.fill_known({v : '*' for v in globvars}))
+            while '//' in pattern:
+                pattern = pattern.replace('//', '/')
+            subsets.append((to_fill, pattern.split('/')))
+        templates.append((tree, template, cleaned, subsets))
+
+    for sub_tree in tree.sub_trees.values():
+        templates.extend(_templatePatterns(sub_tree))
+
+    return templates
+
+
+def _globComponentRegex(comp : str) -> str:
+    """Used by :func:`scan`. Converts one path component of a glob pattern
+    into a regular expression. As with ``glob``, wildcards do not match
+    hidden files, unless the component itself starts with a ``'.'``.
+    """
+    if '*' not in comp:
+        return re.escape(comp)
+    regex = '[^/]*'.join(re.escape(c) for c in comp.split('*'))
+    if not comp.startswith('.'):
+        regex = r'(?!\.)' + regex
+    return '(?:{})'.format(regex)
+
+
+def _directoryLayout(templates : List[Tuple]) -> Tuple:
+    """Used by :func:`scan`. Identifies the deepest directory which is
+    common to all templates, the maximum depth, relative to that directory,
+    that needs to be traversed, and patterns which sub-directory names must
+    match at each depth.
+
+    :arg templates: List of templates, as returned by
+                    :func:`_templatePatterns`.
+    :returns:       A tuple containing the root directory, a prefix for all
+                    file paths, the maximum depth, and a list of regular
+                    expressions for each depth. If there are no templates,
+                    all values are ``None``.
+    """
+
+    # Patterns are stored as
+    # lists of path components
+    patterns = [pat for t in templates for _, pat in t[3]]
+
+    if len(patterns) == 0:
+        return None, None, None, None
+
+    rootcomps = op.commonprefix([pat[:-1] for pat in patterns])
+    for i, comp in enumerate(rootcomps):
+        if '*' in comp:
+            rootcomps = rootcomps[:i]
+            break
+    nroot     = len(rootcomps)
+    maxdepth  = max(len(pat) for pat in patterns) - nroot
+
+    # Directories are only descended into
+    # if their name matches the corresponding
+    # component of at least one template.
+    dirpats = []
+    for depth in range(maxdepth - 1):
+        comps = {_globComponentRegex(pat[nroot + depth])
+                 for pat in patterns
+                 if len(pat) - nroot > depth + 1}
+        dirpats.append('|'.join(sorted(comps)))
+
+    if len(rootcomps) == 0:
+        rootdir, prefix = '.', ''
+    else:
+        prefix  = '/'.join(rootcomps) + '/'
+        rootdir = prefix
+
+    return rootdir, prefix, maxdepth, dirpats
+
+
+def _walkDirectory(
+        rootdir  : str,
+        prefix   : str,
+        dirpats  : List,
+        maxdepth : int,
+        nthreads : int                        = None,
+        previous : Dict[str, DirectoryRecord] = None
+) -> Dict[str, DirectoryRecord]:
+    """Used by :func:`scan`. Traverses ``rootdir`` with ``os.scandir``,
+    returning a :attr:`DirectoryRecord` for every directory that is
+    traversed.
+
+    :arg rootdir:  Directory to traverse
+    :arg prefix:   Prefix to prepend to the returned file paths
+    :arg dirpats:  Sequence of compiled regular expressions, one for each
+                   depth. Sub-directories are only traversed if their name
+                   matches the expression for their depth.
+    :arg maxdepth: Maximum depth to descend to.
+    :arg nthreads: Number of threads - if greater than one, each top-level
+                   sub-directory is traversed in a separate task.
+    :arg previous: Records from a previous traversal. Directories whose
+                   modification time has not changed are not re-read.
+    :returns:      A dict of ``{dirname : DirectoryRecord}`` mappings.
+    """
 
-    return matches
+    if previous is None:
+        previous = {}
+
+    def read(dirname, prefix, depth):
+        try:
+            mtime = os.stat(dirname).st_mtime_ns
+        except OSError:
+            return None
+
+        record = previous.get(dirname)
+        if record is not None                                 and \
+           record.mtime == mtime                              and \
+           fslpath.isSettled(record.mtime, record.scanned):
+            return record
+
+        scanned = time.time_ns()
+        files   = []
+        subdirs = []
+        try:
+            with os.scandir(dirname) as entries:
+                for entry in entries:
+                    path = prefix + entry.name
+                    try:
+                        if entry.is_file():
+                            files.append(path)
+                        elif entry.is_dir()             and \
+                             depth + 1 < maxdepth       and \
+                             dirpats[depth].fullmatch(entry.name):
+                            subdirs.append((entry.path, path + '/'))
+                    except OSError:
+                        pass
+        except OSError:
+            return None
+
+        return DirectoryRecord(mtime, scanned, tuple(sorted(files)),
+                               tuple(sorted(subdirs)))
+
+    def walk(dirname, prefix, depth, records, recurse=True):
+        record = read(dirname, prefix, depth)
+        if record is None:
+            return records
+        records[dirname] = record
+        if recurse:
+            for subdir, subprefix in record.subdirs:
+                walk(subdir, subprefix, depth + 1, records)
+        return records
+
+    if nthreads is None or nthreads <= 1:
+        return walk(rootdir, prefix, 0, {})
+
+    records = walk(rootdir, prefix, 0, {}, recurse=False)
+
+    if rootdir not in records:
+        return records
+
+    with futures.ThreadPoolExecutor(nthreads) as pool:
+        tasks = [pool.submit(walk, d, p, 1, {})
+                 for d, p in records[rootdir].subdirs]
+        for task in tasks:
+            records.update(task.result())
+
+    return records
+
+
+_CACHE_VERSION = 2
+"""Version number of the :class:`FileTreeQuery` cache file format. Cache
+files with a different version are ignored.
+"""
+
+
+def _loadCache(cachefile : str) -> Tuple[ScanIndex, Dict]:
+    """Used by :class:`FileTreeQuery`. Loads a cache file that was saved by
+    :func:`_saveCache`. Returns a tuple containing a :class:`ScanIndex`, and
+    the ``FileTreeQuery`` state, or ``None`` if the file does not exist or
+    cannot be loaded.
+    """
+    try:
+        with open(cachefile, 'rb') as f:
+            cached = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.warning('Unable to load FileTreeQuery cache %s: %s',
+                    cachefile, e)
+        return None
+
+    if not isinstance(cached, dict)                   or \
+       cached.get('version')     != _CACHE_VERSION    or \
+       cached.get('fslversion')  != fslversion.__version__:
+        return None
+
+    return cached['index'], cached['state']
+
+
+def _saveCache(cachefile : str, index : ScanIndex, state : Dict):
+    """Used by :class:`FileTreeQuery`. Saves the given :class:`ScanIndex` and
+    ``FileTreeQuery`` state to ``cachefile``. The file is written atomically,
+    so concurrent readers will never see a partially written file.
+    """
+    cached = {'version'    : _CACHE_VERSION,
+              'fslversion' : fslversion.__version__,
+              'index'      : index,
+              'state'      : state}
+
+    cachedir = op.dirname(op.abspath(cachefile))
+
+    try:
+        os.makedirs(cachedir, exist_ok=True)
+        fd, tmpfile = tempfile.mkstemp(dir=cachedir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpfile, cachefile)
+        except Exception:
+            os.remove(tmpfile)
+            raise
+    except Exception as e:
+        log.warning('Unable to save FileTreeQuery cache %s: %s',
+                    cachefile, e)
 
 
 def allVariables(
@@ -1,7 +1,8 @@
 import re
 import itertools
+import functools
 import glob
-from typing import List, Sequence, Set, Tuple, Dict, Iterator
+from typing import List, Sequence, Set, Tuple, Dict, Iterator, Optional as Opt
 
 
 class Part:
@@ -136,12 +137,17 @@ class Template:
             raise ValueError("Input to Template should be a sequence of parts; " +
                              "did you mean to call `Template.parse` instead?")
         self.parts = tuple(parts)
+        self._matchers = None
+        self._filled = {}
 
     @classmethod
+    @functools.lru_cache(maxsize=1024)
     def parse(cls, text: str) -> "Template":
         """
         Parses a text template into its constituent parts
 
+        Templates are immutable, so the result is cached and shared between calls with the same text
+
         :param text: input template as string
         :return: same template split into its parts
         """
@@ -229,11 +235,53 @@ class Template:
         :param variables: mapping of variable names to values
         :return: cleaned string
         """
+        resolved = self._resolve_single_pass(variables)
+        if resolved is not None:
+            return resolved
         clean_template = self.fill_known(variables).remove_optionals()
         if len(clean_template.required_variables()) > 0:
             raise KeyError("Variables %s not defined" % clean_template.required_variables())
         return str(clean_template)
 
+    def _resolve_single_pass(self, variables) -> Opt[str]:
+        """
+        Helper method for :meth:`resolve`
+
+        Resolves the template in a single pass over its parts. This is only possible if none of the variable
+        values are themselves templates; otherwise None is returned, and the template has to be filled
+        in iteratively by :meth:`fill_known`.
+        """
+        def fill(parts, result):
+            for p in parts:
+                if isinstance(p, Literal):
+                    result.append(p.text)
+                elif isinstance(p, Required):
+                    if p.var_name not in variables:
+                        return False
+                    value = format(variables[p.var_name], p.var_formatting or '')
+                    if '{' in value or '[' in value:
+                        return None
+                    result.append(value)
+                elif isinstance(p, Optional):
+                    sub_result = []
+                    sub_filled = fill(p.sub_template.parts, sub_result)
+                    if sub_filled is None:
+                        return None
+                    if sub_filled:
+                        result.extend(sub_result)
+                else:
+                    return None
+            return True
+
+        result = []
+        filled = fill(self.parts, result)
+        if filled is None:
+            return None
+        if not filled:
+            # let resolve raise the appropriate error
+            return None
+        return ''.join(result)
+
     def get_all(self, variables, glob_vars=()) -> Tuple[Dict[str, str]]:
         """
         Gets all variables for files on disk matching the templates
@@ -279,6 +327,54 @@ class Template:
             for exclude_optional in itertools.combinations(optionals, n_optional):
                 yield self.remove_optionals(exclude_optional)
 
+    def matchers(self, ) -> Tuple[Tuple["re.Pattern", Tuple[str]]]:
+        """
+        Compiled regular expressions matching every optional subset of the template
+
+        These are constructed on first use, and cached, as templates are immutable
+
+        :return: sequence of (compiled regular expression, ordered variables) tuples; one for each optional subset
+        """
+        if self._matchers is None:
+            all_vars = self.required_variables().union(self.optional_variables())
+            matchers = []
+            for to_fill in self.optional_subsets():
+                sub_re = str(to_fill.fill_known(
+                    {var: r'(\S+)' for var in all_vars},
+                ))
+                while '//' in sub_re:
+                    sub_re = sub_re.replace('//', '/')
+                sub_re = sub_re.replace('.', r'\.')
+                compiled = re.compile(sub_re)
+                ordered_vars = tuple(to_fill.ordered_variables())
+                assert len(ordered_vars) == compiled.groups
+                matchers.append((compiled, ordered_vars))
+            self._matchers = tuple(matchers)
+        return self._matchers
+
+    def _fill_known_cached(self, known_vars) -> "Template":
+        """
+        Helper method for :meth:`extract_variables`, which caches the result of :meth:`fill_known`
+
+        Only the variables present in the template are used to look up the cached template
+        """
+        if known_vars is None:
+            return self
+        key = tuple(sorted((name, known_vars[name]) for name in set(self.ordered_variables())
+                           if name in known_vars))
+        if len(key) == 0:
+            return self
+        try:
+            template = self._filled.get(key)
+        except TypeError:
+            return self.fill_known(known_vars)
+        if template is None:
+            if len(self._filled) >= 128:
+                self._filled.clear()
+            template = self.fill_known(dict(key))
+            self._filled[key] = template
+        return template
+
     def extract_variables(self, filename, known_vars=None):
         """
         Extracts the variable values from the filename
@@ -287,31 +383,18 @@ class Template:
         :param known_vars: already known variables
         :return: dictionary from variable names to string representations (unused variables set to None)
         """
-        if known_vars is not None:
-            template = self.fill_known(known_vars)
-        else:
-            template = self
+        template = self._fill_known_cached(known_vars)
         while '//' in filename:
             filename = filename.replace('//', '/')
 
-        required = template.required_variables()
         optional = template.optional_variables()
         results = []
-        for to_fill in template.optional_subsets():
-            sub_re = str(to_fill.fill_known(
-                {var: r'(\S+)' for var in required.union(optional)},
-            ))
-            while '//' in sub_re:
-                sub_re = sub_re.replace('//', '/')
-            sub_re = sub_re.replace('.', r'\.')
-            match = re.match(sub_re, filename)
+        for compiled, ordered_vars in template.matchers():
+            match = compiled.match(filename)
             if match is None:
                 continue
 
             extracted_value = {}
-            ordered_vars = to_fill.ordered_variables()
-            assert len(ordered_vars) == len(match.groups())
-
             failed = False
             for var, value in zip(ordered_vars, match.groups()):
                 if var in extracted_value:
@@ -322,7 +405,7 @@ class Template:
                     extracted_value[var] = value
             if failed or any('/' in value for value in extracted_value.values()):
                 continue
-            for name in template.optional_variables():
+            for name in optional:
                 if name not in extracted_value:
                     extracted_value[name] = None
             if known_vars is not None:
@@ -330,6 +413,8 @@ class Template:
             results.append(extracted_value)
         if len(results) == 0:
             raise ValueError("{} did not match {}".format(filename, template))
+        if len(results) == 1:
+            return results[0]
 
         def score(variables):
             """
@@ -348,6 +433,30 @@ class Template:
                 raise KeyError("Multiple equivalent ways found to parse {} using {}".format(filename, template))
         return best
 
+    def extract_variables_many(self, filenames, known_vars=None, ignore_missing=False) -> List[Opt[Dict[str, str]]]:
+        """
+        Extracts the variable values from many filenames
+
+        The template is filled in and compiled only once, so the cost per filename
+        is one regular expression match for each optional subset of the template.
+
+        :param filenames: sequence of filenames
+        :param known_vars: already known variables
+        :param ignore_missing: if True, None is returned for any filename which does not match the template,
+            rather than raising a ValueError
+        :return: list of dictionaries from variable names to string representations (unused variables set to None)
+        """
+        template = self._fill_known_cached(known_vars)
+        results = []
+        for filename in filenames:
+            try:
+                results.append(template.extract_variables(filename, known_vars))
+            except ValueError:
+                if not ignore_missing:
+                    raise
+                results.append(None)
+        return results
+
 
 def resolve(template, variables):
     """
@@ -403,3 +512,16 @@ def extract_variables(template, filename, known_vars=None):
     :return: dictionary from variable names to string representations (unused variables set to None)
     """
     return Template.parse(template).extract_variables(filename, known_vars)
+
+
+def extract_variables_many(template, filenames, known_vars=None, ignore_missing=False):
+    """
+    Extracts the variable values from many filenames
+
+    :param template: template matching the given filenames
+    :param filenames: sequence of filenames
+    :param known_vars: already known variables
+    :param ignore_missing: if True, None is returned for filenames which do not match the template
+    :return: list of dictionaries from variable names to string representations (unused variables set to None)
+    """
+    return Template.parse(template).extract_variables_many(filenames, known_vars, ignore_missing)
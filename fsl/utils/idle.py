@@ -44,6 +44,7 @@ Thread tasks
    run
    wait
    TaskThread
+   TaskPool
 
 
 The :func:`run` function simply runs a task in a separate thread.  This
@@ -62,6 +63,9 @@ the task (via :func:`idle`).
 
 
 The :class:`TaskThread` class is a simple thread which runs a queue of tasks.
+The :class:`TaskPool` class offers the same interface, but runs tasks on a
+pool of threads, and supports task priorities, coalescing, and timing
+statistics.
 
 
 Other facilities
@@ -74,11 +78,16 @@ The ``mutex`` decorator uses the :class:`MutexFactory` class to do its work.
 """
 
 
+import os
+import math
 import time
+import heapq
 import atexit
 import logging
+import itertools
 import functools
 import threading
+import collections
 from   contextlib  import contextmanager
 from   collections import abc
 
@@ -148,6 +157,14 @@ class IdleLoop:
     In normal circumstances, this ``idleLoop`` instance should be treated as a
     singleton, although this is not enforced in any way.
 
+    Tasks which are ready to run are stored on a FIFO :meth:`queue`, whereas
+    tasks which have been scheduled with an ``after`` delay are stored in a
+    heap, ordered by the time at which they are due. On each ``wx.EVT_IDLE``
+    event, all due tasks are moved onto the queue, and tasks are run until
+    either the queue is empty, or the :meth:`timeBudget` has been used up.
+    Queue latency statistics can be retrieved via the :meth:`metrics`
+    method.
+
     The ``EVT_IDLE`` event is generated automatically by ``wx`` during periods
     of inactivity. However, there are some circumstances in which ``EVT_IDLE``
     will not be generated, and pending events may be left on the queue. For
@@ -165,10 +182,17 @@ class IdleLoop:
         self.__registered  = False
         self.__queue       = queue.Queue()
         self.__queueDict   = {}
+        self.__delayed     = []
+        self.__counter     = itertools.count()
+        self.__lock        = threading.Lock()
         self.__timer       = None
         self.__callRate    = 200
+        self.__timeBudget  = 20
         self.__allowErrors = False
         self.__neverQueue  = False
+        self.__metrics     = None
+
+        self.resetMetrics()
 
         # Call reset on exit, in case
         # the idle.timer is active.
@@ -234,6 +258,31 @@ class IdleLoop:
         self.__callRate = rate
 
 
+    @property
+    def timeBudget(self):
+        """Maximum time (in milliseconds) to spend running tasks on a single
+        call to the idle loop. At least one task is run on each call, even if
+        it takes longer than this budget.
+        """
+        return self.__timeBudget
+
+
+    @timeBudget.setter
+    def timeBudget(self, budget):
+        """Update the :meth:`timeBudget` to ``budget`` (specified in
+        milliseconds).
+
+        If ``budget is None``, it is set to the default of 20 milliseconds.
+        """
+
+        if budget is None:
+            budget = 20
+
+        log.debug('Idle loop time budget changed to {}'.format(budget))
+
+        self.__timeBudget = budget
+
+
     @property
     def allowErrors(self):
         """Used for testing/debugging. If ``True``, and a function called on
@@ -304,11 +353,53 @@ class IdleLoop:
         self.__registered  = False
         self.__queue       = newQueue
         self.__queueDict   = {}
+        self.__delayed     = []
         self.__timer       = None
         self.__callRate    = 200
+        self.__timeBudget  = 20
         self.__allowErrors = False
         self.__neverQueue  = False
 
+        self.resetMetrics()
+
+
+    def metrics(self):
+        """Returns a dictionary containing statistics about the tasks which
+        have been run on the idle loop since the last call to
+        :meth:`resetMetrics`:
+
+          - ``calls``:       Number of calls to the idle loop
+          - ``tasks``:       Number of tasks which have been run
+          - ``dropped``:     Number of tasks which were not run because they
+                             timed out or were cancelled
+          - ``meanLatency``: Mean time (seconds) between a task becoming due,
+                             and it being run
+          - ``maxLatency``:  Maximum latency (seconds)
+          - ``queued``:      Number of tasks which are ready to run
+          - ``delayed``:     Number of tasks which are not yet due
+        """
+        metrics = dict(self.__metrics)
+        total   = metrics.pop('totalLatency')
+        ntasks  = metrics['tasks']
+
+        if ntasks > 0: metrics['meanLatency'] = total / ntasks
+        else:          metrics['meanLatency'] = 0
+
+        if self.__queue is not None: metrics['queued'] = self.__queue.qsize()
+        else:                        metrics['queued'] = 0
+        metrics['delayed'] = len(self.__delayed)
+
+        return metrics
+
+
+    def resetMetrics(self):
+        """Clears the statistics returned by :meth:`metrics`. """
+        self.__metrics = {'calls'        : 0,
+                          'tasks'        : 0,
+                          'dropped'      : 0,
+                          'totalLatency' : 0,
+                          'maxLatency'   : 0}
+
 
     def inIdle(self, taskName):
         """Returns ``True`` if a task with the given name is queued on the
@@ -383,8 +474,7 @@ class IdleLoop:
 
         .. note:: If the ``after`` argument is used, there is no guarantee that
                   the task will be executed in the order that it is scheduled.
-                  This is because, if the required time has not elapsed when
-                  the task is popped from the queue, it will be re-queued.
+                  Delayed tasks are run in the order that they become due.
 
         .. note:: If you schedule multiple tasks with the same ``name``, and
                   you do not use the ``skipIfQueued`` or ``dropIfQueued``
@@ -420,28 +510,8 @@ class IdleLoop:
             task(*args, **kwargs)
             return
 
-        import wx
-        app = wx.GetApp()
-
-        # Register on the idle event
-        # if an app is available
-        #
-        # n.b. The 'app is not None' test will
-        # potentially fail in scenarios where
-        # multiple wx.Apps have been instantiated,
-        # as it may return a previously created
-        # app that is no longer active.
-        if (not self.registered) and (app is not None):
-
-            log.debug('Registering async idle loop')
-            app.Bind(wx.EVT_IDLE, self.__idleLoop)
-
-            # We also occasionally use a
-            # timer to drive the loop, so
-            # let's register that as well
-            self.__timer = wx.Timer(app)
-            self.__timer.Bind(wx.EVT_TIMER, self.__idleLoop)
-            self.__registered = True
+        if not self.registered:
+            self.__register()
 
         # A task with the specified
         # name is already in the queue
@@ -479,11 +549,51 @@ class IdleLoop:
                             args,
                             kwargs)
 
-        self.__queue.put_nowait(idleTask)
-
         if name is not None:
             self.__queueDict[name] = idleTask
 
+        if after > 0:
+            with self.__lock:
+                heapq.heappush(self.__delayed, (schedtime + after,
+                                                next(self.__counter),
+                                                idleTask))
+        else:
+            self.__queue.put_nowait(idleTask)
+
+
+    def __register(self):
+        """Called by :meth:`idle`. Registers the idle loop on ``wx.EVT_IDLE``
+        events, and creates the :meth:`timer`, if a ``wx.App`` is available.
+        """
+
+        try:
+            import wx
+        except ImportError:
+            return
+
+        app = wx.GetApp()
+
+        # Register on the idle event
+        # if an app is available
+        #
+        # n.b. The 'app is not None' test will
+        # potentially fail in scenarios where
+        # multiple wx.Apps have been instantiated,
+        # as it may return a previously created
+        # app that is no longer active.
+        if app is None:
+            return
+
+        log.debug('Registering async idle loop')
+        app.Bind(wx.EVT_IDLE, self.__idleLoop)
+
+        # We also occasionally use a
+        # timer to drive the loop, so
+        # let's register that as well
+        self.__timer = wx.Timer(app)
+        self.__timer.Bind(wx.EVT_TIMER, self.__idleLoop)
+        self.__registered = True
+
 
     def idleWhen(self, func, condition, *args, **kwargs):
         """Poll the ``condition`` function periodically, and schedule ``func``
@@ -514,88 +624,156 @@ class IdleLoop:
             self.idle(func, *args, **kwargs)
 
 
-    def __idleLoop(self, ev):
-        """This method is called on ``wx.EVT_IDLE`` events, and occasionally
-        on ``wx.EVT_TIMER`` events via the :meth:`timer`. If there
-        is a function on the :meth:`queue`, it is popped and called.
+    def runPending(self, budget=None):
+        """Runs queued tasks which are due. This method is called by the
+        ``wx`` idle loop, but may also be called directly (e.g. for testing,
+        or to drive the idle loop without ``wx``).
 
-        .. note:: The ``wx.EVT_IDLE`` event is only triggered on user
-                  interaction (e.g. mouse movement). This means that a
-                  situation may arise whereby a function is queued via the
-                  :meth:`idle` method, but no ``EVT_IDLE`` event gets
-                  generated. Therefore, the :meth:`timer` object is
-                  occasionally used to call this function as well.
+        Tasks are run until there are no more due tasks, or until ``budget``
+        milliseconds have elapsed. At least one task is run, if any are due.
+
+        :arg budget: Time budget in milliseconds. Defaults to
+                     :meth:`timeBudget`.
+
+        :returns:    ``True`` if there are more due tasks waiting to be run,
+                     ``False`` otherwise.
         """
 
-        import wx
+        if budget is None:
+            budget = self.__timeBudget
 
-        ev.Skip()
+        start = time.time()
+        now   = start
 
-        try:
-            task = self.__queue.get_nowait()
+        self.__metrics['calls'] += 1
+        self.__promoteDelayed(now)
+
+        while True:
+            try:
+                task = self.__queue.get_nowait()
+            except queue.Empty:
+                break
 
-        except queue.Empty:
+            self.__runTask(task, now)
 
-            # Make sure that we get called periodically,
-            # if EVT_IDLE decides to stop firing. If
-            # self.timer is None, then self.reset has
-            # probably been called.
-            if self.__timer is not None:
-                self.__timer.Start(self.__callRate, wx.TIMER_ONE_SHOT)
-            return
+            now = time.time()
+            if (now - start) * 1000 >= budget:
+                break
+
+            # Tasks may have become
+            # due while we were busy
+            self.__promoteDelayed(now)
+
+        self.__promoteDelayed(time.time())
+        return not self.__queue.empty()
+
+
+    def __promoteDelayed(self, now):
+        """Moves all delayed tasks which are due at time ``now`` from the
+        delayed task heap onto the :meth:`queue`.
+        """
+        with self.__lock:
+            while len(self.__delayed) > 0 and self.__delayed[0][0] <= now:
+                _, _, task = heapq.heappop(self.__delayed)
+                self.__queue.put_nowait(task)
+
+
+    def __nextDue(self):
+        """Returns the time at which the next delayed task is due, or
+        ``None`` if there are no delayed tasks.
+        """
+        with self.__lock:
+            if len(self.__delayed) == 0:
+                return None
+            return self.__delayed[0][0]
+
+
+    def __runTask(self, task, now):
+        """Called by :meth:`runPending`. Runs the given task, unless it has
+        timed out or been cancelled.
+        """
 
-        now             = time.time()
-        elapsed         = now - task.schedtime
-        queueSizeOffset = 0
-        taskName        = task.name
-        funcName        = getattr(task.task, '__name__', '<unknown>')
+        elapsed  = now - task.schedtime
+        taskName = task.name
+        funcName = getattr(task.task, '__name__', '<unknown>')
 
         if taskName is None: taskName = funcName
         else:                taskName = '{} [{}]'.format(taskName, funcName)
 
-        # Has enough time elapsed
-        # since the task was scheduled?
-        # If not, re-queue the task.
-        # If this is the only task on the
-        # queue, the idle loop will be
-        # called again after
-        # callRate millisecs.
-        if elapsed < task.after:
-            log.debug('Re-queueing function ({}) on '
-                      'wx idle loop'.format(taskName))
-            self.__queue.put_nowait(task)
-            queueSizeOffset = 1
+        # We only remove the task from the queueDict
+        # if it is the most recent task with its name
+        # - it may have been cancelled and replaced
+        # with a new task (see dropIfQueued).
+        if task.name is not None and \
+           self.__queueDict.get(task.name) is task:
+            self.__queueDict.pop(task.name)
 
         # Has the task timed out?
-        elif task.timeout == 0 or (elapsed < task.timeout):
+        if task.timeout != 0 and (elapsed >= task.timeout):
+            log.debug('Dropping timed out or cancelled function '
+                      '({}) on wx idle loop'.format(taskName))
+            self.__metrics['dropped'] += 1
+            return
 
-            log.debug('Running function ({}) on wx '
-                      'idle loop'.format(taskName))
+        latency = max(0, elapsed - task.after)
+        self.__metrics['tasks']        += 1
+        self.__metrics['totalLatency'] += latency
+        self.__metrics['maxLatency']    = max(latency,
+                                              self.__metrics['maxLatency'])
+
+        log.debug('Running function ({}) on wx idle loop'.format(taskName))
+
+        try:
+            task.task(*task.args, **task.kwargs)
+        except Exception as e:
+            log.warning('Idle task {} crashed - {}: {}'.format(
+                taskName, type(e).__name__, str(e)), exc_info=True)
+
+            if self.__allowErrors:
+                raise e
 
-            try:
-                task.task(*task.args, **task.kwargs)
-            except Exception as e:
-                log.warning('Idle task {} crashed - {}: {}'.format(
-                    taskName, type(e).__name__, str(e)), exc_info=True)
 
-                if self.__allowErrors:
-                    raise e
+    def __idleLoop(self, ev):
+        """This method is called on ``wx.EVT_IDLE`` events, and occasionally
+        on ``wx.EVT_TIMER`` events via the :meth:`timer`. All due tasks are
+        run, subject to the :meth:`timeBudget` (see :meth:`runPending`).
+
+        .. note:: The ``wx.EVT_IDLE`` event is only triggered on user
+                  interaction (e.g. mouse movement). This means that a
+                  situation may arise whereby a function is queued via the
+                  :meth:`idle` method, but no ``EVT_IDLE`` event gets
+                  generated. Therefore, the :meth:`timer` object is
+                  occasionally used to call this function as well.
+        """
 
-            if task.name is not None:
-                try:             self.__queueDict.pop(task.name)
-                except KeyError: pass
+        import wx
+
+        ev.Skip()
 
         # More tasks on the queue?
-        # Request anotherd event
-        if self.__queue.qsize() > queueSizeOffset:
+        # Request another event
+        if self.runPending():
             ev.RequestMore()
+            return
 
-        # Otherwise use the idle
-        # timer to make sure that
-        # the loop keeps ticking
-        # over
-        else:
-            self.__timer.Start(self.__callRate, wx.TIMER_ONE_SHOT)
+        # Otherwise use the idle timer to
+        # make sure that the loop keeps
+        # ticking over, waking up in time
+        # for the next delayed task. If
+        # self.timer is None, then
+        # self.reset has probably been
+        # called.
+        if self.__timer is None:
+            return
+
+        rate    = self.__callRate
+        nextDue = self.__nextDue()
+
+        if nextDue is not None:
+            untilDue = int(math.ceil((nextDue - time.time()) * 1000))
+            rate     = max(1, min(rate, untilDue))
+
+        self.__timer.Start(rate, wx.TIMER_ONE_SHOT)
 
 
 idleLoop = IdleLoop()
@@ -787,6 +965,11 @@ class Task:
         self.args     = args
         self.kwargs   = kwargs
         self.enabled  = True
+        self.priority = 0
+        self.coalesce = None
+        self.queued   = None
+        self.started  = None
+        self.finished = None
 
 
 class TaskThreadVeto(Exception):
@@ -947,47 +1130,333 @@ class TaskThread(threading.Thread):
 
             self.__enqueued.pop(task.name, None)
 
-            if not task.enabled:
+            try:
+                if task.enabled:
+                    _runTask(task)
+            finally:
                 self.__q.task_done()
-                continue
 
-            log.debug('Running task: {} [{}]'.format(
-                task.name,
-                getattr(task.func, '__name__', '<unknown>')))
+        self.__q        = None
+        self.__enqueued = None
+        log.debug('Task thread finished')
+
+
+def _runTask(task):
+    """Used by the :class:`TaskThread` and :class:`TaskPool`. Runs the given
+    :class:`Task`, and schedules its ``onFinish`` or ``onError`` handlers
+    via :func:`idle`.
+
+    :returns: ``True`` if the task completed successfully (including if it
+              raised a :class:`TaskThreadVeto`), ``False`` if it crashed.
+    """
+
+    funcName = getattr(task.func, '__name__', '<unknown>')
+
+    log.debug('Running task: {} [{}]'.format(task.name, funcName))
+
+    try:
+        task.func(*task.args, **task.kwargs)
+
+        if task.onFinish is not None:
+            idle(task.onFinish)
+
+        log.debug('Task completed: {} [{}]'.format(task.name, funcName))
+
+    # If the task raises a TaskThreadVeto error,
+    # we just have to skip the onFinish handler
+    except TaskThreadVeto:
+        log.debug('Task completed (vetoed onFinish): {} [{}]'.format(
+            task.name, funcName))
+
+    except Exception as e:
+        log.warning('Task crashed: {} [{}]: {}: {}'.format(
+            task.name,
+            funcName,
+            type(e).__name__,
+            str(e)),
+            exc_info=True)
+        if task.onError is not None:
+            idle(task.onError, e)
+        return False
+
+    return True
+
+
+class TaskPool:
+    """The ``TaskPool`` is a multi-threaded alternative to the
+    :class:`TaskThread`. It has the same :meth:`enqueue` / :meth:`dequeue` /
+    :meth:`isQueued` / :meth:`waitUntilIdle` interface, but runs tasks on a
+    pool of worker threads, and adds a few extra features:
+
+     - Tasks may be given a ``priority`` - tasks with a lower priority value
+       are run before tasks with a higher value. Tasks with the same priority
+       are run in the order that they were enqueued.
+
+     - Tasks may be given a ``coalesce`` key. When a task is enqueued, any
+       other queued (but not yet running) tasks with the same key are
+       cancelled, so that only the most recent task is run. A common pattern
+       is to use a prefix of the task name as the key, e.g.
+       ``'{}_read'.format(id(self))``.
+
+     - All queued tasks can be cancelled via :meth:`clear`.
+
+     - Timing statistics are recorded for every task which is run - see the
+       :meth:`stats` and :meth:`history` methods.
+
+    A ``TaskPool`` is used in the same way as a ``TaskThread``::
+
+        pool = TaskPool(4)
+        pool.start()
+        pool.enqueue(func, arg, taskName='task', priority=1)
+        pool.waitUntilIdle()
+        pool.stop()
+        pool.join()
+
+    .. note:: Tasks may be run concurrently, so task functions which share
+              state must take care of their own synchronisation (e.g. via the
+              :func:`mutex` decorator).
+    """
+
+
+    def __init__(self, nworkers=None, daemon=False, historySize=1000):
+        """Create a ``TaskPool``.
+
+        :arg nworkers:    Number of worker threads. Defaults to the number of
+                          CPUs (up to a maximum of 8).
+
+        :arg daemon:      If ``True``, the worker threads are created as
+                          daemon threads. May also be changed via the
+                          :attr:`daemon` attribute before :meth:`start` is
+                          called.
+
+        :arg historySize: Maximum number of task timings to keep in the
+                          :meth:`history`.
+        """
+
+        if nworkers is None:
+            nworkers = min(8, os.cpu_count() or 1)
+
+        self.daemon      = daemon
+        self.__nworkers  = max(1, nworkers)
+        self.__q         = queue.PriorityQueue()
+        self.__lock      = threading.Lock()
+        self.__enqueued  = {}
+        self.__coalesce  = {}
+        self.__counter   = itertools.count()
+        self.__stop      = False
+        self.__workers   = []
+        self.__history   = collections.deque(maxlen=historySize)
+        self.__stats     = {'enqueued'  : 0,
+                            'completed' : 0,
+                            'failed'    : 0,
+                            'cancelled' : 0,
+                            'coalesced' : 0,
+                            'waitTime'  : 0,
+                            'runTime'   : 0}
+
+        log.debug('New task pool (%i workers)', self.__nworkers)
+
+
+    @property
+    def nworkers(self):
+        """Returns the number of worker threads used by this ``TaskPool``. """
+        return self.__nworkers
+
+
+    def start(self):
+        """Start the worker threads. """
+        for i in range(self.__nworkers):
+            worker = threading.Thread(target=self.__run,
+                                      name='TaskPool-{}'.format(i),
+                                      daemon=self.daemon)
+            worker.start()
+            self.__workers.append(worker)
+
+
+    def stop(self):
+        """Stop the ``TaskPool`` after any currently running tasks have
+        completed.
+        """
+        log.debug('Stopping task pool')
+        self.__stop = True
+
+
+    def join(self, timeout=None):
+        """Wait for all worker threads to finish - :meth:`stop` must be
+        called first.
+        """
+        for worker in self.__workers:
+            worker.join(timeout)
+
+
+    def is_alive(self):
+        """Returns ``True`` if any worker threads are still running. """
+        return any(w.is_alive() for w in self.__workers)
+
+
+    def enqueue(self, func, *args, **kwargs):
+        """Enqueue a task to be executed.
+
+        Accepts the same arguments as :meth:`TaskThread.enqueue`, in addition
+        to the following, which must be provided as keyword arguments:
+
+        :arg priority: Task priority - tasks with lower values are run first.
+                       Defaults to ``0``.
+
+        :arg coalesce: Coalescing key. Any other queued tasks which were
+                       enqueued with the same key are cancelled.
+        """
+
+        name     = kwargs.pop('taskName', None)
+        onFinish = kwargs.pop('onFinish', None)
+        onError  = kwargs.pop('onError',  None)
+        priority = kwargs.pop('priority', 0)
+        key      = kwargs.pop('coalesce', None)
+
+        log.debug('Enqueueing task: {} [{}] (priority {})'.format(
+            name, getattr(func, '__name__', '<unknown>'), priority))
+
+        task          = Task(name, func, onFinish, onError, args, kwargs)
+        task.priority = priority
+        task.coalesce = key
+        task.queued   = time.time()
+
+        with self.__lock:
+            if key is not None:
+                old = self.__coalesce.get(key)
+                if old is not None and old.enabled:
+                    log.debug('Coalescing task: {}'.format(old.name))
+                    old.enabled = False
+                    self.__stats['coalesced'] += 1
+                self.__coalesce[key] = task
+
+            self.__enqueued[name]      = task
+            self.__stats['enqueued']  += 1
+            self.__q.put((priority, next(self.__counter), task))
+
+
+    def isQueued(self, name):
+        """Returns ``True`` if a task with the given name is enqueued,
+        ``False`` otherwise.
+        """
+        task = self.__enqueued.get(name, None)
+        return task is not None and task.enabled
+
+
+    def dequeue(self, name):
+        """Dequeues (cancels) a previously enqueued task. Has no effect if
+        the task is already running.
+
+        :arg name: The task to dequeue.
+        """
+        with self.__lock:
+            task = self.__enqueued.get(name, None)
+            if task is not None and task.enabled:
+                log.debug('Dequeueing task: {}'.format(name))
+                task.enabled = False
+                self.__stats['cancelled'] += 1
+
+
+    def clear(self):
+        """Cancels all queued tasks. Tasks which are already running will run
+        to completion.
+        """
+        with self.__lock:
+            for task in self.__enqueued.values():
+                if task.enabled:
+                    task.enabled = False
+                    self.__stats['cancelled'] += 1
+
+
+    def waitUntilIdle(self):
+        """Causes the calling thread to block until the task queue is empty,
+        and all running tasks have completed.
+        """
+        self.__q.join()
+
+
+    def stats(self):
+        """Returns a dictionary containing statistics about the tasks which
+        have been processed by this ``TaskPool``:
+
+          - ``enqueued``:  Number of tasks which have been enqueued
+          - ``completed``: Number of tasks which have completed successfully
+          - ``failed``:    Number of tasks which raised an error
+          - ``cancelled``: Number of tasks cancelled via :meth:`dequeue` or
+                           :meth:`clear`
+          - ``coalesced``: Number of tasks superseded by a newer task with
+                           the same ``coalesce`` key
+          - ``waitTime``:  Total time (seconds) that tasks spent in the queue
+          - ``runTime``:   Total time (seconds) spent running tasks
+          - ``queued``:    Number of tasks currently in the queue
+        """
+        with self.__lock:
+            stats           = dict(self.__stats)
+            stats['queued'] = self.__q.qsize()
+        return stats
+
+
+    def history(self):
+        """Returns a list of ``(name, waitTime, runTime, success)`` tuples,
+        one for each of the most recently run tasks.
+        """
+        with self.__lock:
+            return list(self.__history)
+
+
+    def __taskStarted(self, task):
+        """Called by worker threads when a task has been pulled from the
+        queue. Removes it from the internal book-keeping dictionaries.
+        """
+        with self.__lock:
+            if self.__enqueued.get(task.name) is task:
+                self.__enqueued.pop(task.name)
+            if task.coalesce is not None and \
+               self.__coalesce.get(task.coalesce) is task:
+                self.__coalesce.pop(task.coalesce)
+
+
+    def __taskFinished(self, task, success):
+        """Called by worker threads when a task has finished. Updates the
+        timing statistics.
+        """
+        wait = task.started  - task.queued
+        run  = task.finished - task.started
+        with self.__lock:
+            self.__stats['waitTime'] += wait
+            self.__stats['runTime']  += run
+            if success: self.__stats['completed'] += 1
+            else:       self.__stats['failed']    += 1
+            self.__history.append((task.name, wait, run, success))
+
+
+    def __run(self):
+        """Run by each worker thread. Pulls tasks from the queue and runs
+        them.
+        """
+
+        while not self.__stop:
+
+            # See TaskThread.run for why the task
+            # reference must be cleared each time
+            task = None
 
             try:
-                task.func(*task.args, **task.kwargs)
-
-                if task.onFinish is not None:
-                    idle(task.onFinish)
-
-                log.debug('Task completed: {} [{}]'.format(
-                    task.name,
-                    getattr(task.func, '__name__', '<unknown>')))
-
-            # If the task raises a TaskThreadVeto error,
-            # we just have to skip the onFinish handler
-            except TaskThreadVeto:
-                log.debug('Task completed (vetoed onFinish): {} [{}]'.format(
-                    task.name,
-                    getattr(task.func, '__name__', '<unknown>')))
-
-            except Exception as e:
-                log.warning('Task crashed: {} [{}]: {}: {}'.format(
-                    task.name,
-                    getattr(task.func, '__name__', '<unknown>'),
-                    type(e).__name__,
-                    str(e)),
-                    exc_info=True)
-                if task.onError is not None:
-                    idle(task.onError, e)
+                _, _, task = self.__q.get(timeout=1)
+            except queue.Empty:
+                continue
 
+            try:
+                self.__taskStarted(task)
+                if task.enabled:
+                    task.started  = time.time()
+                    success       = _runTask(task)
+                    task.finished = time.time()
+                    self.__taskFinished(task, success)
             finally:
                 self.__q.task_done()
 
-        self.__q        = None
-        self.__enqueued = None
-        log.debug('Task thread finished')
+        log.debug('Task pool worker finished')
 
 
 def mutex(*args, **kwargs):
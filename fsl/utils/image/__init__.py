@@ -11,6 +11,7 @@ The following modules are available:
 
 .. autosummary::
 
+   project
    resample
    roi
 """
@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+#
+# project.py - Projection of data between volumes and surfaces.
+#
+# Author: Paul McCarthy <pauldmccarthy@gmail.com>
+#
+"""This module provides functions for projecting data between volumetric
+:class:`.Image` objects and the vertices of a :class:`.Mesh`.
+
+.. autosummary::
+   :nosignatures:
+
+   volumeToSurface
+   surfaceToVolume
+   samplingWeights
+   Projector
+
+
+Projection is performed via a sparse ``(nvertices, nvoxels)`` matrix of
+sampling weights. Each row of the matrix contains the trilinear interpolation
+weights for one vertex - if an outer surface is provided (e.g. the pial
+surface, when projecting onto the white matter surface), the weights for a
+vertex are averaged over a number of points along the line between the two
+surfaces (*ribbon averaging*).
+
+Calculating the sampling weights is the expensive part of a projection. The
+weights are calculated in parallel over chunks of vertices, and are then
+cached (see :func:`samplingWeights`), so that they can be re-used when
+projecting many images which share the same voxel grid. Once the weights are
+available, projecting a 4D image is a sequence of sparse matrix
+multiplications, which are performed in parallel over chunks of volumes.
+
+The :class:`Projector` class can be used to hold on to a set of sampling
+weights, and project data in either direction.
+"""
+
+
+import hashlib
+import itertools as it
+import concurrent.futures as futures
+
+import numpy        as np
+import scipy.sparse as sparse
+
+import fsl.utils.cache      as cache
+import fsl.transform.affine as affine
+
+
+DEFAULT_VERTEX_CHUNK = 65536
+"""Default number of vertices for which sampling weights are calculated at
+once.
+"""
+
+
+DEFAULT_VOLUME_CHUNK = 16
+"""Default number of volumes which are projected at once. """
+
+
+_weightCache = cache.Cache(maxsize=8, lru=True)
+"""Cache of sampling weights calculated by :func:`samplingWeights`. """
+
+
+def _vertices(mesh):
+    """Used internally. Returns a ``(n, 3)`` array of vertex coordinates.
+
+    :arg mesh: A :class:`.Mesh` (in which case its currently selected vertex
+               set is returned) or an ``(n, 3)`` array of vertices.
+    """
+    if hasattr(mesh, 'vertexSets'):
+        mesh = mesh.vertices
+    return np.asarray(mesh).reshape(-1, 3)
+
+
+def _trilinearWeights(coords, shape):
+    """Used internally. Calculates trilinear interpolation weights for
+    the given voxel coordinates.
+
+    :arg coords: ``(n, 3)`` array of voxel coordinates.
+    :arg shape:  Shape of the voxel grid.
+    :returns:    A tuple containing ``(points, voxels, weights)`` arrays,
+                 where ``points`` contains indices into ``coords``, ``voxels``
+                 contains linear (C-order) voxel indices, and ``weights``
+                 contains the corresponding interpolation weights. Voxels
+                 outside of the grid are omitted.
+    """
+
+    base   = np.floor(coords).astype(np.int64)
+    frac   = coords - base
+    shape  = np.asarray(shape[:3])
+    points = np.arange(coords.shape[0])
+
+    allPoints  = []
+    allVoxels  = []
+    allWeights = []
+
+    for corner in it.product((0, 1), repeat=3):
+        corner  = np.array(corner)
+        voxels  = base + corner
+        weights = np.prod(np.where(corner, frac, 1 - frac), axis=1)
+        valid   = np.all((voxels >= 0) & (voxels < shape), axis=1) & \
+                  (weights > 0)
+
+        allPoints .append(points[valid])
+        allVoxels .append(np.ravel_multi_index(voxels[valid].T, shape))
+        allWeights.append(weights[valid])
+
+    return (np.concatenate(allPoints),
+            np.concatenate(allVoxels),
+            np.concatenate(allWeights))
+
+
+def _calcWeights(inner, outer, shape, worldToVox, nsteps):
+    """Used internally by :func:`samplingWeights`. Calculates sampling
+    weights for a single chunk of vertices.
+    """
+
+    nverts  = inner.shape[0]
+    points  = []
+    voxels  = []
+    weights = []
+
+    if outer is None: fracs = [0]
+    else:             fracs = np.linspace(0, 1, nsteps)
+
+    for frac in fracs:
+        if outer is None: coords = inner
+        else:             coords = inner + frac * (outer - inner)
+        coords = affine.transform(coords, worldToVox)
+        p, v, w = _trilinearWeights(coords, shape)
+        points .append(p)
+        voxels .append(v)
+        weights.append(w)
+
+    points  = np.concatenate(points)
+    voxels  = np.concatenate(voxels)
+    weights = np.concatenate(weights)
+    nvoxels = int(np.prod(shape[:3]))
+
+    weights = sparse.csr_matrix((weights, (points, voxels)),
+                                shape=(nverts, nvoxels))
+
+    # Normalise each row so that the weights
+    # sum to 1 - vertices for which some
+    # sample points lie outside of the voxel
+    # grid are interpolated from the remaining
+    # points.
+    totals = np.asarray(weights.sum(axis=1)).ravel()
+    totals[totals == 0] = 1
+    return sparse.diags(1 / totals) @ weights
+
+
+def samplingWeights(image,
+                    mesh,
+                    outer=None,
+                    nsteps=5,
+                    space='world',
+                    chunksize=None,
+                    njobs=None,
+                    usecache=True):
+    """Calculates a sparse matrix of trilinear sampling weights which can be
+    used to project data from the voxel grid of ``image`` onto the vertices of
+    ``mesh``.
+
+    :arg image:     :class:`.Nifti` defining the voxel grid.
+
+    :arg mesh:      :class:`.Mesh` or ``(n, 3)`` array of vertices.
+
+    :arg outer:     Optional. Another :class:`.Mesh` with the same topology
+                    as ``mesh``, or an ``(n, 3)`` array of vertices. If
+                    provided, data is averaged along the line between each
+                    vertex in ``mesh`` and the corresponding vertex in
+                    ``outer``.
+
+    :arg nsteps:    Number of points along each line to sample from, when
+                    ``outer`` is provided.
+
+    :arg space:     Coordinate system of the vertices - passed to
+                    :meth:`.Nifti.getAffine`. Defaults to ``'world'``.
+
+    :arg chunksize: Number of vertices to process at once. Defaults to
+                    :attr:`DEFAULT_VERTEX_CHUNK`.
+
+    :arg njobs:     Number of threads to use. Defaults to the
+                    ``concurrent.futures`` default.
+
+    :arg usecache:  Defaults to ``True``. If ``True``, weights are stored in,
+                    and retrieved from, an internal cache.
+
+    :returns:       A ``scipy.sparse.csr_matrix`` of shape
+                    ``(nvertices, nvoxels)``, where voxels are indexed in
+                    C (row-major) order. The weights for each vertex sum
+                    to 1, unless it is outside of the voxel grid, in which
+                    case they are all 0.
+    """
+
+    if chunksize is None:
+        chunksize = DEFAULT_VERTEX_CHUNK
+
+    inner = _vertices(mesh)
+
+    if outer is not None:
+        outer = _vertices(outer)
+        if outer.shape != inner.shape:
+            raise ValueError('Outer vertices have a different '
+                             f'shape: {outer.shape} != {inner.shape}')
+
+    shape      = tuple(image.shape[:3])
+    worldToVox = image.getAffine(space, 'voxel')
+
+    if usecache:
+        digest = hashlib.sha1()
+        digest.update(str((shape, nsteps)).encode())
+        digest.update(np.ascontiguousarray(worldToVox, dtype=np.float64))
+        digest.update(np.ascontiguousarray(inner,      dtype=np.float64))
+        if outer is not None:
+            digest.update(np.ascontiguousarray(outer, dtype=np.float64))
+        key     = digest.hexdigest()
+        weights = _weightCache.get(key, None)
+        if weights is not None:
+            return weights
+
+    chunks = []
+    for start in range(0, inner.shape[0], chunksize):
+        end = start + chunksize
+        chunks.append((inner[start:end],
+                       None if outer is None else outer[start:end]))
+
+    def calc(chunk):
+        return _calcWeights(chunk[0], chunk[1], shape, worldToVox, nsteps)
+
+    if len(chunks) == 1:
+        weights = [calc(chunks[0])]
+    else:
+        with futures.ThreadPoolExecutor(njobs) as pool:
+            weights = list(pool.map(calc, chunks))
+
+    if len(weights) == 0:
+        weights = sparse.csr_matrix((0, int(np.prod(shape))))
+    else:
+        weights = sparse.vstack(weights, format='csr')
+
+    if usecache:
+        _weightCache.put(key, weights)
+
+    return weights
+
+
+class Projector:
+    """The ``Projector`` class holds a set of sampling weights (see
+    :func:`samplingWeights`) for a specific voxel grid and mesh, and can be
+    used to project data between them in either direction, e.g.::
+
+        proj   = Projector(image, white, outer=pial)
+        vdata1 = proj.volumeToSurface(func1)
+        vdata2 = proj.volumeToSurface(func2)
+        vol    = proj.surfaceToVolume(vdata1)
+    """
+
+
+    def __init__(self, image, mesh, outer=None, nsteps=5, space='world',
+                 chunksize=None, njobs=None):
+        """Create a ``Projector``. All arguments are passed through to
+        :func:`samplingWeights`.
+        """
+        self.__shape   = tuple(image.shape[:3])
+        self.__njobs   = njobs
+        self.__weights = samplingWeights(image, mesh, outer, nsteps, space,
+                                         chunksize, njobs)
+
+
+    @property
+    def weights(self):
+        """Returns the ``(nvertices, nvoxels)`` sampling weights. """
+        return self.__weights
+
+
+    @property
+    def shape(self):
+        """Returns the shape of the voxel grid. """
+        return self.__shape
+
+
+    def volumeToSurface(self, data, chunksize=None, njobs=None, fill=np.nan):
+        """Sample the given volumetric data at each vertex.
+
+        :arg data:      :class:`.Image` or array with the same voxel grid
+                        as the image used to create this ``Projector``.
+                        May have more than three dimensions.
+
+        :arg chunksize: Number of volumes to process at once. Defaults to
+                        :attr:`DEFAULT_VOLUME_CHUNK`.
+
+        :arg njobs:     Number of threads to use. Defaults to the value
+                        passed to :meth:`__init__`.
+
+        :arg fill:      Value to use for vertices which lie outside of the
+                        voxel grid.
+
+        :returns:       A ``(nvertices, ...)`` array containing the sampled
+                        data.
+        """
+
+        if chunksize is None: chunksize = DEFAULT_VOLUME_CHUNK
+        if njobs     is None: njobs     = self.__njobs
+
+        shape = tuple(data.shape)
+        if shape[:3] != self.__shape:
+            raise ValueError(f'Data shape {shape} does not match '
+                             f'projection shape {self.__shape}')
+
+        nvoxels = int(np.prod(self.__shape))
+        extra   = shape[3:]
+        nvols   = int(np.prod(extra))
+        weights = self.__weights
+        slices  = [slice(s, s + chunksize) for s in range(0, nvols, chunksize)]
+
+        # Only load the required volumes for
+        # each chunk of 4D data - other data
+        # is loaded in its entirety
+        if len(extra) == 1:
+            def load(slc):
+                return np.asarray(data[..., slc])
+        else:
+            full = np.asarray(data[:]).reshape(self.__shape + (nvols, ))
+            def load(slc):
+                return full[..., slc]
+
+        def project(slc):
+            chunk = load(slc).reshape(nvoxels, -1)
+            return weights @ chunk.astype(np.float64, copy=False)
+
+        if len(slices) == 1:
+            result = [project(slices[0])]
+        else:
+            with futures.ThreadPoolExecutor(njobs) as pool:
+                result = list(pool.map(project, slices))
+
+        result = np.concatenate(result, axis=1)
+        outside = np.asarray(weights.sum(axis=1)).ravel() == 0
+        result[outside] = fill
+
+        return result.reshape((weights.shape[0], ) + extra)
+
+
+    def surfaceToVolume(self, vdata, fill=0):
+        """Project the given vertex data into the voxel grid. Each voxel is
+        assigned the weighted average of all vertices which sample from it.
+
+        :arg vdata: ``(nvertices, ...)`` array of vertex data.
+        :arg fill:  Value to use for voxels which are not sampled by any
+                    vertex.
+        :returns:   An array of shape ``shape + vdata.shape[1:]``.
+        """
+
+        vdata   = np.asarray(vdata)
+        weights = self.__weights
+
+        if vdata.shape[0] != weights.shape[0]:
+            raise ValueError(f'Vertex data shape {vdata.shape} does not '
+                             f'match number of vertices {weights.shape[0]}')
+
+        extra  = vdata.shape[1:]
+        vdata  = vdata.reshape(vdata.shape[0], -1).astype(np.float64)
+        wT     = weights.T.tocsr()
+        totals = np.asarray(wT.sum(axis=1)).ravel()
+        result = wT @ vdata
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = result / totals[:, None]
+        result[totals == 0] = fill
+
+        return result.reshape(self.__shape + extra)
+
+
+def volumeToSurface(image, mesh, data=None, **kwargs):
+    """Project volumetric data onto the vertices of a mesh.
+
+    :arg image: :class:`.Image` to sample from.
+    :arg mesh:  :class:`.Mesh` or ``(n, 3)`` array of vertices.
+    :arg data:  Data to sample, if different from ``image`` (but with the
+                same voxel grid).
+
+    All other arguments are passed to :class:`Projector` (``outer``,
+    ``nsteps``, ``space``) or :meth:`Projector.volumeToSurface`
+    (``chunksize``, ``njobs``, ``fill``).
+    """
+    pkwargs = {k : kwargs.pop(k) for k in ('outer', 'nsteps', 'space')
+               if k in kwargs}
+    if data is None:
+        data = image
+    projector = Projector(image, mesh, njobs=kwargs.get('njobs'), **pkwargs)
+    return projector.volumeToSurface(data, **kwargs)
+
+
+def surfaceToVolume(image, mesh, vdata, **kwargs):
+    """Project vertex data into the voxel grid of ``image``.
+
+    :arg image: :class:`.Nifti` defining the voxel grid.
+    :arg mesh:  :class:`.Mesh` or ``(n, 3)`` array of vertices.
+    :arg vdata: ``(nvertices, ...)`` array of vertex data.
+
+    All other arguments are passed to :class:`Projector` (``outer``,
+    ``nsteps``, ``space``) or :meth:`Projector.surfaceToVolume` (``fill``).
+    """
+    pkwargs = {k : kwargs.pop(k) for k in ('outer', 'nsteps', 'space')
+               if k in kwargs}
+    return Projector(image, mesh, **pkwargs).surfaceToVolume(vdata, **kwargs)
@@ -25,13 +25,17 @@ import functools
 log = logging.getLogger(__name__)
 
 
-def memoize(func=None):
+_MISSING = object()
+"""Sentinel used by :class:`Memoize` to identify cache misses. """
+
+
+def memoize(func=None, cache=None):
     """Memoize the given function by the value of the input arguments.
 
     This function simply returns a :class:`Memoize` instance.
     """
 
-    return Memoize(func)
+    return Memoize(func, cache=cache)
 
 
 class Memoize(object):
@@ -57,6 +61,15 @@ class Memoize(object):
     The :meth:`invalidate` method may be used to clear the internal cache.
 
 
+    By default, cached values are stored in a ``dict``, and are never dropped.
+    A :class:`.Cache` may be used instead, to limit the number or total size
+    of cached values::
+
+        @memoize(cache=Cache(maxsize=None, maxbytes=2 * 1024 ** 3, lru=True))
+        def resample(image, shape):
+            ...
+
+
     Note that the arguments used for memoization must be hashable, as they are
     used as keys in a dictionary.
     """
@@ -64,9 +77,19 @@ class Memoize(object):
 
     def __init__(self, *args, **kwargs):
         """Create a ``Memoize`` object.
+
+        :arg cache: Must be passed as a keyword argument. A :class:`.Cache`,
+                    or any other object with a ``dict``-like ``get`` /
+                    ``__setitem__`` / ``pop`` / ``clear`` interface, in which
+                    to store cached values. Defaults to a ``dict``.
         """
 
-        self.__cache      = {}
+        cache = kwargs.pop('cache', None)
+
+        if cache is None:
+            cache = {}
+
+        self.__cache      = cache
         self.__func       = None
         self.__defaultKey = '_memoize_noargs_'
 
@@ -80,15 +103,11 @@ class Memoize(object):
         """
 
         if len(args) + len(kwargs) == 0:
-            self.__cache = {}
+            self.__cache.clear()
 
         else:
             key = self.__makeKey(*args, **kwargs)
-
-            try:
-                self.__cache.pop(key)
-            except KeyError:
-                pass
+            self.__cache.pop(key, None)
 
 
     def __setFunction(self, *args, **kwargs):
@@ -133,15 +152,13 @@ class Memoize(object):
         if self.__setFunction(*a, **kwa):
             return self
 
-        key = self.__makeKey(*a, **kwa)
-
-        try:
-            result = self.__cache[key]
+        key    = self.__makeKey(*a, **kwa)
+        result = self.__cache.get(key, _MISSING)
 
+        if result is not _MISSING:
             log.debug(u'Retrieved from cache[{}]: {}'.format(key, result))
 
-        except KeyError:
-
+        else:
             result            = self.__func(*a, **kwa)
             self.__cache[key] = result
 
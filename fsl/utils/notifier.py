@@ -11,6 +11,7 @@ as a mixin for providing a simple notification API.
 
 import logging
 import inspect
+import threading
 import contextlib
 import collections
 
@@ -45,6 +46,7 @@ class _Listener:
         # We use a WeakFunctionRef so we can refer to
         # both functions and class/instance methods
         self.__callback = weakfuncref.WeakFunctionRef(callback)
+        self.__expects  = None
         self.topic      = topic
         self.runOnIdle  = runOnIdle
         self.enabled    = True
@@ -66,6 +68,11 @@ class _Listener:
         positional arguments - see :meth:`Notifier.register` for details.
         """
 
+        # The callback cannot change, so
+        # we only need to inspect it once
+        if self.__expects is not None:
+            return self.__expects
+
         func = self.callback
 
         # the function may have been GC'd
@@ -82,7 +89,8 @@ class _Listener:
             elif param.kind == inspect.Parameter.VAR_POSITIONAL:
                 varargs = True
 
-        return varargs or ((not varargs) and (posargs == 3))
+        self.__expects = varargs or ((not varargs) and (posargs == 3))
+        return self.__expects
 
 
     def __str__(self):
@@ -106,6 +114,25 @@ class Notifier:
     :meth:`notify` method. Listeners can optionally listen on a specific
     *topic*, or be notified for all topics.
 
+    Notifications can be deferred with the :meth:`batch` context manager -
+    all notifications which are made within a ``with notifier.batch():``
+    block are delivered when the block exits. By default, each deferred
+    notification is delivered separately, but notifications on a specific
+    topic can be *coalesced* into a single notification via the
+    :meth:`coalesce` method. For example::
+
+        def mergeValues(notifier, topic, values):
+            return sum(values)
+
+        notifier.coalesce('counter', mergeValues)
+
+        with notifier.batch():
+            notifier.notify(topic='counter', value=1)
+            notifier.notify(topic='counter', value=2)
+
+        # listeners on the 'counter' topic are
+        # notified once, with a value of 3
+
     .. note:: The ``Notifier`` class stores ``weakref`` references to
               registered callback functions, using the
               :class:`.WeakFunctionRef` class.
@@ -134,6 +161,27 @@ class Notifier:
         # { topic : enabled } mappings.
         new.__enabled = {}
 
+        # The listeners to be notified on each
+        # topic are cached in this dictionary
+        # of { topic : [_Listener] } mappings,
+        # which is cleared whenever listeners
+        # are registered/deregistered, or a
+        # topic is enabled/disabled.
+        new.__cache = {}
+
+        # Notifications made inside a batch()
+        # block are stored in a pending list
+        # of (topic, value) tuples, and
+        # delivered when the block exits.
+        # Batches are per-thread, so the
+        # batch depth and pending list are
+        # stored in a thread-local object.
+        # The __merge dictionary contains
+        # { topic : mergefunc } mappings for
+        # topics which are to be coalesced.
+        new.__batchState = threading.local()
+        new.__merge      = {}
+
         return new
 
 
@@ -174,6 +222,7 @@ class Notifier:
 
         self.__listeners[topic][name] = listener
         self.__enabled[  topic]       = self.__enabled.get(topic, True)
+        self.__cache.clear()
 
         log.debug('%s: Registered %s', type(self).__name__, listener)
 
@@ -204,6 +253,8 @@ class Notifier:
         if listener is None:
             return
 
+        self.__cache.clear()
+
         # No more listeners for this topic
         if len(listeners) == 0:
             self.__listeners.pop(topic)
@@ -253,6 +304,8 @@ class Notifier:
             if topic in self.__enabled:
                 self.__enabled[topic] = state
 
+        self.__cache.clear()
+
 
     def disableAll(self, topic=None):
         """Disable all listeners for the specified topic (or ``None``
@@ -337,6 +390,105 @@ class Notifier:
                 self.enable(name, topic, state)
 
 
+    def coalesce(self, topic, merge=None):
+        """Coalesce notifications on the given ``topic`` which are made
+        inside a :meth:`batch` block, so that listeners are only notified
+        once when the block exits.
+
+        :arg topic: Topic to coalesce. Pass ``None`` to coalesce
+                    notifications on the default topic.
+
+        :arg merge: Function which is used to merge the values of all
+                    coalesced notifications into a single value. Must accept
+                    three arguments - this ``Notifier``, the topic, and a
+                    list containing all of the notification values, in the
+                    order that they were made. If not provided, the most
+                    recent value is used.
+        """
+        if merge is None:
+            merge = _lastValue
+        self.__merge[topic] = merge
+
+
+    def uncoalesce(self, topic):
+        """Stop coalescing notifications on the given ``topic``. See
+        :meth:`coalesce`.
+        """
+        self.__merge.pop(topic, None)
+
+
+    def isCoalesced(self, topic):
+        """Returns ``True`` if notifications on the given ``topic`` are
+        coalesced, ``False`` otherwise. See :meth:`coalesce`.
+        """
+        return topic in self.__merge
+
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Context manager which defers all notifications until the block
+        exits. Notifications on topics which have been passed to the
+        :meth:`coalesce` method are merged into a single notification,
+        which is delivered at the position of the last notification on that
+        topic. Notifications on all other topics are delivered separately.
+        All notifications are delivered in the order that they were made.
+        ``batch`` blocks may be nested - notifications are delivered when the
+        outermost block exits.
+
+        Batches are local to the calling thread - notifications which are
+        made by other threads while a ``batch`` block is open are delivered
+        immediately.
+        """
+
+        state = self.__batchState
+        depth = getattr(state, 'depth', 0)
+
+        if depth == 0:
+            state.pending = []
+
+        state.depth = depth + 1
+
+        try:
+            yield
+
+        finally:
+            state.depth = depth
+
+            if depth == 0:
+                pending       = state.pending
+                state.pending = None
+                self.__flush(pending)
+
+
+    def __flush(self, pending):
+        """Called when the outermost :meth:`batch` block exits. Delivers all
+        of the notifications that were made inside the block.
+        """
+
+        # Gather the values for all coalesced
+        # topics, and the index of the last
+        # notification on each topic
+        merged = collections.defaultdict(list)
+        last   = {}
+
+        for i, (topic, value) in enumerate(pending):
+            if topic in self.__merge:
+                merged[topic].append(value)
+                last[  topic] = i
+
+        log.debug('%s: Delivering %i batched notifications',
+                  type(self).__name__, len(pending))
+
+        for i, (topic, value) in enumerate(pending):
+
+            if topic in merged:
+                if last[topic] != i:
+                    continue
+                value = self.__merge[topic](self, topic, merged[topic])
+
+            self.__notify(topic, value)
+
+
     def notify(self, *args, **kwargs):
         """Notify all registered listeners of this ``Notifier``.
 
@@ -355,10 +507,27 @@ class Notifier:
         .. note:: Listeners registered with ``runOnIdle=True`` are called
                   via :func:`idle.idle`. Other listeners are called directly.
                   See :meth:`register`.
+
+        .. note:: If called inside a :meth:`batch` block, the notification
+                  is deferred until the block exits.
+        """
+
+        topic = kwargs.get('topic', None)
+        value = kwargs.get('value', None)
+
+        pending = getattr(self.__batchState, 'pending', None)
+        if pending is not None:
+            pending.append((topic, value))
+            return
+
+        self.__notify(topic, value)
+
+
+    def __notify(self, topic, value):
+        """Called by :meth:`notify` and :meth:`batch`. Notifies all listeners
+        on the given ``topic``.
         """
 
-        topic     = kwargs.get('topic', None)
-        value     = kwargs.get('value', None)
         listeners = self.__getListeners(topic)
 
         if len(listeners) == 0:
@@ -366,7 +535,7 @@ class Notifier:
 
         if log.getEffectiveLevel() <= logging.DEBUG:
             stack   = inspect.stack()
-            frame   = stack[1]
+            frame   = stack[2]
             srcMod  = '...{}'.format(frame[1][-20:])
             srcLine = frame[2]
 
@@ -388,7 +557,8 @@ class Notifier:
             if callback is None:
                 log.debug('Listener %s has been gc\'d - '
                           'removing from list', name)
-                self.__listeners[listener.topic].pop(name)
+                self.__listeners[listener.topic].pop(name, None)
+                self.__cache.clear()
                 continue
 
             if not listener.enabled:
@@ -403,7 +573,23 @@ class Notifier:
 
     def __getListeners(self, topic):
         """Called by :meth:`notify`. Returns all listeners which should be
-        notified for the specified ``topic``.
+        notified for the specified ``topic``. The returned list is cached
+        until listeners are registered/deregistered, or listeners on a topic
+        are enabled/disabled.
+        """
+
+        listeners = self.__cache.get(topic, None)
+
+        if listeners is None:
+            listeners           = self.__buildListeners(topic)
+            self.__cache[topic] = listeners
+
+        return listeners
+
+
+    def __buildListeners(self, topic):
+        """Called by :meth:`__getListeners`. Builds and returns a list of all
+        listeners which should be notified for the specified ``topic``.
         """
 
         listeners = []
@@ -420,3 +606,10 @@ class Notifier:
             listeners.extend(self.__listeners.get(topic, {}).values())
 
         return listeners
+
+
+def _lastValue(notifier, topic, values):
+    """Default merge function used by :meth:`Notifier.coalesce` - returns
+    the most recent value.
+    """
+    return values[-1]
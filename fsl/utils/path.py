@@ -25,6 +25,7 @@ paths.
    commonBase
    wslpath
    winpath
+   isSettled
 """
 
 
@@ -33,6 +34,7 @@ import            os
 import            glob
 import            operator
 import            pathlib
+import            time
 import            re
 
 from typing import Sequence, Tuple, Union
@@ -41,6 +43,14 @@ from typing import Sequence, Tuple, Union
 PathLike = Union[str, pathlib.Path]
 
 
+RACY_INTERVAL = 2 * 10 ** 9
+"""Some file systems only store modification times with a resolution of one
+or two seconds, so changes made to a file or directory shortly after a
+previous change may not be reflected in its modification time. See
+:func:`isSettled`.
+"""
+
+
 class PathError(Exception):
     """``Exception`` class raised by the functions defined in this module
     when something goes wrong.
@@ -609,3 +619,19 @@ def winpath(path):
                                'FSLDIR (%s)' % platform.fsldir)
 
         return "\\\\wsl$\\" + distro + path.replace("/", "\\")
+
+
+def isSettled(mtime : int, now : int = None) -> bool:
+    """Returns ``True`` if more than :data:`RACY_INTERVAL` nanoseconds
+    elapsed between the modification time ``mtime`` of a file or directory,
+    and ``now``. Information gathered about a file or directory at time
+    ``now`` may only be re-used while its modification time is unchanged if
+    this function returns ``True``.
+
+    :arg mtime: Modification time, in nanoseconds (e.g. ``st_mtime_ns``)
+    :arg now:   Time, in nanoseconds, at which the file or directory was
+                read. Defaults to the current time.
+    """
+    if now is None:
+        now = time.time_ns()
+    return now - mtime > RACY_INTERVAL
@@ -15,30 +15,47 @@
 
    run
    runfsl
+   arun
+   arunfsl
    runfunc
    submitfunc
+   submitmap
    func_to_cmd
    dryrun
    hold
+   JobTracker
    job_output
+   SubmitBackend
+   FslSubBackend
+   LocalBackend
 """
 
 
-import                    io
-import                    sys
-import                    glob
-import                    time
-import                    shlex
-import                    logging
-import                    threading
-import                    contextlib
-import collections.abc as abc
-import subprocess      as sp
-import os.path         as op
-import                    os
-import textwrap        as tw
-
-import                    dill
+import                       io
+import                       ctypes
+import                       asyncio
+import                       codecs
+import                       sys
+import                       glob
+import                       itertools
+import                       shlex
+import                       logging
+import                       select
+import                       selectors
+import                       shutil
+import                       tempfile
+import                       threading
+import                       contextlib
+import                       weakref
+import functools          as ft
+import collections.abc    as abc
+import concurrent.futures as futures
+import subprocess         as sp
+import os.path            as op
+import                       os
+import textwrap           as tw
+
+import                       dill
 
 from   fsl.utils.platform import platform as fslplatform
 import fsl.utils.tempdir                  as tempdir
@@ -64,6 +81,22 @@ FSL_PREFIX = None
 """Global override for the FSL executable location used by :func:`runfsl`. """
 
 
+SUBMIT_BACKEND = None
+"""The :class:`SubmitBackend` used to execute jobs which are submitted via
+:func:`run` (with the ``submit`` option), :func:`submitfunc` and
+:func:`submitmap`. If ``None``, jobs are submitted via ``fsl_sub`` (the
+:class:`FslSubBackend`). Set to a :class:`LocalBackend` to run jobs on the
+local machine.
+"""
+
+
+ARUN_LIMIT = None
+"""Default maximum number of commands which may be executed concurrently by
+:func:`arun` and :func:`arunfsl`, within each ``asyncio`` event loop. If
+``None``, there is no limit.
+"""
+
+
 class FSLNotPresent(Exception):
     """Error raised by the :func:`runfsl` function when ``$FSLDIR`` cannot
     be found.
@@ -130,6 +163,19 @@ def prepareArgs(args):
     return list(args)
 
 
+def _isBinary(stream):
+    """Returns ``True`` if the given file-like accepts ``bytes``, ``False``
+    if it accepts ``str``. Used by :func:`_forwardStream` and
+    :class:`_OutputSink`.
+    """
+    # not all file-likes have a mode attribute -
+    # if not present, assume a string stream
+    # (in-memory byte buffers are binary)
+    if isinstance(stream, io.BytesIO):
+        return True
+    return 'b' in getattr(stream, 'mode', 'w')
+
+
 def _forwardStream(in_, *outs):
     """Creates and starts a daemon thread which forwards the given input stream
     to one or more output streams. Used by the :func:`run` function to redirect
@@ -143,15 +189,13 @@ def _forwardStream(in_, *outs):
     :returns:  The thread that has been started.
     """
 
-    # not all file-likes have a mode attribute -
-    # if not present, assume a string stream
-    omodes = [getattr(o, 'mode', 'w') for o in outs]
+    binary = [_isBinary(o) for o in outs]
 
     def realForward():
         for line in iter(in_.readline, b''):
             for i, o in enumerate(outs):
-                if 'b' in omodes[i]: o.write(line)
-                else:                o.write(line.decode('utf-8'))
+                if binary[i]: o.write(line)
+                else:         o.write(line.decode('utf-8'))
 
     t = threading.Thread(target=realForward)
     t.daemon = True
@@ -184,8 +228,9 @@ def run(*args, **kwargs):
 
     :arg submit:   Must be passed as a keyword argument. Defaults to ``None``.
                    If ``True``, the command is submitted as a cluster job via
-                   the :mod:`fsl.wrappers.fsl_sub` function.  May also be a
-                   dictionary containing arguments to that function.
+                   the :mod:`fsl.wrappers.fsl_sub` function (or the
+                   :data:`SUBMIT_BACKEND`).  May also be a dictionary
+                   containing arguments to that function.
 
     :arg cmdonly:  Defaults to ``False``. If ``True``, the command is not
                    executed, but rather is returned directly, as a list of
@@ -226,6 +271,44 @@ def run(*args, **kwargs):
               ``exitcode`` arguments.
     """
 
+    args, opts = _prepareRun(args, kwargs)
+    submit     = opts['submit']
+
+    if opts['cmdonly']:
+        return args
+
+    if DRY_RUN:
+        return _dryrun(submit, opts['stdout'], opts['stderr'],
+                       opts['exitcode'], *args)
+
+    # submit - delegate to the submission
+    # backend (fsl_sub by default)
+    if submit is not None:
+        return _submitBackend().submit(
+            *args, log=opts['log'], **submit, **kwargs)
+
+    # Run directly - delegate to _realrun
+    stdout, stderr, exitcode = _realrun(opts['tee'],
+                                        opts['logStdout'],
+                                        opts['logStderr'],
+                                        opts['logCmd'],
+                                        *args, **kwargs)
+
+    return _runResults(args, opts, stdout, stderr, exitcode)
+
+
+def _prepareRun(args, kwargs):
+    """Used by :func:`run` and :func:`arun`. Removes the ``run`` options from
+    ``kwargs``, and prepares the command arguments.
+
+    :arg args:   Command arguments, as passed to :func:`run`
+    :arg kwargs: Keyword arguments, as passed to :func:`run`. Modified
+                 in-place - all recognised options are removed.
+    :returns:    A tuple containing:
+                  - The command, as a list of strings
+                  - A dict containing the options
+    """
+
     returnStdout   = kwargs.pop('stdout',   True)
     returnStderr   = kwargs.pop('stderr',   False)
     returnExitcode = kwargs.pop('exitcode', False)
@@ -238,11 +321,6 @@ def run(*args, **kwargs):
     if logg is None:
         logg = {'tee' : not silent}
 
-    tee       = logg.get('tee',    True)
-    logStdout = logg.get('stdout', None)
-    logStderr = logg.get('stderr', None)
-    logCmd    = logg.get('cmd',    None)
-
     if not bool(submit):
         submit = None
 
@@ -254,32 +332,37 @@ def run(*args, **kwargs):
         raise ValueError('submit must be a mapping containing '
                          'options for fsl.utils.fslsub.submit')
 
-    if cmdonly:
-        return args
-
-    if DRY_RUN:
-        return _dryrun(
-            submit, returnStdout, returnStderr, returnExitcode, *args)
-
-    # submit - delegate to fsl_sub. This will induce a nested
-    # call back to this run function, which is a bit confusing,
-    # but harmless, as we've popped the "submit" arg above.
-    if submit is not None:
-        from fsl.wrappers import fsl_sub  # pylint: disable=import-outside-toplevel  # noqa: E501
-        return fsl_sub(*args, log=logg, **submit, **kwargs)[0].strip()
-
-    # Run directly - delegate to _realrun
-    stdout, stderr, exitcode = _realrun(
-        tee, logStdout, logStderr, logCmd, *args, **kwargs)
+    return args, {'stdout'    : returnStdout,
+                  'stderr'    : returnStderr,
+                  'exitcode'  : returnExitcode,
+                  'submit'    : submit,
+                  'cmdonly'   : cmdonly,
+                  'log'       : logg,
+                  'tee'       : logg.get('tee',    True),
+                  'logStdout' : logg.get('stdout', None),
+                  'logStderr' : logg.get('stderr', None),
+                  'logCmd'    : logg.get('cmd',    None)}
+
+
+def _runResults(args, opts, stdout, stderr, exitcode):
+    """Used by :func:`run` and :func:`arun`. Raises an error if the command
+    failed, otherwise generates the return value.
+
+    :arg args:     The command that was run
+    :arg opts:     Options, as returned by :func:`_prepareRun`
+    :arg stdout:   Command standard output
+    :arg stderr:   Command standard error
+    :arg exitcode: Command exit code
+    """
 
-    if not returnExitcode and (exitcode != 0):
+    if not opts['exitcode'] and (exitcode != 0):
         raise RuntimeError('{} returned non-zero exit code: {}'.format(
             args[0], exitcode))
 
     results = []
-    if returnStdout:   results.append(stdout)
-    if returnStderr:   results.append(stderr)
-    if returnExitcode: results.append(exitcode)
+    if opts['stdout']:   results.append(stdout)
+    if opts['stderr']:   results.append(stderr)
+    if opts['exitcode']: results.append(exitcode)
 
     if len(results) == 1: return results[0]
     else:                 return tuple(results)
@@ -315,6 +398,13 @@ def _realrun(tee, logStdout, logStderr, logCmd, *args, **kwargs):
     """Used by :func:`run`. Runs the given command and manages its standard
     output and error streams.
 
+    The command's standard output and error are accumulated in memory. If
+    they do not need to be forwarded anywhere (i.e. ``tee`` is ``False``, and
+    ``logStdout`` / ``logStderr`` are not file-likes), they are collected with
+    ``Popen.communicate``. Otherwise they are read in chunks and forwarded as
+    they arrive, via :func:`_streamOutput` or, on platforms where pipes
+    cannot be polled, via :func:`_forwardStream` threads.
+
     :arg tee:       If ``True``, the command's standard output and error
                     streams are forwarded to this process' standard output/
                     error.
@@ -337,67 +427,39 @@ def _realrun(tee, logStdout, logStderr, logCmd, *args, **kwargs):
                       - the command's standard error as a string.
                       - the command's exit code.
     """
-    if fslplatform.fslwsl:
-        # On Windows this prevents opening of a popup window
-        startupinfo = sp.STARTUPINFO()
-        startupinfo.dwFlags |= sp.STARTF_USESHOWWINDOW
-        kwargs["startupinfo"] = startupinfo
+    _popenKwargs(kwargs)
 
     proc = sp.Popen(args, stdout=sp.PIPE, stderr=sp.PIPE, **kwargs)
-    with tempdir.tempdir(changeto=False) as td:
-
-        # We always direct the command's stdout/
-        # stderr to two temporary files
-        stdoutf = op.join(td, 'stdout')
-        stderrf = op.join(td, 'stderr')
-
-        with open(stdoutf, 'wb') as stdout, \
-             open(stderrf, 'wb') as stderr:  # noqa
-
-            outstreams = [stdout]
-            errstreams = [stderr]
-
-            # if tee, we duplicate the command's
-            # stdout/stderr to this process'
-            # stdout/stderr
-            if tee:
-                outstreams.append(sys.stdout)
-                errstreams.append(sys.stderr)
-
-            # And we also duplicate to caller-provided
-            # streams if they are file-likes (if they're
-            # callables, we call them after the process
-            # has completed)
-            if logStdout is not None and not callable(logStdout):
-                outstreams.append(logStdout)
-            if logStderr is not None and not callable(logStderr):
-                errstreams.append(logStderr)
-
-            # log the command if requested.
-            # logCmd can be a callable, or
-            # can be a file-like.
-            cmd = ' '.join(args) + '\n'
-            if callable(logCmd):
-                logCmd(cmd)
-            elif logCmd is not None:
-                if 'b' in getattr(logCmd, 'mode', 'w'):
-                    logCmd.write(cmd.encode('utf-8'))
-                else:
-                    logCmd.write(cmd)
-
-            stdoutt = _forwardStream(proc.stdout, *outstreams)
-            stderrt = _forwardStream(proc.stderr, *errstreams)
-
-            # Wait until the forwarding threads
-            # have finished cleanly, and the
-            # command has terminated.
-            stdoutt.join()
-            stderrt.join()
-            proc.communicate()
-
-        # Read in the command's stdout/stderr
-        with open(stdoutf, 'rb') as f: stdout = f.read()
-        with open(stderrf, 'rb') as f: stderr = f.read()
+
+    outstreams, errstreams = _outputStreams(tee, logStdout, logStderr)
+    _logCommand(logCmd, args)
+
+    # Nothing to forward - let
+    # communicate do all the work
+    if len(outstreams) == 0 and len(errstreams) == 0:
+        stdout, stderr = proc.communicate()
+
+    elif _canSelect():
+        stdout, stderr = _streamOutput(proc, outstreams, errstreams)
+
+    # Fall back to reading the process stdout/
+    # stderr on separate threads (necessary to
+    # avoid deadlocks), collecting them into
+    # in-memory buffers.
+    else:
+        stdout  = io.BytesIO()
+        stderr  = io.BytesIO()
+        stdoutt = _forwardStream(proc.stdout, stdout, *outstreams)
+        stderrt = _forwardStream(proc.stderr, stderr, *errstreams)
+
+        # Wait until the forwarding threads
+        # have finished cleanly, and the
+        # command has terminated.
+        stdoutt.join()
+        stderrt.join()
+        proc.communicate()
+        stdout = stdout.getvalue()
+        stderr = stderr.getvalue()
 
     exitcode = proc.returncode
     stdout   = stdout.decode('utf-8')
@@ -410,6 +472,138 @@ def _realrun(tee, logStdout, logStderr, logCmd, *args, **kwargs):
     return stdout, stderr, exitcode
 
 
+def _popenKwargs(kwargs):
+    """Used by :func:`_realrun` and :func:`arun`. Adds any platform-specific
+    options to the given dict of keyword arguments for ``subprocess.Popen``.
+    """
+    if fslplatform.fslwsl:
+        # On Windows this prevents opening of a popup window
+        startupinfo = sp.STARTUPINFO()
+        startupinfo.dwFlags |= sp.STARTF_USESHOWWINDOW
+        kwargs["startupinfo"] = startupinfo
+
+
+def _outputStreams(tee, logStdout, logStderr):
+    """Used by :func:`_realrun` and :func:`arun`. Returns two lists containing
+    the file-likes to which a command's standard output and error should be
+    forwarded.
+    """
+    outstreams = []
+    errstreams = []
+
+    # if tee, we duplicate the command's
+    # stdout/stderr to this process'
+    # stdout/stderr
+    if tee:
+        outstreams.append(sys.stdout)
+        errstreams.append(sys.stderr)
+
+    # And we also duplicate to caller-provided
+    # streams if they are file-likes (if they're
+    # callables, we call them after the process
+    # has completed)
+    if logStdout is not None and not callable(logStdout):
+        outstreams.append(logStdout)
+    if logStderr is not None and not callable(logStderr):
+        errstreams.append(logStderr)
+
+    return outstreams, errstreams
+
+
+def _logCommand(logCmd, args):
+    """Used by :func:`_realrun` and :func:`arun`. Logs the command if
+    requested - ``logCmd`` can be a callable, or can be a file-like.
+    """
+    cmd = ' '.join(args) + '\n'
+    if callable(logCmd):
+        logCmd(cmd)
+    elif logCmd is not None:
+        if 'b' in getattr(logCmd, 'mode', 'w'):
+            logCmd.write(cmd.encode('utf-8'))
+        else:
+            logCmd.write(cmd)
+
+
+def _canSelect():
+    """Used by :func:`_realrun`. Returns ``True`` if the standard output/error
+    pipes of a child process can be monitored with the ``selectors`` module
+    (which is not possible on Windows), ``False`` otherwise.
+    """
+    return os.name == 'posix' and not fslplatform.fslwsl
+
+
+def _streamOutput(proc, outstreams, errstreams, chunksize=65536):
+    """Used by :func:`_realrun`. Reads the standard output and error of the
+    given process in chunks, as they become available, and forwards each
+    chunk to the given output streams. Output is forwarded as it is produced,
+    rather than one line at a time, so commands which produce large amounts
+    of output can be handled with little overhead.
+
+    :arg proc:       ``subprocess.Popen`` object
+    :arg outstreams: Sequence of file-likes to forward standard output to
+    :arg errstreams: Sequence of file-likes to forward standard error to
+    :arg chunksize:  Maximum number of bytes to read at a time
+    :returns:        A tuple containing the process standard output and
+                     error, as ``bytes``.
+    """
+
+    sinks = {proc.stdout : _OutputSink(outstreams),
+             proc.stderr : _OutputSink(errstreams)}
+
+    with selectors.DefaultSelector() as sel:
+        for pipe, sink in sinks.items():
+            sel.register(pipe, selectors.EVENT_READ, sink)
+
+        while len(sel.get_map()) > 0:
+            for key, _ in sel.select():
+                chunk = os.read(key.fd, chunksize)
+                key.data.write(chunk)
+                if len(chunk) == 0:
+                    sel.unregister(key.fileobj)
+                    key.fileobj.close()
+
+    proc.wait()
+    return sinks[proc.stdout].getvalue(), sinks[proc.stderr].getvalue()
+
+
+class _OutputSink:
+    """Used by :func:`_streamOutput` and :func:`arun`. Accumulates chunks of
+    data read from one of a command's output streams, and forwards them to
+    zero or more file-likes.
+
+    Text-mode file-likes are passed incrementally decoded data, so that
+    multi-byte characters which are split across chunks are handled.
+    """
+
+    def __init__(self, outs):
+        """Create an ``_OutputSink``.
+
+        :arg outs: Sequence of file-likes to forward data to
+        """
+        self.__outs    = list(outs)
+        self.__binary  = [_isBinary(o) for o in outs]
+        self.__decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.__buffer  = io.BytesIO()
+
+    def write(self, chunk):
+        """Save and forward a chunk of data. An empty chunk denotes the end of
+        the stream.
+        """
+        self.__buffer.write(chunk)
+
+        if len(self.__outs) == 0:
+            return
+
+        text = self.__decoder.decode(chunk, len(chunk) == 0)
+        for out, binary in zip(self.__outs, self.__binary):
+            if   binary: out.write(chunk)
+            elif text:   out.write(text)
+
+    def getvalue(self):
+        """Return all data that has been written, as ``bytes``. """
+        return self.__buffer.getvalue()
+
+
 def runfsl(*args, **kwargs):
     """Call a FSL command and return its output.
 
@@ -422,6 +616,15 @@ def runfsl(*args, **kwargs):
 
       If found, the full path to the command is then passed to :func:`run`.
     """
+    args = _fslCommand(args)
+    return run(*args, **kwargs)
+
+
+def _fslCommand(args):
+    """Used by :func:`runfsl` and :func:`arunfsl`. Searches for the given
+    FSL command, and returns the command arguments with the command replaced
+    by its full path.
+    """
     prefixes = []
 
     if FSL_PREFIX is not None:
@@ -452,7 +655,132 @@ def runfsl(*args, **kwargs):
         raise FileNotFoundError('FSL tool {} not found (checked {})'.format(
             args[0], ', '.join(prefixes)))
 
-    return run(*args, **kwargs)
+    return args
+
+
+async def arun(*args, **kwargs):
+    """Coroutine equivalent of :func:`run`. Runs a command via
+    ``asyncio.create_subprocess_exec``, and returns its output.
+
+    All of the options accepted by :func:`run` are supported, with the same
+    semantics. Jobs which are submitted via ``submit`` are submitted from a
+    separate thread, as :func:`.fsl_sub` is not a coroutine.
+
+    :arg semaphore: Must be passed as a keyword argument. An
+                    ``asyncio.Semaphore`` which is used to limit the number
+                    of commands executed concurrently. If not provided, and
+                    :data:`ARUN_LIMIT` is set, a semaphore which is shared by
+                    all ``arun`` calls within the running event loop is used.
+
+    All other keyword arguments are passed through to
+    ``asyncio.create_subprocess_exec``.
+    """
+
+    semaphore  = kwargs.pop('semaphore', None)
+    origkwargs = dict(kwargs)
+    args, opts = _prepareRun(args, kwargs)
+
+    if opts['cmdonly']:
+        return args
+
+    if DRY_RUN:
+        return _dryrun(opts['submit'], opts['stdout'], opts['stderr'],
+                       opts['exitcode'], *args)
+
+    if opts['submit'] is not None:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, ft.partial(run, args, **origkwargs))
+
+    if semaphore is None:
+        semaphore = _arunSemaphore()
+
+    if semaphore is None:
+        stdout, stderr, exitcode = await _arealrun(args, opts, kwargs)
+    else:
+        async with semaphore:
+            stdout, stderr, exitcode = await _arealrun(args, opts, kwargs)
+
+    return _runResults(args, opts, stdout, stderr, exitcode)
+
+
+async def arunfsl(*args, **kwargs):
+    """Coroutine equivalent of :func:`runfsl`. The FSL command is located
+    in the same way as :func:`runfsl`, and is then passed to :func:`arun`.
+    """
+    args = _fslCommand(args)
+    return await arun(*args, **kwargs)
+
+
+_arunSemaphores = weakref.WeakKeyDictionary()
+"""Used by :func:`_arunSemaphore`. Stores one ``asyncio.Semaphore`` for
+each event loop, as semaphores cannot be shared across event loops.
+"""
+
+
+def _arunSemaphore():
+    """Used by :func:`arun`. Returns the semaphore for the running event loop,
+    which is used to limit the number of concurrently executing commands to
+    :data:`ARUN_LIMIT`. Returns ``None`` if ``ARUN_LIMIT`` is ``None``.
+    """
+    if ARUN_LIMIT is None:
+        return None
+
+    loop          = asyncio.get_running_loop()
+    limit, semaph = _arunSemaphores.get(loop, (None, None))
+
+    if limit != ARUN_LIMIT:
+        semaph                = asyncio.Semaphore(ARUN_LIMIT)
+        _arunSemaphores[loop] = (ARUN_LIMIT, semaph)
+
+    return semaph
+
+
+async def _arealrun(args, opts, kwargs):
+    """Used by :func:`arun`. Runs the given command and manages its standard
+    output and error streams. This is the coroutine equivalent of
+    :func:`_realrun`.
+
+    :arg args:   Command to run
+    :arg opts:   Options, as returned by :func:`_prepareRun`
+    :arg kwargs: Passed through to ``asyncio.create_subprocess_exec``.
+    :returns:    A tuple containing the command's standard output and error
+                 as strings, and its exit code.
+    """
+
+    tee       = opts['tee']
+    logStdout = opts['logStdout']
+    logStderr = opts['logStderr']
+
+    _popenKwargs(kwargs)
+
+    proc = await asyncio.create_subprocess_exec(
+        *args, stdout=sp.PIPE, stderr=sp.PIPE, **kwargs)
+
+    outstreams, errstreams = _outputStreams(tee, logStdout, logStderr)
+    _logCommand(opts['logCmd'], args)
+
+    async def forward(stream, sink):
+        while True:
+            chunk = await stream.read(65536)
+            sink.write(chunk)
+            if len(chunk) == 0:
+                break
+
+    outsink = _OutputSink(outstreams)
+    errsink = _OutputSink(errstreams)
+
+    await asyncio.gather(forward(proc.stdout, outsink),
+                         forward(proc.stderr, errsink))
+
+    exitcode = await proc.wait()
+    stdout   = outsink.getvalue().decode('utf-8')
+    stderr   = errsink.getvalue().decode('utf-8')
+
+    if logStdout is not None and callable(logStdout): logStdout(stdout)
+    if logStderr is not None and callable(logStderr): logStderr(stderr)
+
+    return stdout, stderr, exitcode
 
 
 def runfunc(func,
@@ -578,6 +906,207 @@ def submitfunc(func,
     return get_result, jid
 
 
+def submitmap(func,
+              iterable,
+              chunksize=1,
+              tmp_dir=None,
+              env=None,
+              hold_jids=None,
+              clean='never',
+              **submit_kwargs):
+    """Submit ``func`` to the cluster, to be called on every item in
+    ``iterable``, as a single array job.
+
+    Rather than creating one script and one job per call (as is done by
+    :func:`submitfunc`), the function and all of the items are saved to a
+    single payload file. The items are divided into chunks of ``chunksize``
+    items, and one array task is submitted for each chunk. The results for
+    each chunk are saved to a shared results directory, and are monitored
+    with a :class:`JobTracker`.
+
+    :arg func:          Function to run. Called once for each item in
+                        ``iterable``, with the item as its sole argument.
+    :arg iterable:      Items to call ``func`` on.
+    :arg chunksize:     Number of items to process within each array task.
+    :arg tmp_dir:       Directory in which to create the working directory
+                        for the job (default: current working directory).
+    :arg env:           Dict of additional environment variables that should
+                        be set when the function is run.
+    :arg hold_jids:     List of cluster job IDs that this job depends on.
+    :arg clean:         Clean up the working directory after all results have
+                        been loaded - one of ``'never'``, ``'on_success'``
+                        (only if no calls raised an error), or ``'always'``.
+    :arg submit_kwargs: Passed through to ``fsl_sub``.
+
+    :returns: a tuple containing:
+
+              - A list of ``concurrent.futures.Future`` objects, one for each
+                item in ``iterable``, in the same order. The result of each
+                future is the function return value or, if the function
+                raised an error, the error is set as the future exception.
+
+              - the submitted job ID (``None`` if ``iterable`` is empty).
+    """
+
+    if clean not in ('never', 'always', 'on_success'):
+        raise ValueError("Clean should be one of 'never', 'always', "
+                         f"or 'on_success', not {clean}")
+    if chunksize < 1:
+        raise ValueError(f'Invalid chunksize: {chunksize}')
+
+    if tmp_dir is None:
+        tmp_dir = '.'
+
+    items   = list(iterable)
+    chunks  = [items[i:i + chunksize]
+               for i in range(0, len(items), chunksize)]
+
+    if len(items) == 0:
+        return [], None
+
+    workdir = op.abspath(tempfile.mkdtemp(
+        prefix=f'.submitmap.{func.__name__}.', dir=tmp_dir))
+    resdir  = op.join(workdir, 'results')
+    jobname = op.basename(workdir).lstrip('.')
+    payload = op.join(workdir, 'payload.dill')
+    script  = op.join(workdir, 'task.py')
+    tasks   = op.join(workdir, 'tasks.txt')
+
+    os.mkdir(resdir)
+
+    with open(payload, 'wb') as f:
+        dill.dump((func, chunks), f, recurse=True)
+
+    if env is not None:
+        env_snippet = [f'os.environ["{k}"] = "{v}"' for k, v in env.items()]
+        env_snippet = '\n'.join(env_snippet)
+    else:
+        env_snippet = ''
+
+    with open(script, 'wt') as f:
+        f.write(_SUBMITMAP_SCRIPT.format(executable=sys.executable,
+                                         funcname=func.__name__,
+                                         env_snippet=env_snippet,
+                                         payload=repr(payload),
+                                         resdir=repr(resdir)))
+    os.chmod(script, 0o755)
+
+    # one array task per chunk
+    with open(tasks, 'wt') as f:
+        for i in range(len(chunks)):
+            f.write(f'{shlex.quote(script)} {i}\n')
+
+    submit_kwargs = dict(submit_kwargs)
+    submit_kwargs['name']   = jobname
+    submit_kwargs['logdir'] = workdir
+    if hold_jids is not None:
+        submit_kwargs['jobhold'] = ','.join(hold_jids)
+
+    jid = _submitBackend().submit(array_task=tasks,
+                                  log={'tee' : False},
+                                  **submit_kwargs)
+
+    log.debug('Running function %s over %i items on cluster (job %s, '
+              '%i tasks, saving results to %s)', func.__name__, len(items),
+              jid, len(chunks), resdir)
+
+    futs      = [futures.Future() for _ in items]
+    tracker   = JobTracker(markerdir=workdir)
+    completed = set()
+    failed    = []
+    lock      = threading.Lock()
+
+    # Loads the results for a chunk, and completes
+    # the associated futures. Called when the results
+    # file for the chunk appears, and for every chunk
+    # when the array job has finished, so we will
+    # notice tasks which did not save any results
+    # (e.g. if a task was killed).
+    def loadChunk(idx):
+        with lock:
+            if idx in completed:
+                return
+            completed.add(idx)
+            last = len(completed) == len(chunks)
+
+        chunkfuts = futs[idx * chunksize:(idx + 1) * chunksize]
+        resfile   = op.join(resdir, f'{idx}.dill')
+
+        try:
+            with open(resfile, 'rb') as f:
+                results = dill.load(f)
+        except Exception as e:
+            err     = RuntimeError(f'Could not load results for task {idx} '
+                                   f'of array job {jid} (see {workdir}): {e}')
+            results = [(False, err)] * len(chunkfuts)
+
+        for fut, (success, result) in zip(chunkfuts, results):
+            if success:
+                fut.set_result(result)
+            else:
+                failed.append(idx)
+                fut.set_exception(result)
+
+        if last:
+            tracker.close()
+            cleanop = clean
+            if len(failed) > 0 and cleanop == 'on_success':
+                cleanop = 'never'
+            if cleanop in ('on_success', 'always'):
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    def chunkDone(idx, fut):
+        if not fut.cancelled():
+            loadChunk(idx)
+
+    def jobDone(fut):
+        if not fut.cancelled():
+            for idx in range(len(chunks)):
+                loadChunk(idx)
+
+    for idx in range(len(chunks)):
+        resfile = op.join(resdir, f'{idx}.dill')
+        tracker.watch(resfile).add_done_callback(ft.partial(chunkDone, idx))
+
+    tracker.track(jid).add_done_callback(jobDone)
+
+    return futs, jid
+
+
+_SUBMITMAP_SCRIPT = tw.dedent("""
+#!{executable}
+# This is a temporary file designed to run the python function {funcname}
+# on one chunk of items, as part of an array job created by submitmap.
+import os
+import sys
+import dill
+
+{env_snippet}
+
+index = int(sys.argv[1])
+
+with open({payload}, 'rb') as f:
+    func, chunks = dill.load(f)
+
+results = []
+for item in chunks[index]:
+    try:
+        results.append((True, func(item)))
+    except Exception as e:
+        results.append((False, e))
+
+# Save to a temporary file and rename, so
+# the results appear atomically
+resfile = os.path.join({resdir}, '{{}}.dill'.format(index))
+with open(resfile + '.tmp', 'wb') as f:
+    dill.dump(results, f)
+os.rename(resfile + '.tmp', resfile)
+""").strip()
+"""Template for the script used by :func:`submitmap` to run one chunk of an
+array job.
+"""
+
+
 def func_to_cmd(func,
                 args=None,
                 kwargs=None,
@@ -769,7 +1298,10 @@ def hold(job_ids, hold_filename=None, timeout=10, jobtime=None, cancel=None):
                         not.  Defaults to a ./.<random characters>.hold in
                         the current directory.
 
-    :arg timeout:       Number of seconds to sleep between  status checks.
+    :arg timeout:       Maximum number of seconds to sleep between status
+                        checks. The hold file is monitored with a
+                        :class:`JobTracker`, so will usually be noticed
+                        sooner.
 
     :arg jobtime:       Ignored, will be removed at some point.
 
@@ -778,21 +1310,6 @@ def hold(job_ids, hold_filename=None, timeout=10, jobtime=None, cancel=None):
                         after the current timeout period has elapsed.
     """
 
-    # Returns a potentially nested sequence of
-    # job ids as a single comma-separated string
-    def _flatten_job_ids(job_ids):
-        def unpack(job_ids):
-            if isinstance(job_ids, str):
-                return {job_ids}
-            elif isinstance(job_ids, int):
-                return {str(job_ids)}
-            else:
-                res = set()
-                for job_id in job_ids:
-                    res.update(unpack(job_id))
-                return res
-        return ','.join(sorted(unpack(job_ids)))
-
     # If a hold file has been specified,
     # check that it doesn't exist, but that
     # its containing directory does exist,
@@ -834,17 +1351,703 @@ def hold(job_ids, hold_filename=None, timeout=10, jobtime=None, cancel=None):
     hold_id = run(f'rm {holdfile}', submit=submit, silent=True)
 
     # wait until the hold file is removed
-    while op.exists(holdfile):
-        # Return immediately if cancelled
-        if cancel is not None and cancel.is_set():
-            raise CancelledError(submit['jobhold'], hold_id)
-        time.sleep(timeout)
+    with JobTracker(maxinterval=timeout) as tracker:
+        removed = tracker.watch(holdfile, removed=True)
+        while True:
+            # Return immediately if cancelled
+            if cancel is not None and cancel.is_set():
+                raise CancelledError(submit['jobhold'], hold_id)
+            try:
+                removed.result(timeout)
+                break
+            except futures.TimeoutError:
+                pass
 
     # remove the fsl_sub job stdout/err files
     for fname in glob.glob(op.join(logdir, f'{jobname}.*')):
         os.remove(fname)
 
 
+class JobTracker:
+    """The ``JobTracker`` waits for the completion of cluster jobs, without
+    each wait occupying a thread, or requiring a separate :func:`hold` job.
+
+    Job completion is signalled by *marker* files - a job is considered to
+    have finished when its marker file is created (or, for markers passed to
+    :meth:`watch` with ``removed=True``, deleted). Marker files are created
+    by small marker jobs submitted by :meth:`track`, or can be any file
+    which is known to be created by a job when it finishes.
+
+    All markers are monitored by a single watcher thread. Where available
+    (Linux), the directories containing markers are watched with ``inotify``,
+    so local changes are noticed immediately. The markers are also polled,
+    with an adaptive interval which starts at ``mininterval`` seconds, and
+    doubles each time that nothing has changed, up to ``maxinterval``
+    seconds. Polling is always necessary, as files which are created by
+    other hosts on a network file system do not generate ``inotify`` events.
+
+    Each tracked set of jobs, or marker, is represented by a
+    ``concurrent.futures.Future``. :meth:`track` submits a single marker job
+    for any number of jobs, whereas :meth:`trackEach` submits one marker job
+    per job, so should only be used when per-job completion is needed::
+
+        with JobTracker() as tracker:
+            fut = tracker.track(['1234', '1235', '1236'])
+            fut.add_done_callback(lambda f : print(f'{f.result()} done'))
+            fut.result()
+    """
+
+
+    def __init__(self, markerdir=None, mininterval=0.1, maxinterval=10):
+        """Create a ``JobTracker``.
+
+        :arg markerdir:   Directory in which marker files for :meth:`track`
+                          are to be created. Defaults to a hidden directory
+                          within the current working directory, as it is more
+                          likely to be on a file system which is accessible by
+                          cluster nodes than ``$TMPDIR``. The directory is
+                          deleted by :meth:`close`, unless it was provided.
+        :arg mininterval: Minimum polling interval, in seconds.
+        :arg maxinterval: Maximum polling interval, in seconds.
+        """
+
+        if markerdir is not None:
+            markerdir = op.abspath(markerdir)
+
+        self.__markerdir   = markerdir
+        self.__ownsdir     = markerdir is None
+        self.__mininterval = mininterval
+        self.__maxinterval = maxinterval
+        self.__lock        = threading.Lock()
+        self.__wakeEvent   = threading.Event()
+        self.__closed      = False
+        self.__thread      = None
+        self.__counter     = itertools.count()
+
+        # {markerfile : [(removed, future, result, cleanup)]}
+        self.__markers = {}
+
+        # Use inotify if we can, otherwise
+        # fall back to polling. A pipe is
+        # used to wake the watcher thread.
+        self.__inotify = _Inotify.create()
+        if self.__inotify is not None:
+            self.__wakefds = os.pipe()
+        else:
+            self.__wakefds = None
+
+
+    def __enter__(self):
+        """Returns this ``JobTracker``. """
+        return self
+
+
+    def __exit__(self, *args):
+        """Calls :meth:`close`. """
+        self.close()
+
+
+    @property
+    def markerdir(self):
+        """Returns the directory in which :meth:`track` creates marker files,
+        creating it if necessary.
+        """
+        with self.__lock:
+            if self.__markerdir is None:
+                self.__markerdir = op.abspath(tempfile.mkdtemp(
+                    prefix='.jobtracker.', dir='.'))
+            return self.__markerdir
+
+
+    def close(self):
+        """Stops the watcher thread, and cancels all futures for jobs/markers
+        which have not yet completed.
+        """
+
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+            markers       = self.__markers
+            self.__markers = {}
+
+        self.__wake()
+        if self.__thread is not None and \
+           self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+        for entries in markers.values():
+            for _, future, _, _ in entries:
+                future.cancel()
+
+        if self.__inotify is not None:
+            self.__inotify.close()
+            os.close(self.__wakefds[0])
+            os.close(self.__wakefds[1])
+
+        if self.__ownsdir and self.__markerdir is not None:
+            shutil.rmtree(self.__markerdir, ignore_errors=True)
+
+
+    def watch(self, marker, removed=False, result=None):
+        """Wait for the given marker file to be created or deleted.
+
+        :arg marker:  Path to the marker file.
+        :arg removed: If ``False`` (the default), the future is completed when
+                      ``marker`` exists. Otherwise it is completed when
+                      ``marker`` does not exist.
+        :arg result:  Result to set on the future. Defaults to ``marker``.
+        :returns:     A ``concurrent.futures.Future``.
+        """
+        marker = op.abspath(marker)
+        if result is None:
+            result = marker
+        return self.__watch(marker, removed, result, None)
+
+
+    def track(self, job_ids, **kwargs):
+        """Wait for all of the given cluster jobs to finish.
+
+        A single marker job, which creates a marker file, is submitted (via
+        the :data:`SUBMIT_BACKEND`), held on all of the jobs.
+
+        :arg job_ids: Possibly nested sequence of job IDs
+        :arg kwargs:  Passed through to the :data:`SUBMIT_BACKEND` when
+                      submitting the marker job.
+        :returns:     A ``concurrent.futures.Future``, which is completed
+                      when all of the jobs have finished. Its result is a
+                      list containing the job IDs.
+        """
+        job_ids = _flatten_job_ids(job_ids)
+        return self.__submitMarker(job_ids, job_ids.split(','), **kwargs)
+
+
+    def trackEach(self, job_ids, **kwargs):
+        """Wait for each of the given cluster jobs to finish.
+
+        Unlike :meth:`track`, a separate marker job is submitted for every
+        job, so that each job can be tracked individually. Use :meth:`track`
+        if you only need to know when all of the jobs have finished.
+
+        :arg job_ids: Possibly nested sequence of job IDs
+        :arg kwargs:  Passed through to the :data:`SUBMIT_BACKEND` when
+                      submitting marker jobs.
+        :returns:     A ``dict`` of ``{job_id : Future}`` mappings. The result
+                      of each future is the job ID.
+        """
+        return {job_id : self.__submitMarker(job_id, job_id, **kwargs)
+                for job_id in _flatten_job_ids(job_ids).split(',')}
+
+
+    def wait(self, job_ids, timeout=None, **kwargs):
+        """Wait until all of the given cluster jobs have finished. See
+        :meth:`track`.
+
+        :arg job_ids: Possibly nested sequence of job IDs
+        :arg timeout: Maximum number of seconds to wait.
+        :returns:     ``True`` if all jobs finished, ``False`` if the
+                      ``timeout`` elapsed.
+        """
+        try:
+            self.track(job_ids, **kwargs).result(timeout)
+            return True
+        except futures.TimeoutError:
+            return False
+
+
+    def __submitMarker(self, jobhold, result, **kwargs):
+        """Used by :meth:`track` and :meth:`trackEach`. Submits a marker job
+        which is held on ``jobhold``, and returns a ``Future`` which is
+        completed with ``result`` when the marker job has run.
+        """
+
+        markerdir = self.markerdir
+        name      = f'jobtracker_{next(self.__counter)}'
+        marker    = op.join(markerdir, f'{name}.done')
+        submit    = dict(kwargs)
+        submit.update({'jobhold' : jobhold,
+                       'name'    : name,
+                       'logdir'  : markerdir})
+
+        # Marker jobs create their marker via an
+        # atomic rename, so we can't see a partially
+        # written marker file.
+        cmd = ['sh', '-c', f'touch {shlex.quote(marker)}.tmp && '
+                           f'mv {shlex.quote(marker)}.tmp '
+                           f'{shlex.quote(marker)}']
+
+        run(cmd, submit=submit, silent=True)
+
+        def cleanup():
+            for fname in glob.glob(op.join(markerdir, f'{name}.*')):
+                os.remove(fname)
+
+        return self.__watch(marker, False, result, cleanup)
+
+
+    def __watch(self, marker, removed, result, cleanup):
+        """Used by :meth:`watch` and :meth:`track`. Registers a marker file
+        and returns a ``Future`` for it.
+        """
+
+        future = futures.Future()
+
+        with self.__lock:
+            if self.__closed:
+                raise RuntimeError('JobTracker has been closed')
+
+            if self.__inotify is not None:
+                self.__inotify.watch(op.dirname(marker))
+
+            self.__markers.setdefault(marker, []).append(
+                (removed, future, result, cleanup))
+
+            if self.__thread is None:
+                self.__thread = threading.Thread(
+                    target=self.__watcher,
+                    name='JobTracker',
+                    daemon=True)
+                self.__thread.start()
+
+        self.__wake()
+        return future
+
+
+    def __wake(self):
+        """Wakes the watcher thread, so that it re-checks all markers. """
+        if self.__wakefds is not None:
+            try:
+                os.write(self.__wakefds[1], b'x')
+            except OSError:
+                pass
+        else:
+            self.__wakeEvent.set()
+
+
+    def __wait(self, interval):
+        """Used by the watcher thread. Waits until a file system event occurs,
+        the watcher is woken, or ``interval`` seconds have elapsed.
+
+        :returns: ``True`` if an event occurred or the watcher was woken,
+                  ``False`` if the interval elapsed.
+        """
+
+        if self.__inotify is None:
+            woken = self.__wakeEvent.wait(interval)
+            self.__wakeEvent.clear()
+            return woken
+
+        wakefd = self.__wakefds[0]
+        ready  = select.select([self.__inotify.fd, wakefd], [], [], interval)
+        ready  = ready[0]
+
+        if self.__inotify.fd in ready:
+            self.__inotify.drain()
+        if wakefd in ready:
+            os.read(wakefd, 4096)
+
+        return len(ready) > 0
+
+
+    def __check(self):
+        """Used by the watcher thread. Checks all markers, and completes the
+        futures for those which are done.
+
+        :returns: ``True`` if any markers were done, ``False`` otherwise.
+        """
+
+        with self.__lock:
+            markers = list(self.__markers.keys())
+
+        # List each directory once,
+        # rather than checking every
+        # marker file individually.
+        listings = {}
+        done     = []
+        for marker in markers:
+            dirname, basename = op.split(marker)
+            if dirname not in listings:
+                try:
+                    listings[dirname] = set(os.listdir(dirname))
+                except OSError:
+                    listings[dirname] = set()
+            exists = basename in listings[dirname]
+
+            with self.__lock:
+                entries = self.__markers.get(marker, [])
+                for entry in list(entries):
+                    if entry[0] != exists:
+                        entries.remove(entry)
+                        done.append(entry)
+                if len(entries) == 0:
+                    self.__markers.pop(marker, None)
+
+        for _, future, result, cleanup in done:
+            if cleanup is not None:
+                try:
+                    cleanup()
+                except OSError as e:
+                    log.warning('Error cleaning up marker job: %s', e)
+            # the caller may have
+            # cancelled the future
+            try:
+                future.set_result(result)
+            except futures.InvalidStateError:
+                pass
+
+        return len(done) > 0
+
+
+    def __watcher(self):
+        """Target of the watcher thread. Checks markers whenever a file
+        system event occurs or, failing that, with an adaptively increasing
+        polling interval.
+        """
+
+        interval = self.__mininterval
+
+        while not self.__closed:
+
+            if self.__check():
+                interval = self.__mininterval
+
+            if self.__closed:
+                break
+
+            if self.__wait(interval):
+                interval = self.__mininterval
+            else:
+                interval = min(interval * 2, self.__maxinterval)
+
+
+class _Inotify:
+    """Minimal ``ctypes`` interface to the Linux ``inotify`` API, used by the
+    :class:`JobTracker` to watch the directories containing marker files.
+    """
+
+    IN_ATTRIB      = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM  = 0x00000040
+    IN_MOVED_TO    = 0x00000080
+    IN_CREATE      = 0x00000100
+    IN_DELETE      = 0x00000200
+    IN_NONBLOCK    = 0o4000
+    IN_CLOEXEC     = 0o2000000
+
+    MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+            IN_MOVED_TO | IN_CREATE | IN_DELETE)
+
+
+    @classmethod
+    def create(cls):
+        """Create an ``_Inotify`` object, or return ``None`` if ``inotify``
+        is not available.
+        """
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            return cls()
+        except (OSError, AttributeError) as e:
+            log.debug('inotify not available: %s', e)
+            return None
+
+
+    def __init__(self):
+        """Create an ``inotify`` instance. """
+        self.__libc    = ctypes.CDLL(None, use_errno=True)
+        self.__watched = set()
+        self.fd        = self.__libc.inotify_init1(self.IN_NONBLOCK |
+                                                   self.IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+
+    def watch(self, dirname):
+        """Watch the given directory, if it is not already being watched. """
+        if dirname in self.__watched:
+            return
+        wd = self.__libc.inotify_add_watch(
+            self.fd, os.fsencode(dirname), self.MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            log.debug('Could not watch %s: %s', dirname, os.strerror(err))
+        else:
+            self.__watched.add(dirname)
+
+
+    def drain(self):
+        """Read and discard all pending events. """
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+
+    def close(self):
+        """Close the ``inotify`` instance. """
+        os.close(self.fd)
+
+
+def _flatten_job_ids(job_ids):
+    """Returns a potentially nested sequence of job ids as a single
+    comma-separated string. Used by :func:`hold` and :class:`JobTracker`.
+    """
+    def unpack(job_ids):
+        if isinstance(job_ids, str):
+            return {job_ids}
+        elif isinstance(job_ids, int):
+            return {str(job_ids)}
+        else:
+            res = set()
+            for job_id in job_ids:
+                res.update(unpack(job_id))
+            return res
+    return ','.join(sorted(unpack(job_ids)))
+
+
+class SubmitBackend:
+    """Base class for job submission backends. A backend is used by
+    :func:`run` (and therefore by :func:`submitfunc`, :func:`submitmap`,
+    :func:`hold` and the :class:`JobTracker`) to execute jobs which are
+    submitted via the ``submit`` option. The backend to use is set via the
+    :data:`SUBMIT_BACKEND` attribute.
+
+    Backends must accept the same arguments as the :func:`.fsl_sub` wrapper
+    function, at least including ``name``, ``logdir``, ``jobhold`` and
+    ``array_task``, and must save the standard output/error of each job to
+    ``<logdir>/<name>.o<job_id>`` and ``<logdir>/<name>.e<job_id>``, so that
+    they can be retrieved with :func:`job_output`.
+    """
+
+    def submit(self, *args, **kwargs):
+        """Submit a job.
+
+        :arg args:   Command to run
+        :arg kwargs: Submission options, as accepted by :func:`.fsl_sub`.
+        :returns:    The job ID, as a string.
+        """
+        raise NotImplementedError()
+
+
+class FslSubBackend(SubmitBackend):
+    """The default :class:`SubmitBackend`, which submits jobs via the
+    :func:`.fsl_sub` wrapper function.
+    """
+
+    def submit(self, *args, **kwargs):
+        """Submit a job via :func:`.fsl_sub`. """
+        # This will induce a nested call back to
+        # the run function, which is a bit confusing,
+        # but harmless, as the "submit" arg will not
+        # be passed.
+        from fsl.wrappers import fsl_sub  # pylint: disable=import-outside-toplevel  # noqa: E501
+        return fsl_sub(*args, **kwargs)[0].strip()
+
+
+class LocalBackend(SubmitBackend):
+    """A :class:`SubmitBackend` which executes jobs on the local machine, with
+    at most ``nprocs`` jobs running at any one time. This allows code which
+    submits jobs to be run unchanged on a single workstation::
+
+        run.SUBMIT_BACKEND = run.LocalBackend(nprocs=64)
+
+        jid1 = run.run('fslmaths in -s 2 out1', submit=True)
+        jid2 = run.run('fslmaths out1 -bin out2', submit={'jobhold' : jid1})
+        run.hold([jid2])
+
+    Job dependencies (the ``jobhold`` option) are honoured - a job is not
+    started until all of the jobs that it depends on have finished. Waiting
+    jobs do not occupy a slot. As with cluster schedulers, a job is started
+    after its dependencies have finished, regardless of whether they
+    succeeded. Array jobs (the ``array_task`` option) are supported - each
+    line of the task file is executed as a separate shell command.
+
+    Jobs are executed in the working directory that was current when they
+    were submitted. All other ``fsl_sub`` options (e.g. ``queue``, ``ram``)
+    are ignored.
+    """
+
+
+    def __init__(self, nprocs=None):
+        """Create a ``LocalBackend``.
+
+        :arg nprocs: Maximum number of jobs to run concurrently. Defaults to
+                     the number of CPU cores.
+        """
+        if nprocs is None:
+            nprocs = os.cpu_count() or 1
+
+        self.__executor = futures.ThreadPoolExecutor(
+            max_workers=nprocs, thread_name_prefix='LocalBackend')
+        self.__lock     = threading.Lock()
+        self.__jobs     = {}
+        self.__ids      = itertools.count(1)
+
+
+    def submit(self, *args, **kwargs):
+        """Submit a job for execution.
+
+        :arg args:   Command to run. Ignored if ``array_task`` is specified.
+        :arg kwargs: Submission options, as accepted by :func:`.fsl_sub`.
+        :returns:    The job ID, as a string.
+        """
+
+        name      = kwargs.pop('name',       None)
+        logdir    = kwargs.pop('logdir',     None)
+        jobhold   = kwargs.pop('jobhold',    None)
+        arraytask = kwargs.pop('array_task', None)
+        env       = kwargs.pop('env',        None)
+        kwargs.pop('log',    None)
+        kwargs.pop('silent', None)
+
+        if len(kwargs) > 0:
+            log.debug('LocalBackend ignoring submission options: %s',
+                      ', '.join(kwargs.keys()))
+
+        # Array job - each line of the
+        # task file is a shell command.
+        if arraytask is not None:
+            with open(arraytask, 'rt') as f:
+                cmds = [line.strip() for line in f if line.strip() != '']
+            shell = True
+            if name is None:
+                name = op.basename(arraytask)
+        else:
+            cmds  = [prepareArgs(args)]
+            shell = False
+            if name is None:
+                name = op.basename(cmds[0][0])
+
+        if logdir is None:
+            logdir = '.'
+
+        logdir = op.abspath(logdir)
+        cwd    = os.getcwd()
+        holds  = []
+
+        if jobhold:
+            with self.__lock:
+                for holdid in _flatten_job_ids(jobhold).split(','):
+                    if holdid not in self.__jobs:
+                        raise ValueError(f'Unknown job ID in jobhold: '
+                                         f'{holdid}')
+                    holds.append(self.__jobs[holdid])
+
+        with self.__lock:
+            jid              = str(next(self.__ids))
+            job              = futures.Future()
+            self.__jobs[jid] = job
+
+        # Called when all dependencies have
+        # finished - submit each task to the
+        # pool, and complete the job future
+        # when all tasks have finished
+        def start():
+            tasks = []
+            for i, cmd in enumerate(cmds, 1):
+                logpref = op.join(logdir, f'{name}.')
+                logsuff = jid if arraytask is None else f'{jid}.{i}'
+                tasks.append(self.__executor.submit(
+                    self.__runTask, cmd, shell, cwd, env,
+                    f'{logpref}o{logsuff}', f'{logpref}e{logsuff}'))
+            _whenAll(tasks, lambda : job.set_result(
+                [t.exception() or t.result() for t in tasks]))
+
+        log.debug('Submitting job %s (%s) to local backend [holds: %s]',
+                  jid, name, jobhold)
+
+        _whenAll(holds, start)
+        return jid
+
+
+    def wait(self, job_ids=None, timeout=None):
+        """Wait until the given jobs (or all jobs that have been submitted)
+        have finished.
+
+        :arg job_ids: Possibly nested sequence of job IDs
+        :arg timeout: Maximum number of seconds to wait
+        :returns:     ``True`` if all jobs have finished, ``False`` if the
+                      timeout elapsed.
+        """
+        with self.__lock:
+            if job_ids is None:
+                jobs = list(self.__jobs.values())
+            else:
+                jobs = [self.__jobs[j]
+                        for j in _flatten_job_ids(job_ids).split(',')]
+        _, notdone = futures.wait(jobs, timeout=timeout)
+        return len(notdone) == 0
+
+
+    def exitcodes(self, job_id):
+        """Returns a list containing the exit code of each task of the given
+        job, or ``None`` if the job has not finished. The exit code for a
+        task which could not be started will be the exception that was
+        raised.
+        """
+        with self.__lock:
+            job = self.__jobs[str(job_id)]
+        if not job.done():
+            return None
+        return job.result()
+
+
+    def shutdown(self, wait=True):
+        """Shut down the pool used to execute jobs. No more jobs may be
+        submitted after this method has been called.
+        """
+        self.__executor.shutdown(wait=wait)
+
+
+    @staticmethod
+    def __runTask(cmd, shell, cwd, env, stdout, stderr):
+        """Runs one job/task, saving its standard output/error to the
+        given files. Returns the exit code.
+        """
+        if env is not None:
+            env = dict(os.environ, **env)
+        with open(stdout, 'wb') as outf, \
+             open(stderr, 'wb') as errf:
+            proc = sp.run(cmd, shell=shell, cwd=cwd, env=env,
+                          stdout=outf, stderr=errf, check=False)
+        return proc.returncode
+
+
+def _whenAll(futs, callback):
+    """Used by :class:`LocalBackend`. Arranges for ``callback`` to be called
+    (with no arguments) once all of the given futures have completed.
+    """
+    futs = list(futs)
+
+    if len(futs) == 0:
+        callback()
+        return
+
+    lock      = threading.Lock()
+    remaining = [len(futs)]
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            last          = remaining[0] == 0
+        if last:
+            callback()
+
+    for fut in futs:
+        fut.add_done_callback(done)
+
+
+def _submitBackend():
+    """Returns the :class:`SubmitBackend` to use for submitting jobs - see
+    :data:`SUBMIT_BACKEND`.
+    """
+    if SUBMIT_BACKEND is None:
+        return FslSubBackend()
+    return SUBMIT_BACKEND
+
+
 def job_output(job_id, logdir='.', command=None, name=None):
     """Returns the output of the given cluster-submitted job.
 
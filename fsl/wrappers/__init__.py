@@ -100,6 +100,7 @@ from fsl.wrappers.wrapperutils       import (LOAD,
                                              cmdwrapper,
                                              fslwrapper,
                                              funcwrapper)
+from fsl.wrappers.taskgraph          import  TaskGraph
 from fsl.wrappers                    import (tbss,
                                              fsl_mrs_proc)
 from fsl.wrappers.avwutils           import (fslmerge,
@@ -6,12 +6,29 @@
 #
 """This module provides the :class:`fslmaths` class, which acts as a wrapper
 for the ``fslmaths`` command-line tool.
+
+Simple chains of voxelwise operations can also be evaluated in-process,
+without calling ``fslmaths`` - see the :meth:`fslmaths.run` method.
 """
 
 
+import                    os
+import                    logging
+import                    pathlib
+import concurrent.futures as futures
+
+import numpy   as np
+import nibabel as nib
+
+import fsl.data.image as fslimage
 from . import wrapperutils as wutils
 
 
+log = logging.getLogger(__name__)
+
+
+
+
 class fslmaths:
     """Perform mathematical manipulation of images.
 
@@ -36,10 +53,22 @@ class fslmaths:
         output = fslmaths(input).thr(0.25).mul(-1).run()
     """
 
+    CHUNK_SIZE = 2 ** 18
+    """Number of values processed at a time by each thread when a command
+    is evaluated in-process (see :func:`evaluate`).
+    """
+
+    NUM_THREADS = None
+    """Number of threads to use when a command is evaluated in-process. If
+    ``None``, the number of CPUs is used.
+    """
+
     def __init__(self, input, dt=None):
         """Constructor."""
         self.__input = input
+        self.__dt    = dt
         self.__args  = []
+        self.__ops   = []
 
         if dt is not None:
             self.__args.extend(('-dt',  dt))
@@ -49,6 +78,7 @@ class fslmaths:
         a list of arguments to add to the command invocation.
         """
         def wrapper(self, *args, **kwargs):
+            self.__ops.append((func.__name__, args, kwargs))
             args = func(self, *args, **kwargs)
             self.__args.extend(args)
             return self
@@ -475,15 +505,31 @@ class fslmaths:
         skip that filter."""
         return ["-bptf", hp_sigma, lp_sigma]
 
-    def run(self, output=None, odt=None, **kwargs):
+    def run(self, output=None, odt=None, inprocess=False, **kwargs):
         """Save output of operations to image. Set ``output`` to a filename to have
         the result saved to file, or omit ``output`` entirely to have the
         result returned as a ``nibabel`` image.
 
+        If ``inprocess=True``, and all of the operations are simple voxelwise
+        operations (see :func:`evaluate`), the command is evaluated with
+        ``numpy``, without calling ``fslmaths``. Otherwise, or if any other
+        arguments are given, ``fslmaths`` is called as normal.
+
         All other arguments are ultimately passed through to the
         :func:`fsl.utils.run.run` function.
         """
 
+        if inprocess and len(kwargs) == 0:
+            result = evaluate(self.__input, self.__ops, self.__dt, odt)
+
+            if result is not None:
+                if output is None or output is wutils.LOAD:
+                    return result
+                if isinstance(result, nib.Nifti1Image):
+                    result = fslimage.Image(result)
+                result.save(str(output))
+                return wutils.FileOrThing.Results('')
+
         cmd = ['fslmaths', self.__input] + self.__args
 
         if output is None:
@@ -494,6 +540,11 @@ class fslmaths:
         if odt is not None:
             cmd.extend(('-odt', odt))
 
+        # The __run helper is a wrapper function, so
+        # would be run asynchronously if an executor
+        # has been set via wrapperconfig. But we need
+        # its result to post-process it here.
+        kwargs['asynchronous'] = False
         result = self.__run(*cmd, **kwargs)
 
         # if output is LOADed, there
@@ -507,3 +558,312 @@ class fslmaths:
     def __run(self, *cmd):
         """Run the given ``fslmaths`` command. """
         return [str(c) for c in cmd]
+
+
+class Unsupported(Exception):
+    """Raised by the functions used by :func:`evaluate` when an ``fslmaths``
+    command cannot be reproduced exactly in-process, e.g. because the result
+    of an operation on the given data is not well defined.
+    """
+
+
+DATA_TYPES = {
+    'char'   : np.uint8,
+    'short'  : np.int16,
+    'int'    : np.int32,
+    'float'  : np.float32,
+    'double' : np.float64,
+}
+"""``fslmaths`` data type identifiers, and corresponding ``numpy`` types. """
+
+
+def _scalar(arg):
+    """Returns ``arg`` as a ``float`` if it is a number (or a string which
+    can be interpreted as a number, as ``fslmaths`` does), or ``None``
+    otherwise.
+    """
+    if isinstance(arg, (int, float, np.number)):
+        return float(arg)
+    if isinstance(arg, str):
+        try:               return float(arg)
+        except ValueError: return None
+    return None
+
+
+def _div(x, a):
+    """In-process implementation of ``fslmaths -div``. ``fslmaths`` sets
+    voxels to zero where an image divisor is zero.
+    """
+    if np.isscalar(a):
+        if a == 0:
+            raise Unsupported('division by zero')
+        np.divide(x, a, out=x)
+    else:
+        nonzero = a != 0
+        np.divide(x, a, out=x, where=nonzero)
+        np.copyto(x, 0, where=~nonzero)
+
+
+def _minmax(func):
+    """Creates an in-process implementation of ``fslmaths -max`` or
+    ``-min``. NaNs are not supported.
+    """
+    def op(x, a):
+        if np.isnan(x).any() or np.any(np.isnan(a)):
+            raise Unsupported('NaN values')
+        func(x, a, out=x)
+    return op
+
+
+def _domain(func, valid):
+    """Creates an in-process implementation of an ``fslmaths`` operation
+    which is not defined for all values. ``valid`` is a function which
+    returns ``True`` where the input is in the function domain.
+    """
+    def op(x):
+        if not np.all(valid(x) | np.isnan(x)):
+            raise Unsupported('values outside of function domain')
+        func(x, out=x)
+    return op
+
+
+def _assign(func):
+    """Creates an in-process implementation of an ``fslmaths`` operation
+    which replaces the data with the result of ``func``.
+    """
+    def op(x):
+        x[:] = func(x)
+    return op
+
+
+OPERATIONS = {
+    'add'   : (lambda x, a: np.add(     x, a, out=x),          'image'),
+    'sub'   : (lambda x, a: np.subtract(x, a, out=x),          'image'),
+    'mul'   : (lambda x, a: np.multiply(x, a, out=x),          'image'),
+    'div'   : (_div,                                           'image'),
+    'mas'   : (lambda x, a: np.copyto(x, 0, where=~(a > 0)),   'image'),
+    'max'   : (_minmax(np.maximum),                            'image'),
+    'min'   : (_minmax(np.minimum),                            'image'),
+    'thr'   : (lambda x, a: np.copyto(x, 0, where=x < a),      'scalar'),
+    'uthr'  : (lambda x, a: np.copyto(x, 0, where=x > a),      'scalar'),
+    'abs'   : (lambda x: np.abs(x, out=x),                     None),
+    'sqr'   : (lambda x: np.multiply(x, x, out=x),             None),
+    'sqrt'  : (_domain(np.sqrt,   lambda x: x >= 0),           None),
+    'log'   : (_domain(np.log,    lambda x: x >  0),           None),
+    'asin'  : (_domain(np.arcsin, lambda x: np.abs(x) <= 1),   None),
+    'acos'  : (_domain(np.arccos, lambda x: np.abs(x) <= 1),   None),
+    'exp'   : (lambda x: np.exp(   x, out=x),                  None),
+    'sin'   : (lambda x: np.sin(   x, out=x),                  None),
+    'cos'   : (lambda x: np.cos(   x, out=x),                  None),
+    'tan'   : (lambda x: np.tan(   x, out=x),                  None),
+    'atan'  : (lambda x: np.arctan(x, out=x),                  None),
+    'bin'   : (_assign(lambda x:   x > 0),                     None),
+    'binv'  : (_assign(lambda x: ~(x > 0)),                    None),
+    'nan'   : (lambda x: np.copyto(x, 0, where=np.isnan(x)),   None),
+    'nanm'  : (_assign(np.isnan),                              None),
+}
+"""In-process implementations of ``fslmaths`` operations, used by
+:func:`evaluate`. Each entry is a tuple containing:
+
+ - A function which is passed a chunk of the current image data (which it
+   must modify in-place), and the corresponding chunk of the operation
+   argument (a scalar or array), if the operation accepts an argument.
+ - The argument type - ``'image'`` for operations which accept a number or
+   an image, ``'scalar'`` for operations which only accept a number, or
+   ``None`` for operations which do not accept an argument.
+"""
+
+
+def _load(image):
+    """Used by :func:`evaluate`. Loads the given image (a file name,
+    ``nibabel`` image, or :class:`.Image`). Returns a tuple containing the
+    ``nibabel`` image, and its data.
+    """
+    if isinstance(image, fslimage.Image):
+        image = image.nibImage
+    elif isinstance(image, (str, pathlib.Path)):
+        try:
+            image = nib.load(fslimage.addExt(str(image)))
+        except Exception as e:
+            raise Unsupported('cannot load {}: {}'.format(image, e))
+    if not isinstance(image, nib.Nifti1Image):
+        raise Unsupported('unsupported image type: {}'.format(type(image)))
+    return image, np.asanyarray(image.dataobj)
+
+
+def evaluate(input, ops, dt=None, odt=None):
+    """Evaluates a ``fslmaths`` command in-process. Called by
+    :meth:`fslmaths.run`.
+
+    All of the operations (which must be listed in :data:`OPERATIONS`, or be
+    ``range``) are fused into a single pass over the data, which is processed
+    in chunks of :attr:`fslmaths.CHUNK_SIZE` values, in parallel, using
+    :attr:`fslmaths.NUM_THREADS` threads.
+
+    As with ``fslmaths``, calculations are performed in single precision,
+    unless the input image is double precision, or ``dt='double'``. The
+    output is single precision unless specified via ``odt``. Calculations
+    in an integer input type (``dt='input'``) are not supported.
+
+    :arg input: Input image - a file name, ``nibabel`` image, or
+                :class:`.Image`.
+    :arg ops:   Sequence of ``(name, args, kwargs)`` tuples, one for each
+                ``fslmaths`` method that was called.
+    :arg dt:    Internal data type (``fslmaths -dt``)
+    :arg odt:   Output data type (``fslmaths -odt``)
+    :returns:   The result, as a ``nibabel`` image (or as an :class:`.Image`
+                if any of the input images were ``Image`` objects), or
+                ``None`` if the command cannot be evaluated in-process,
+                in which case ``fslmaths`` should be called instead.
+    """
+    try:
+        return _evaluate(input, ops, dt, odt)
+    except Unsupported as e:
+        log.debug('Cannot evaluate fslmaths command in-process (%s) - '
+                  'falling back to fslmaths', e)
+        return None
+
+
+def _evaluate(input, ops, dt, odt):
+    """Does the work for :func:`evaluate`. Raises :exc:`Unsupported` if the
+    command cannot be evaluated in-process.
+    """
+
+    for name, args, kwargs in ops:
+        if name == 'range':
+            continue
+        if name not in OPERATIONS or len(kwargs) > 0:
+            raise Unsupported('operation {}'.format(name))
+        argtype = OPERATIONS[name][1]
+        if len(args) != (0 if argtype is None else 1):
+            raise Unsupported('operation {} arguments'.format(name))
+        if argtype == 'scalar' and _scalar(args[0]) is None:
+            raise Unsupported('operation {} image argument'.format(name))
+
+    returnImage        = isinstance(input, fslimage.Image)
+    inimg, indata      = _load(input)
+    indtype            = inimg.get_data_dtype()
+    shape              = indata.shape
+
+    # Internal data type. With dt=input, fslmaths
+    # calculates in the input type, which is only
+    # reproduced here for floating point inputs.
+    if dt == 'input' and not np.issubdtype(indtype, np.floating):
+        raise Unsupported('dt input with {} input'.format(indtype))
+
+    if   dt is None:                 calcdtype = indtype
+    elif dt == 'input':              calcdtype = indtype
+    elif dt in ('float', 'double'):  calcdtype = DATA_TYPES[dt]
+    else:                            raise Unsupported('dt {}'.format(dt))
+    if np.dtype(calcdtype) != np.float64:
+        calcdtype = np.float32
+
+    # Output data type
+    if   odt is None:        outdtype = np.float32
+    elif odt == 'input':     outdtype = indtype
+    elif odt in DATA_TYPES:  outdtype = DATA_TYPES[odt]
+    else:                    raise Unsupported('odt {}'.format(odt))
+    outdtype = np.dtype(outdtype)
+
+    # The image data is flattened to 2D
+    # (voxels, volumes), so that it can be
+    # split into chunks of voxels. 3D image
+    # arguments are broadcast across volumes.
+    if   len(shape) <= 3: nvols = 1
+    elif len(shape) == 4: nvols = shape[3]
+    else:                 raise Unsupported('{}D image'.format(len(shape)))
+    nvox   = int(np.prod(shape)) // nvols
+    indata = indata.reshape((nvox, nvols), order='F')
+
+    # Prepare arguments for each operation
+    funcs  = []
+    loaded = {}
+    setRange = False
+    for name, args, _ in ops:
+        if name == 'range':
+            setRange = True
+            continue
+
+        func = OPERATIONS[name][0]
+
+        if len(args) == 0:
+            funcs.append((func, None))
+            continue
+
+        arg   = args[0]
+        value = _scalar(arg)
+
+        if value is not None:
+            value = calcdtype(value)
+        else:
+            if id(arg) not in loaded:
+                returnImage = returnImage or isinstance(arg, fslimage.Image)
+                _, data     = _load(arg)
+                if   data.shape == shape:
+                    data = data.reshape((nvox, nvols), order='F')
+                elif data.shape == shape[:3] and len(shape) == 4:
+                    data = data.reshape((nvox, 1), order='F')
+                else:
+                    raise Unsupported('image {} shape'.format(arg))
+                loaded[id(arg)] = data
+            value = loaded[id(arg)]
+
+        funcs.append((func, value))
+
+    outdata   = np.empty((nvox, nvols), dtype=calcdtype, order='F')
+    chunksize = max(1, fslmaths.CHUNK_SIZE // nvols)
+    chunks    = [slice(i, min(i + chunksize, nvox))
+                 for i in range(0, nvox, chunksize)]
+
+    def process(chunk):
+        x = indata[chunk].astype(calcdtype)
+        for func, value in funcs:
+            if value is None:
+                func(x)
+            elif np.isscalar(value):
+                func(x, value)
+            else:
+                func(x, value[chunk])
+        outdata[chunk] = x
+
+    nthreads = fslmaths.NUM_THREADS
+    if nthreads is None:
+        nthreads = os.cpu_count() or 1
+    nthreads = min(nthreads, len(chunks))
+
+    with np.errstate(all='ignore'):
+        if nthreads <= 1:
+            for chunk in chunks:
+                process(chunk)
+        else:
+            with futures.ThreadPoolExecutor(nthreads) as pool:
+                for result in [pool.submit(process, c) for c in chunks]:
+                    result.result()
+
+    outdata = outdata.reshape(shape, order='F')
+
+    # Conversion to an integer output type is only
+    # supported when no rounding or clamping is
+    # needed, as we can't be sure of doing it in
+    # exactly the same way as fslmaths.
+    if np.issubdtype(outdtype, np.integer):
+        info = np.iinfo(outdtype)
+        if not np.all(np.isfinite(outdata))  or \
+           np.any(np.round(outdata) != outdata) or \
+           (outdata.size > 0 and (outdata.min() < info.min or
+                                  outdata.max() > info.max)):
+            raise Unsupported('conversion to {}'.format(outdtype))
+
+    outdata = outdata.astype(outdtype, copy=False)
+    header  = inimg.header.copy()
+    header.set_data_dtype(outdtype)
+    header.set_slope_inter(None, None)
+
+    if setRange and outdata.size > 0:
+        header['cal_min'] = np.nanmin(outdata)
+        header['cal_max'] = np.nanmax(outdata)
+
+    result = nib.Nifti1Image(outdata, inimg.affine, header)
+
+    if returnImage: return fslimage.Image(result)
+    else:           return result
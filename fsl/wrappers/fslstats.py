@@ -8,18 +8,27 @@
 for the ``fslstats`` command-line tool.
 
 
+Many common statistics can also be calculated in-process, without calling
+``fslstats`` - see the :meth:`fslstats.run` method.
+
 .. warning:: This wrapper function will only work with FSL 6.0.2 or newer.
 """
 
 
 import              io
+import              logging
+import              pathlib
 import functools as ft
 import numpy     as np
+import nibabel   as nib
 
 import fsl.data.image      as fslimage
 from . import wrapperutils as wutils
 
 
+log = logging.getLogger(__name__)
+
+
 class fslstats:
     """The ``fslstats`` class is a wrapper around the ``fslstats`` command-line
     tool. It provides an object-oriented interface - options are specified by
@@ -160,6 +169,9 @@ class fslstats:
 
         self.__input   = input
         self.__options = []
+        self.__sepvols = bool(t)
+        self.__lblmask = K
+        self.__stats   = []
 
         # pre-options must be supplied
         # before input image
@@ -199,15 +211,25 @@ class fslstats:
         the accumulated list of command-line options.
         """
         self.__options.extend(('-' + flag,) + args)
+        self.__stats.append((flag, args))
         return self
 
 
-    def run(self, raw=False, **kwargs):
+    def run(self, raw=False, inprocess=False, **kwargs):
         """Run the ``fslstats`` command-line tool. See :meth:`__init__` for a
         description of the return value.
 
-        :arg raw: Defaults to ``False``. If ``True``, the raw standard output
-                  and error is returned, instead of a scalar/numpy array.
+        If ``inprocess=True``, and all of the requested statistics are
+        supported by :func:`evaluate`, they are calculated in-process,
+        without calling ``fslstats``. Otherwise, or if ``raw=True``, or if
+        any other arguments are given, ``fslstats`` is called as normal.
+
+        :arg raw:       Defaults to ``False``. If ``True``, the raw standard
+                        output and error is returned, instead of a
+                        scalar/numpy array.
+
+        :arg inprocess: Defaults to ``False``. If ``True``, try to calculate
+                        the statistics in-process.
 
         :returns: Result of ``fslstats`` as a scalar or ``numpy`` array.
 
@@ -215,6 +237,26 @@ class fslstats:
         :func:`fsl.utils.run.run` function.
         """
 
+        sepvols = '-t' in self.__options
+        lblmask = '-K' in self.__options
+        result  = None
+
+        if inprocess and not raw and len(kwargs) == 0:
+            result = evaluate(self.__input,
+                              self.__stats,
+                              self.__sepvols,
+                              self.__lblmask)
+
+        if result is not None:
+            result = self.__shape(result.squeeze(), sepvols, lblmask)
+        else:
+            result = self.__runfslstats(raw, sepvols, lblmask, **kwargs)
+        return result
+
+
+    def __runfslstats(self, raw, sepvols, lblmask, **kwargs):
+        """Used by :meth:`run`. Calls ``fslstats``, and parses its output. """
+
         # The parsing logic below will not work
         # with versions of fslstats prior to fsl
         # 6.0.2, due to a quirk in the output
@@ -234,6 +276,10 @@ class fslstats:
         # passed to the wrapperconfig.
         if not wutils.wrapperconfig.active:
             kwargs['log'] = kwargs.pop('log', {'tee' : False})
+        # The __run helper is a wrapper function,
+        # but we need its result synchronously -
+        # see fslmaths.run.
+        kwargs['asynchronous'] = False
         result = self.__run('fslstats', *self.__options, **kwargs)
 
         if raw:
@@ -270,10 +316,16 @@ class fslstats:
                 result[i] = ' '.join(['nan'] * nvals)
 
         # Convert to numpy array
-        result  = '\n'.join(result).strip()
-        result  = np.genfromtxt(io.StringIO(result))
-        sepvols = '-t' in self.__options
-        lblmask = '-K' in self.__options
+        result = '\n'.join(result).strip()
+        result = np.genfromtxt(io.StringIO(result))
+
+        return self.__shape(result, sepvols, lblmask)
+
+
+    def __shape(self, result, sepvols, lblmask):
+        """Used by :meth:`run`. Reshapes the result according to the ``t``
+        and ``K`` pre-options.
+        """
 
         # One line of output for each volume and
         # for each label (with volume the slowest
@@ -306,3 +358,394 @@ class fslstats:
     def __run(self, *cmd):
         """Run the given ``fslstats`` command. """
         return [str(c) for c in cmd]
+
+
+class Unsupported(Exception):
+    """Raised by the functions used by :func:`evaluate` when a ``fslstats``
+    command cannot be reproduced in-process.
+    """
+
+
+def _load(image, dtype=np.float32):
+    """Used by :func:`evaluate`. Loads the given image (a file name,
+    ``nibabel`` image, or :class:`.Image`). Returns a tuple containing the
+    image data as a 4D array of type ``dtype``, and the voxel volume.
+    """
+    if isinstance(image, fslimage.Image):
+        image = image.nibImage
+    elif isinstance(image, (str, pathlib.Path)):
+        try:
+            image = nib.load(fslimage.addExt(str(image)))
+        except Exception as e:
+            raise Unsupported('cannot load {}: {}'.format(image, e))
+    if not isinstance(image, nib.Nifti1Image):
+        raise Unsupported('unsupported image type: {}'.format(type(image)))
+
+    data   = np.asanyarray(image.dataobj).astype(dtype, copy=False)
+    voxvol = float(np.prod(image.header.get_zooms()[:3]))
+
+    if data.ndim > 4:
+        raise Unsupported('{}D images are not supported'.format(data.ndim))
+
+    data = data.reshape(data.shape + (1,) * (4 - data.ndim))
+    return data, voxvol
+
+
+class _Groups:
+    """Used by :func:`evaluate`. Divides a set of selected voxel values into
+    groups (one for each volume and/or label), and calculates statistics on
+    each group. Per-group counts and sums are calculated with
+    ``numpy.bincount``, and the values are sorted once, by group and value,
+    for order statistics (minimum, maximum, percentiles).
+    """
+
+
+    def __init__(self, data, select, groups, missing):
+        """Create a ``_Groups`` object.
+
+        :arg data:    ``(nvoxels, nvols)`` array of values
+        :arg select:  Boolean array, broadcastable to ``data``, identifying
+                      the values to include
+        :arg groups:  Integer array, broadcastable to ``data``, containing
+                      the group index for each value
+        :arg missing: Boolean array containing one value for each group,
+                      ``True`` for groups which correspond to labels which
+                      are not present in the index mask. The results for
+                      these groups are undefined.
+        """
+
+        ngroups = len(missing)
+
+        select      = np.broadcast_to(select, data.shape)
+        self.values = data[select]
+        self.groups = np.broadcast_to(groups, data.shape)[select]
+        self.counts = np.bincount(self.groups, minlength=ngroups)
+
+        if not np.all(np.isfinite(self.values)):
+            raise Unsupported('data contains non-finite values')
+
+        self.__ngroups = ngroups
+        self.__missing = missing
+        self.__sorted  = None
+        self.__offsets = None
+
+
+    def nonempty(self):
+        """Raises an :exc:`Unsupported` error if any group is empty - the
+        behaviour of ``fslstats`` is not well defined in this case.
+        """
+        if np.any((self.counts == 0) & ~self.__missing):
+            raise Unsupported('empty mask')
+
+
+    def mean(self):
+        """Returns the mean of each group. """
+        self.nonempty()
+        sums = np.bincount(self.groups, self.values, self.__ngroups)
+        return sums / np.maximum(self.counts, 1)
+
+
+    def std(self):
+        """Returns the (sample) standard deviation of each group. """
+        if np.any((self.counts < 2) & ~self.__missing):
+            raise Unsupported('mask too small for stddev')
+        mean  = self.mean()
+        resid = self.values - mean[self.groups]
+        ssq   = np.bincount(self.groups, resid * resid, self.__ngroups)
+        return np.sqrt(ssq / np.maximum(self.counts - 1, 1))
+
+
+    def sorted(self):
+        """Returns the values sorted by group and by value, and the offset
+        of the first value of each group.
+        """
+        if self.__sorted is None:
+
+            # A stable sort on small integers
+            # is a linear-time radix sort, so
+            # we group the values first, and
+            # then sort each group separately.
+            groups = self.groups
+            if self.__ngroups <= np.iinfo(np.uint16).max:
+                groups = groups.astype(np.uint16)
+
+            order   = np.argsort(groups, kind='stable')
+            values  = self.values[order]
+            offsets = np.concatenate(([0], np.cumsum(self.counts)))
+
+            for start, end in zip(offsets[:-1], offsets[1:]):
+                values[start:end].sort()
+
+            self.__sorted  = values
+            self.__offsets = offsets
+        return self.__sorted, self.__offsets
+
+
+    def __index(self, idx):
+        """Returns the sorted values at the given per-group indices
+        (relative to the start of each group). Values for empty groups
+        are undefined.
+        """
+        values, offsets = self.sorted()
+        idx = np.clip(offsets[:-1] + idx, 0, len(values) - 1)
+        return values[idx]
+
+
+    def minmax(self):
+        """Returns the minimum and maximum of each group. """
+        self.nonempty()
+        return self.__index(0), self.__index(self.counts - 1)
+
+
+    def percentile(self, p):
+        """Returns the ``p`` th percentile of each group. As with
+        ``fslstats``, this is the value at index ``floor(n * p / 100)`` of
+        the sorted values.
+        """
+        self.nonempty()
+        if not (0 <= p <= 100):
+            raise Unsupported('invalid percentile: {}'.format(p))
+        p   = np.float32(p / 100)
+        idx = (self.counts.astype(np.float32) * p).astype(np.int64)
+        idx = np.minimum(idx, self.counts - 1)
+        return self.__index(idx)
+
+
+    def robustRange(self):
+        """Returns the robust (approximately 2nd and 98th percentile) range
+        of each group, calculated with :func:`_robustRange`.
+        """
+        self.nonempty()
+        values, offsets = self.sorted()
+        lo = np.zeros(self.__ngroups)
+        hi = np.zeros(self.__ngroups)
+        for i in np.where(~self.__missing)[0]:
+            lo[i], hi[i] = _robustRange(values[offsets[i]:offsets[i + 1]])
+        return lo, hi
+
+
+def _robustRange(values, nbins=1000, maxpasses=10):
+    """Used by :class:`_Groups`. Calculates the robust range of the given
+    sorted values, using the same iterative histogram-based procedure as
+    ``fslstats -r``.
+    """
+
+    def histogram(lo, hi):
+        binno = (nbins / (hi - lo)) * values - (lo * nbins) / (hi - lo)
+        binno = np.clip(binno.astype(np.int64), 0, nbins - 1)
+        return np.bincount(binno, minlength=nbins)
+
+    vmin, vmax      = float(values[0]), float(values[-1])
+    lo,   hi        = vmin, vmax
+    lowest, highest = 0, nbins - 1
+    bottom, top     = 0, 0
+    thresh2         = thresh98 = 0
+    passno          = 1
+
+    if vmin == vmax:
+        raise Unsupported('robust range of constant data')
+
+    while passno == 1 or (thresh98 - thresh2) < (hi - lo) / 10:
+
+        # narrow the histogram range to
+        # around the 2-98% range found
+        # on the previous pass
+        if passno > 1:
+            bottom = max(bottom - 1, 0)
+            top    = min(top    + 1, nbins - 1)
+            lo, hi = (lo + (bottom  / nbins) * (hi - lo),
+                      lo + ((top + 1) / nbins) * (hi - lo))
+
+        # give up and use the full range
+        if passno == maxpasses or lo == hi:
+            lo, hi = vmin, vmax
+
+        hist  = histogram(lo, hi)
+        valid = len(values)
+
+        if passno == maxpasses:
+            valid   -= hist[lowest] + hist[highest]
+            lowest  += 1
+            highest -= 1
+
+        if valid < 0:
+            thresh2 = thresh98 = lo
+            break
+
+        width = (hi - lo) / nbins
+        limit = valid // 50
+
+        if limit == 0:
+            bottom = lowest  - 1
+            top    = highest + 1
+        else:
+            counts = np.cumsum(hist[lowest:])
+            bottom = lowest  + np.searchsorted(counts, limit)
+            counts = np.cumsum(hist[highest::-1])
+            top    = highest - np.searchsorted(counts, limit)
+
+        thresh2  = lo + bottom  * width
+        thresh98 = lo + (top + 1) * width
+
+        if passno == maxpasses:
+            break
+        passno += 1
+
+    return thresh2, thresh98
+
+
+def evaluate(input, stats, sepvols=False, lblmask=None):
+    """Calculates the result of a ``fslstats`` command in-process. Called
+    by :meth:`fslstats.run`.
+
+    The following options are supported: ``-l``, ``-u``, ``-k``, ``-a``,
+    ``-n``, ``-m``, ``-M``, ``-s``, ``-S``, ``-R``, ``-r``, ``-p``, ``-P``,
+    ``-v`` and ``-V``. Options are applied in order, as with ``fslstats``.
+    All of the statistics requested after each change to the mask or data
+    are calculated from a single selection of the data - results for every
+    volume (``-t``) and label (``-K``) are calculated together, in a
+    vectorised manner.
+
+    The result will be equivalent to the output of ``fslstats``, but will
+    not be rounded to the precision of its text output.
+
+    :arg input:   Input image - a file name, ``nibabel`` image, or
+                  :class:`.Image`.
+    :arg stats:   Sequence of ``(flag, args)`` tuples, one for each
+                  ``fslstats`` option.
+    :arg sepvols: ``fslstats -t`` pre-option
+    :arg lblmask: ``fslstats -K`` pre-option
+    :returns:     A 2D ``numpy`` array containing one row for each volume
+                  and/or label (volume the slowest changing), or ``None``
+                  if the command cannot be evaluated in-process, in which
+                  case ``fslstats`` should be called instead.
+    """
+    try:
+        return _evaluate(input, stats, sepvols, lblmask)
+    except Unsupported as e:
+        log.debug('Cannot evaluate fslstats command in-process (%s) - '
+                  'falling back to fslstats', e)
+        return None
+
+
+def _evaluate(input, stats, sepvols, lblmask):
+    """Does the work for :func:`evaluate`. Raises an :exc:`Unsupported`
+    error if the command cannot be evaluated in-process.
+    """
+
+    nargs = {'l' : 1, 'u' : 1, 'k' : 1, 'p' : 1, 'P' : 1}
+    flags = set('anmMsSRrvV')
+
+    if len(stats) == 0:
+        raise Unsupported('no options')
+
+    for flag, args in stats:
+        if not (flag in flags and len(args) == 0 or
+                flag in nargs and len(args) == nargs[flag]):
+            raise Unsupported('unsupported option: -{}'.format(flag))
+
+    data, voxvol = _load(input)
+    shape        = data.shape[:3]
+    nvols        = data.shape[3]
+    data         = data.reshape((-1, nvols), order='F')
+
+    if not sepvols and nvols > 1 and \
+       any(flag in 'vV' for flag, _ in stats):
+        raise Unsupported('-v/-V on 4D images')
+
+    # Label for every voxel - without
+    # -K, every voxel has label 1.
+    if lblmask is not None:
+        labels, _ = _load(lblmask, np.float64)
+        if labels.shape[:3] != shape or labels.shape[3] != 1:
+            raise Unsupported('index mask shape mismatch')
+        labels = labels.reshape((-1, 1), order='F')
+        if not np.all(labels == np.round(labels)):
+            raise Unsupported('non-integer index mask')
+        labels  = labels.astype(np.int64)
+        nlbls   = max(int(labels.max()), 0)
+        missing = np.bincount(labels[labels > 0], minlength=nlbls + 1)[1:]
+        missing = missing == 0
+    else:
+        labels  = np.ones((1, 1), dtype=np.int64)
+        nlbls   = 1
+        missing = np.zeros(1, dtype=bool)
+
+    if nlbls == 0:
+        raise Unsupported('empty index mask')
+
+    # Group index for every value -
+    # one group for each label and
+    # (with -t) each volume.
+    groups = labels - 1
+    if sepvols:
+        groups  = groups + np.arange(nvols).reshape(1, -1) * nlbls
+        missing = np.tile(missing, nvols)
+
+    mask    = None
+    lthr    = None
+    uthr    = None
+    select  = None
+    cache   = {}
+    results = []
+
+    for flag, args in stats:
+
+        # Changes to the data or the mask
+        # invalidate the current selection
+        if flag in 'anluk':
+            cache = {}
+
+        if flag == 'a':
+            data = np.abs(data)
+        elif flag == 'n':
+            data = np.where(np.isfinite(data), data, 0)
+
+        elif flag in 'luk':
+            if   flag == 'l': lthr = float(args[0])
+            elif flag == 'u': uthr = float(args[0])
+            else:
+                mask, _ = _load(args[0])
+                mask    = mask.reshape((-1, mask.shape[3]), order='F')
+                if mask.shape[0] != data.shape[0] or \
+                   mask.shape[1] not in (1, nvols):
+                    raise Unsupported('mask shape mismatch')
+                if not np.all((mask == 0) | (mask == 1)):
+                    raise Unsupported('non-binary mask')
+                mask = mask > 0
+
+            # As with fslstats, the mask
+            # is calculated when it is set
+            select = np.ones((1, 1), dtype=bool)
+            if mask is not None: select = select & mask
+            if lthr is not None: select = select & (data > lthr)
+            if uthr is not None: select = select & (data < uthr)
+            select = select & (labels > 0)
+
+        else:
+            nonzero = flag in 'MSPV'
+            grps    = cache.get(nonzero)
+
+            if grps is None:
+                sel = select
+                if sel is None: sel = labels > 0
+                if nonzero:     sel = sel & (data != 0)
+                grps           = _Groups(data, sel, groups, missing)
+                cache[nonzero] = grps
+
+            if   flag in 'mM': results.append(grps.mean())
+            elif flag in 'sS': results.append(grps.std())
+            elif flag == 'R':  results.extend(grps.minmax())
+            elif flag == 'r':  results.extend(grps.robustRange())
+            elif flag in 'pP':
+                results.append(grps.percentile(float(args[0])))
+            elif flag in 'vV':
+                results.append(grps.counts)
+                results.append(grps.counts * voxvol)
+
+    if len(results) == 0:
+        raise Unsupported('no statistics')
+
+    results          = np.stack(results, axis=1).astype(np.float64)
+    results[missing] = np.nan
+    return results
@@ -0,0 +1,559 @@
+#!/usr/bin/env python
+#
+# taskgraph.py - Run a graph of dependent wrapper function calls.
+#
+# Author: Paul McCarthy <pauldmccarthy@gmail.com>
+#
+"""This module provides the :class:`TaskGraph` class, which can be used to
+run a pipeline of :mod:`fsl.wrappers` function calls, with dependencies
+between the calls inferred from their input and output file arguments.
+
+For example::
+
+    from fsl.wrappers import TaskGraph, bet, fast, flirt
+
+    graph = TaskGraph()
+    for subj in subjects:
+        graph.add(bet,   f'{subj}/T1', f'{subj}/T1_brain')
+        graph.add(fast,  f'{subj}/T1_brain', out=f'{subj}/fast')
+        graph.add(flirt, f'{subj}/T1_brain', 'MNI152_T1_2mm_brain',
+                  omat=f'{subj}/T1_to_MNI.mat')
+
+    # Run on the local machine, using
+    # up to eight concurrent tasks
+    graph.run(nworkers=8)
+
+    # Or submit everything to the
+    # cluster, with job dependencies
+    # between the tasks
+    graph.run(submit=True)
+
+    print(graph.report())
+
+
+Arguments which are named ``out``, ``output``, ``omat``, or which start or
+end with ``out`` (e.g. ``iout``, ``fout``, ``outbase``), are assumed to be
+output files - all other file path arguments are assumed to be inputs. Inputs
+and outputs may also be specified explicitly when a task is added. Image file
+paths are matched irrespective of their file extension, and output arguments
+may be file prefixes (e.g. the ``fast`` ``out`` argument) - any input which
+begins with the prefix is considered to depend upon the task. A task depends
+on every previously added task which produces one of its inputs.
+
+
+Tasks whose outputs are up to date are skipped. By default, a task is
+considered to be up to date if all of its outputs exist, and are newer than
+all of its inputs. Alternately, the content of input files can be checked, by
+passing ``check='hash'`` - a hash of each task's inputs and arguments is then
+stored in a state file. Hashes are only recorded for tasks which are run on
+the local machine, so ``check='hash'`` cannot be used with ``submit``.
+"""
+
+
+import os.path            as op
+import                       os
+import                       re
+import                       glob
+import                       json
+import                       time
+import                       hashlib
+import                       logging
+import                       pathlib
+import                       collections
+import concurrent.futures as futures
+
+import fsl.utils.path            as fslpath
+import fsl.data.image            as fslimage
+import fsl.wrappers.wrapperutils as wutils
+
+
+log = logging.getLogger(__name__)
+
+
+OUTPUT_ARGS = re.compile(r'^(o|omat|out.*|.*out)$')
+"""Regular expression which is used to identify output arguments by name. """
+
+
+class Task:
+    """A ``Task`` represents a single function call within a
+    :class:`TaskGraph`. ``Task`` objects are created by :meth:`TaskGraph.add`,
+    and have the following attributes:
+
+    ============ ==========================================================
+    ``name``     Task name
+    ``func``     The function to call
+    ``args``     Positional arguments to pass to the function
+    ``kwargs``   Keyword arguments to pass to the function
+    ``inputs``   Set of input files (with image file extensions removed)
+    ``outputs``  Set of output files (with image file extensions removed)
+    ``prefixes`` Set of output file prefixes
+    ``deps``     List of ``Task`` objects which this task depends on
+    ``status``   One of ``'pending'``, ``'skipped'``, ``'done'``,
+                 ``'failed'``, ``'cancelled'``, or ``'submitted'``.
+    ``result``   Value returned by the function, or the error that it raised
+    ``jobid``    Job ID, if the task was submitted
+    ``start``    Time that the task started
+    ``end``      Time that the task finished
+    ============ ==========================================================
+    """
+
+    def __init__(self, name, func, args, kwargs, inputs, outputs, prefixes):
+        """Create a ``Task``. """
+        self.name     = name
+        self.func     = func
+        self.args     = args
+        self.kwargs   = kwargs
+        self.inputs   = inputs
+        self.outputs  = outputs
+        self.prefixes = prefixes
+        self.deps     = []
+        self.status   = 'pending'
+        self.result   = None
+        self.jobid    = None
+        self.start    = None
+        self.end      = None
+
+
+    def __repr__(self):
+        """Return a string representation of this ``Task``. """
+        return f'Task({self.name}, {self.status})'
+
+
+    @property
+    def duration(self):
+        """Returns the time taken to execute this task, in seconds, or ``0``
+        if it has not been executed.
+        """
+        if self.start is None or self.end is None:
+            return 0
+        return self.end - self.start
+
+
+    @property
+    def signature(self):
+        """Returns a string which identifies this task by its function and
+        arguments.
+        """
+        func   = getattr(self.func, '__qualname__', repr(self.func))
+        kwargs = sorted(self.kwargs.items())
+        return f'{func}({self.args!r}, {kwargs!r})'
+
+
+class TaskGraph:
+    """A ``TaskGraph`` runs a collection of dependent function calls. See
+    the module documentation for details.
+    """
+
+
+    def __init__(self, check='mtime', statefile='.taskgraph.json'):
+        """Create a ``TaskGraph``.
+
+        :arg check:     How to determine whether a task is up to date -
+                        ``'mtime'`` (the default), ``'hash'``, or ``None``
+                        to always run all tasks. ``'hash'`` can only be used
+                        when tasks are run locally.
+        :arg statefile: File used to store input hashes when
+                        ``check='hash'``.
+        """
+
+        if check not in ('mtime', 'hash', None):
+            raise ValueError(f'Invalid check: {check}')
+
+        self.__check     = check
+        self.__statefile = op.abspath(statefile)
+        self.__tasks     = []
+
+
+    @property
+    def tasks(self):
+        """Returns a list containing all :class:`Task` objects, in the order
+        that they were added.
+        """
+        return list(self.__tasks)
+
+
+    def add(self, func, *args, inputs=None, outputs=None, name=None,
+            **kwargs):
+        """Add a task to the graph. The task will depend on all previously
+        added tasks which produce any of its inputs.
+
+        :arg func:    Function to call - typically a :mod:`fsl.wrappers`
+                      function.
+        :arg args:    Positional arguments to pass to ``func``
+        :arg inputs:  Sequence of additional input files
+        :arg outputs: Sequence of additional output files
+        :arg name:    Task name - defaults to the function name, with a
+                      numeric suffix.
+        :arg kwargs:  Keyword arguments to pass to ``func``
+        :returns:     The new :class:`Task`.
+        """
+
+        if name is None:
+            name = f'{func.__name__}_{len(self.__tasks)}'
+
+        ins, outs, prefixes = _fileArgs(func, args, kwargs)
+        ins .update(_fileKey(f) for f in (inputs  or []))
+        outs.update(_fileKey(f) for f in (outputs or []))
+
+        task = Task(name, func, args, kwargs, ins, outs, prefixes)
+
+        for other in self.__tasks:
+            if _produces(other, task.inputs):
+                task.deps.append(other)
+
+        self.__tasks.append(task)
+        return task
+
+
+    def run(self, nworkers=None, submit=None, cache=True):
+        """Run all tasks in the graph.
+
+        :arg nworkers: Maximum number of tasks to run concurrently on the local
+                       machine. Defaults to the number of CPU cores.
+
+        :arg submit:   If provided, tasks are submitted via ``submit`` (passed
+                       through to each wrapper function - see
+                       :func:`.run.run`), with ``jobhold`` dependencies between
+                       them. Tasks must be :mod:`fsl.wrappers` functions.
+
+        :arg cache:    If ``False``, all tasks are run, regardless of whether
+                       they are up to date.
+
+        :returns:      If ``submit`` is provided, a ``dict`` of ``{task name
+                       : job ID}`` mappings, for tasks which were submitted.
+                       Otherwise ``None``.
+
+        :raises:       ``RuntimeError`` if any task failed - tasks which do not
+                       depend on the failed task are still run.
+                       ``ValueError`` if ``submit`` is provided, and
+                       ``check='hash'``.
+        """
+
+        # Input hashes are recorded when a task
+        # finishes, which we don't know about
+        # for submitted tasks.
+        if submit not in (None, False) and self.__check == 'hash':
+            raise ValueError("check='hash' cannot be used with submit - "
+                             'input hashes are only recorded for tasks '
+                             'which are run locally')
+
+        for task in self.__tasks:
+            task.status = 'pending'
+            task.result = None
+            task.jobid  = None
+            task.start  = None
+            task.end    = None
+
+        if submit not in (None, False): return self.__submit(submit, cache)
+        else:                           self.__runLocal(nworkers, cache)
+
+
+    def criticalPath(self):
+        """Returns the critical path through the graph, i.e. the sequence of
+        dependent tasks with the longest total execution time, from the most
+        recent call to :meth:`run`.
+
+        :returns: A tuple containing a list of :class:`Task` objects, and the
+                  total duration of those tasks in seconds.
+        """
+
+        # tasks are always added after
+        # their dependencies, so are
+        # in topological order
+        total = {}
+        prev  = {}
+        for task in self.__tasks:
+            best = None
+            for dep in task.deps:
+                if best is None or total[dep.name] > total[best.name]:
+                    best = dep
+            prev[ task.name] = best
+            total[task.name] = task.duration
+            if best is not None:
+                total[task.name] += total[best.name]
+
+        if len(total) == 0:
+            return [], 0
+
+        task = max(self.__tasks, key=lambda t: total[t.name])
+        dur  = total[task.name]
+        path = []
+        while task is not None:
+            path.insert(0, task)
+            task = prev[task.name]
+
+        return path, dur
+
+
+    def report(self):
+        """Returns a string containing the status and timing of each task
+        from the most recent call to :meth:`run`, and the critical path.
+        """
+
+        lines = []
+        width = max([len(t.name) for t in self.__tasks] + [4])
+
+        for task in self.__tasks:
+            line = f'{task.name:{width}s}  {task.status:9s}  ' \
+                   f'{task.duration:8.2f}s'
+            if task.jobid is not None:
+                line += f'  [job {task.jobid}]'
+            lines.append(line)
+
+        path, dur = self.criticalPath()
+        if len(path) > 0:
+            names = ' -> '.join(t.name for t in path)
+            lines.append(f'Critical path ({dur:0.2f}s): {names}')
+
+        return '\n'.join(lines)
+
+
+    def __mustRun(self, task, cache):
+        """Returns ``True`` if the given task needs to be run, ``False`` if
+        its outputs are up to date.
+        """
+
+        if not cache or self.__check is None:
+            return True
+
+        # A dependency has been (or will
+        # be) re-run, so this task must be
+        if any(d.status != 'skipped' for d in task.deps):
+            return True
+
+        # Tasks with no outputs are always run
+        outputs = _files(task.outputs, task.prefixes)
+        if len(outputs) == 0:
+            return True
+
+        # All outputs must exist
+        for out in task.outputs - task.prefixes:
+            if len(_files([out])) == 0:
+                return True
+        for prefix in task.prefixes:
+            if len(_files([], [prefix])) == 0:
+                return True
+
+        inputs = _files(task.inputs)
+
+        if self.__check == 'mtime':
+            if len(inputs) == 0:
+                return False
+            newest = max(op.getmtime(f) for f in inputs)
+            oldest = min(op.getmtime(f) for f in outputs)
+            return newest > oldest
+
+        # check == 'hash'
+        state = self.__loadState()
+        return state.get(task.signature) != _hashFiles(inputs)
+
+
+    def __taskDone(self, task):
+        """Called when a task has successfully finished. If
+        ``check='hash'``, the hashes of the task inputs are saved.
+        """
+        if self.__check != 'hash':
+            return
+        state = self.__loadState()
+        state[task.signature] = _hashFiles(_files(task.inputs))
+        with open(self.__statefile, 'wt') as f:
+            json.dump(state, f)
+
+
+    def __loadState(self):
+        """Loads and returns the input hash state from the state file. """
+        if not op.exists(self.__statefile):
+            return {}
+        try:
+            with open(self.__statefile, 'rt') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning('Could not load task graph state from %s: %s',
+                        self.__statefile, e)
+            return {}
+
+
+    def __runLocal(self, nworkers, cache):
+        """Used by :meth:`run`. Runs all tasks on the local machine. """
+
+        if nworkers is None:
+            nworkers = os.cpu_count() or 1
+
+        pending = collections.deque(self.__tasks)
+        running = {}
+        failed  = []
+
+        def execute(task):
+            task.start = time.time()
+            try:
+                return task.func(*task.args, **task.kwargs)
+            finally:
+                task.end = time.time()
+
+        with futures.ThreadPoolExecutor(nworkers) as pool:
+            while len(pending) > 0 or len(running) > 0:
+
+                # start all tasks whose
+                # dependencies have finished
+                for task in list(pending):
+                    if any(d.status in ('failed', 'cancelled')
+                           for d in task.deps):
+                        task.status = 'cancelled'
+                        pending.remove(task)
+                    elif all(d.status in ('done', 'skipped')
+                             for d in task.deps):
+                        pending.remove(task)
+                        if self.__mustRun(task, cache):
+                            log.debug('Running task %s', task.name)
+                            running[pool.submit(execute, task)] = task
+                        else:
+                            log.debug('Skipping task %s (up to date)',
+                                      task.name)
+                            task.status = 'skipped'
+
+                if len(running) == 0:
+                    continue
+
+                done, _ = futures.wait(running,
+                                       return_when=futures.FIRST_COMPLETED)
+                for fut in done:
+                    task = running.pop(fut)
+                    try:
+                        task.result = fut.result()
+                        task.status = 'done'
+                        self.__taskDone(task)
+                    except Exception as e:
+                        log.warning('Task %s failed: %s', task.name, e)
+                        task.result = e
+                        task.status = 'failed'
+                        failed.append(task)
+
+        if len(failed) > 0:
+            names = ', '.join(t.name for t in failed)
+            raise RuntimeError(f'Tasks failed: {names}') from failed[0].result
+
+
+    def __submit(self, submit, cache):
+        """Used by :meth:`run`. Submits all tasks that need to be run, with
+        job dependencies between them.
+        """
+
+        if submit is True:
+            submit = {}
+
+        jobids = {}
+
+        for task in self.__tasks:
+            if not self.__mustRun(task, cache):
+                task.status = 'skipped'
+                continue
+
+            holds = [d.jobid for d in task.deps if d.jobid is not None]
+            opts  = dict(submit)
+            if len(holds) > 0:
+                opts['jobhold'] = ','.join(holds)
+
+            # an empty dict would be
+            # interpreted as submit=False
+            task.jobid        = task.func(*task.args,
+                                          submit=opts or True,
+                                          **task.kwargs)
+            task.status       = 'submitted'
+            jobids[task.name] = task.jobid
+
+        return jobids
+
+
+def _fileKey(path):
+    """Returns a key used to identify the given file - its absolute path, with
+    any image file extension removed.
+    """
+    return op.abspath(fslimage.removeExt(os.fspath(path)))
+
+
+def _fileArgs(func, args, kwargs):
+    """Identifies input and output file arguments in the given function call.
+
+    :returns: A tuple containing:
+               - A set of input file keys
+               - A set of output file keys
+               - A set of output file prefixes
+    """
+
+    inputs   = set()
+    outputs  = set()
+    prefixes = set()
+
+    def paths(val):
+        if isinstance(val, (str, pathlib.PurePath)):
+            return [val]
+        if isinstance(val, (list, tuple)):
+            return [v for v in val if isinstance(v, (str, pathlib.PurePath))]
+        return []
+
+    names = wutils.namedPositionals(func, args)
+
+    for name, val in list(zip(names, args)) + list(kwargs.items()):
+        for path in paths(val):
+            key = _fileKey(path)
+
+            # Non-file string arguments are also
+            # treated as inputs - they're harmless,
+            # as they won't match any outputs.
+            if not OUTPUT_ARGS.match(str(name)):
+                inputs.add(key)
+            elif _hasExt(path):
+                outputs.add(key)
+            else:
+                # output without a file extension - may
+                # be a single image (e.g. bet output),
+                # or a prefix (e.g. fast output)
+                outputs .add(key)
+                prefixes.add(key)
+
+    return inputs, outputs, prefixes
+
+
+def _hasExt(path):
+    """Returns ``True`` if the given path has a file extension. """
+    return op.splitext(os.fspath(path))[1] != ''
+
+
+def _produces(task, inputs):
+    """Returns ``True`` if ``task`` produces any of the given input files. """
+    for key in inputs:
+        if key in task.outputs:
+            return True
+        if any(key.startswith(p) for p in task.prefixes):
+            return True
+    return False
+
+
+def _files(keys, prefixes=None):
+    """Returns a list of all existing files which correspond to the given file
+    keys and prefixes.
+    """
+    files = []
+    for key in keys:
+        if op.isfile(key):
+            files.append(key)
+        else:
+            files.extend(f for f in glob.glob(glob.escape(key) + '.*')
+                         if fslpath.hasExt(f, fslimage.ALLOWED_EXTENSIONS))
+    for prefix in prefixes or []:
+        files.extend(f for f in glob.glob(glob.escape(prefix) + '*')
+                     if op.isfile(f))
+    return sorted(set(files))
+
+
+def _hashFiles(files):
+    """Returns a ``dict`` of ``{file : hash}`` mappings for the given files.
+    """
+    hashes = {}
+    for fname in files:
+        h = hashlib.sha256()
+        with open(fname, 'rb') as f:
+            for chunk in iter(lambda : f.read(1048576), b''):
+                h.update(chunk)
+        hashes[fname] = h.hexdigest()
+    return hashes
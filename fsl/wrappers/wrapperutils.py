@@ -84,19 +84,51 @@ and returned::
     src     = nib.load('src.nii')
     ref     = nib.load('ref.nii')
     aligned = flirt(src, ref, out=LOAD)['out']
+
+
+The outputs of wrapper function calls can be cached with a
+:class:`ResultCache`, so that repeated calls with identical inputs do not
+re-run the underlying command. Caching is enabled via the ``cache`` option,
+either for a single call, or for a block of code via :class:`wrapperconfig`::
+
+    cache = ResultCache('~/.fslpy_cache', maxsize=10 * 1024 ** 3)
+    with wrapperconfig(cache=cache):
+        bet('T1', 'T1_brain', mask=True)
+
+
+Wrapper functions can be executed asynchronously by passing
+``asynchronous=True``, or by passing a ``concurrent.futures.Executor`` via
+the ``executor`` option (either directly, or via :class:`wrapperconfig`). In
+this case a ``Future`` is returned, which can be used to retrieve the result
+of the call::
+
+    with concurrent.futures.ThreadPoolExecutor(8) as pool:
+        with wrapperconfig(executor=pool):
+            brains = [bet(t1, LOAD, mask=True) for t1 in t1s]
+        brains = [b.result()['output'] for b in brains]
+
+Each asynchronous call is given its own temporary directory for in-memory
+inputs and ``LOAD`` outputs, and the number of commands which run
+concurrently is limited by the number of executor workers (see
+:func:`defaultExecutor`).
 """
 
 
-import functools       as ft
-import itertools       as it
-import os.path         as op
-import multiprocessing as mp
-import collections.abc as abc
+import functools          as ft
+import itertools          as it
+import os.path            as op
+import multiprocessing    as mp
+import collections.abc    as abc
+import concurrent.futures as futures
 import                    os
 import                    re
 import                    sys
 import                    glob
+import                    shutil
+import                    pickle
 import                    random
+import                    hashlib
+import                    collections
 import                    string
 import                    pathlib
 import                    fnmatch
@@ -104,6 +136,7 @@ import                    inspect
 import                    logging
 import                    tempfile
 import                    threading
+import                    asyncio
 import                    warnings
 
 import nibabel as nib
@@ -161,6 +194,172 @@ def _thread_id():
     return f'{p.ident}_{t.ident}'
 
 
+_asyncState = threading.local()
+"""Thread-local state used by :func:`_asynchronous`. The ``options``
+attribute of this object contains the run options that were active when
+an asynchronous call was submitted, and is ``None`` otherwise. The ``loop``
+attribute contains the ``asyncio`` event loop from which the call was
+made, if it was made with ``asynchronous='asyncio'``. The ``depth``
+attribute counts the number of nested synchronous wrapper calls which are
+currently running in this thread.
+"""
+
+
+_executor     = None
+_executorLock = threading.Lock()
+
+
+def defaultExecutor():
+    """Returns the ``concurrent.futures.ThreadPoolExecutor`` which is used to
+    run wrapper functions that are called with ``asynchronous=True``, when no
+    ``executor`` has been specified. It is created on first use, with one
+    worker for each CPU core.
+    """
+    global _executor  # pylint: disable=global-statement
+    with _executorLock:
+        if _executor is None:
+            _executor = futures.ThreadPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                thread_name_prefix='fsl.wrappers')
+    return _executor
+
+
+def _runOptions():
+    """Returns the default run options for the current thread - see
+    :func:`genxwrapper`. Within an asynchronous call, these are the options
+    that were active when the call was submitted, as :class:`wrapperconfig`
+    may have since been exited by the submitting thread.
+    """
+    opts = getattr(_asyncState, 'options', None)
+    if opts is None:
+        opts = genxwrapper.run_options
+    return opts
+
+
+def _asynchronous(func):
+    """Decorator used by :func:`genxwrapper` and the ``fileOr*`` decorators,
+    which allows wrapper functions to be executed asynchronously.
+
+    The ``asynchronous`` and ``executor`` arguments are intercepted and, if
+    ``asynchronous=True``, or if an ``executor`` is given (and
+    ``asynchronous`` is not ``False``), ``func`` is submitted to the executor
+    (or the :func:`defaultExecutor`), and a ``Future`` is returned.
+
+    If ``asynchronous='asyncio'``, the call must be made from within a
+    running ``asyncio`` event loop, and an ``asyncio`` future is returned,
+    which can be awaited. Commands are then executed with :func:`.run.arun`
+    or :func:`.run.arunfsl` on that event loop (see :func:`genxwrapper`).
+
+    Only the outermost decorator in a chain decides whether the call is
+    asynchronous - the function is then executed synchronously, either in
+    the calling thread or within the executor thread, and inner decorator
+    layers (or nested wrapper calls) will not submit it again.
+    """
+
+    def wrapper(*args, **kwargs):
+        opts         = _runOptions()
+        asynchronous = kwargs.pop('asynchronous', opts['asynchronous'])
+        executor     = kwargs.pop('executor',     opts['executor'])
+
+        if asynchronous is None:
+            asynchronous = executor is not None
+
+        # Run synchronously if requested, or if we
+        # are inside another (synchronous or async)
+        # wrapper call - inner decorator layers
+        # must never re-submit the call.
+        depth = getattr(_asyncState, 'depth', 0)
+        if not asynchronous or depth > 0 or \
+           getattr(_asyncState, 'options', None):
+            _asyncState.depth = depth + 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _asyncState.depth = depth
+
+        if asynchronous == 'asyncio': loop = asyncio.get_running_loop()
+        else:                         loop = None
+
+        if executor is None:
+            executor = defaultExecutor()
+
+        options = dict(opts)
+
+        def task():
+            _asyncState.options = options
+            _asyncState.loop    = loop
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _asyncState.options = None
+                _asyncState.loop    = None
+
+        future = executor.submit(task)
+
+        if loop is None: return future
+        else:            return asyncio.wrap_future(future, loop=loop)
+
+    return _update_wrapper(wrapper, func)
+
+
+def _awaitRunner(runner, loop):
+    """Used by :func:`genxwrapper`. Returns a function which may be used in
+    place of ``runner`` (:func:`.run.run` or :func:`.run.runfsl`), and which
+    executes commands via the coroutine equivalent of ``runner`` on the given
+    ``asyncio`` event loop, blocking until the command has completed.
+    Returns ``runner`` unchanged if it does not have a coroutine equivalent.
+    """
+
+    coro = {run.run    : run.arun,
+            run.runfsl : run.arunfsl}.get(runner)
+
+    if coro is None:
+        return runner
+
+    @ft.wraps(runner)
+    def wrapper(*args, **kwargs):
+        future = asyncio.run_coroutine_threadsafe(coro(*args, **kwargs), loop)
+        return future.result()
+
+    return wrapper
+
+
+class _LocalList:
+    """A list-like object whose contents are local to each thread. Used by
+    the :func:`fileOrImage` and :func:`fileOrNiftiMRS` decorators to keep
+    track of the input types for concurrent calls.
+    """
+
+    def __init__(self):
+        self.__local = threading.local()
+
+    @property
+    def _items(self):
+        items = getattr(self.__local, 'items', None)
+        if items is None:
+            items = []
+            self.__local.items = items
+        return items
+
+    def append(self, item):
+        self._items.append(item)
+
+    def __setitem__(self, idx, val):
+        self._items[idx] = val
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __repr__(self):
+        return repr(self._items)
+
+
 def genxwrapper(func, runner, funccmd=False):
     """This function is used by :func:`cmdwrapper` and :func:`fslwrapper`.
     It is not intended to be used in any other circumstances.
@@ -187,6 +386,17 @@ def genxwrapper(func, runner, funccmd=False):
       - ``log``:      Passed to ``runner``. Defaults to ``{'tee':True}``.
       - ``cmdonly``:  Passed to ``runner``. Defaults to ``False``.
       - ``silent``:   Passed to ``runner``. Defaults to ``False``.
+      - ``cache``:    A :class:`ResultCache` to use for the call. Defaults to
+                      ``None`` (no caching).
+      - ``asynchronous``: Execute the call asynchronously, and return a
+                      ``Future``. Defaults to ``None`` (only execute
+                      asynchronously if an ``executor`` is given). If
+                      ``'asyncio'``, an awaitable ``asyncio`` future is
+                      returned, and the command is run via
+                      :func:`.run.arun` / :func:`.run.arunfsl` on the
+                      caller's event loop.
+      - ``executor``: A ``concurrent.futures.Executor`` to use for
+                      asynchronous calls. Defaults to ``None``.
 
     The default values for these arguments are stored in the
     ``genxwrapper.run_options`` dictionary. This dictionary should not be
@@ -200,13 +410,14 @@ def genxwrapper(func, runner, funccmd=False):
     """
 
     def wrapper(*args, **kwargs):
-        opts     = genxwrapper.run_options
+        opts     = _runOptions()
         stdout   = kwargs.pop('stdout',   opts['stdout'])
         stderr   = kwargs.pop('stderr',   opts['stderr'])
         exitcode = kwargs.pop('exitcode', opts['exitcode'])
         submit   = kwargs.pop('submit',   opts['submit'])
         cmdonly  = kwargs.pop('cmdonly',  opts['cmdonly'])
         silent   = kwargs.pop('silent',   opts['silent'])
+        cache    = kwargs.pop('cache',    opts['cache'])
 
         # If silent=True, we need to explicitly set
         # log, as the run function will otherwise
@@ -233,25 +444,112 @@ def genxwrapper(func, runner, funccmd=False):
             with asrt.disabled(cmdonly or (submit not in (None, False))):
                 cmd = func(*args, **kwargs)
 
-        return runner(cmd,
-                      stderr=stderr,
-                      log=logg,
-                      submit=submit,
-                      cmdonly=cmdonly,
-                      stdout=stdout,
-                      exitcode=exitcode)
+        # Commands which are submitted, not
+        # executed, or which are executing a
+        # temporary python script, can't be
+        # cached.
+        # Commands which were submitted via
+        # asynchronous='asyncio' are run
+        # on the caller's event loop.
+        loop = getattr(_asyncState, 'loop', None)
+        if loop is not None: cmdrunner = _awaitRunner(runner, loop)
+        else:                cmdrunner = runner
+
+        # Only calls to functions which declare
+        # their outputs (via FileOrThing
+        # decorators) can be cached.
+        if cache is not None              and \
+           not (funccmd or cmdonly)       and \
+           submit in (None, False)        and \
+           not run.DRY_RUN:
+            outputs = _declaredOutputs(func, args, kwargs)
+        else:
+            outputs = None
 
-    return _update_wrapper(wrapper, func)
+        if outputs is not None:
+            runfunc = ft.partial(cache.call, cmdrunner, outputs=outputs)
+        else:
+            runfunc = cmdrunner
+
+        return runfunc(cmd,
+                       stderr=stderr,
+                       log=logg,
+                       submit=submit,
+                       cmdonly=cmdonly,
+                       stdout=stdout,
+                       exitcode=exitcode)
+
+    return _asynchronous(_update_wrapper(wrapper, func))
+
+
+def _declaredOutputs(func, args, kwargs):
+    """Used by :func:`genxwrapper`. Identifies the file paths which were
+    passed to ``func`` for arguments that are handled by a
+    :class:`FileOrThing` decorator (see :meth:`FileOrThing.__init__`). These
+    are the only files that a :class:`ResultCache` will consider to be
+    outputs of the call.
+
+    :arg func:   The wrapper function being called.
+    :arg args:   Positional arguments passed to ``func``.
+    :arg kwargs: Keyword arguments passed to ``func``.
+    :returns:    A dict of ``{key : (path, prefix)}`` mappings, where ``key``
+                 is the argument name (or a tuple containing the argument
+                 name and index, for sequences), ``path`` is the absolute
+                 file path, and ``prefix`` is ``True`` if the argument is an
+                 output prefix. ``None`` is returned if ``func`` does not
+                 have any ``FileOrThing`` decorators.
+    """
+
+    declared = getattr(_unwrap(func), '_fot_declared', None)
+    if declared is None:
+        return None
+
+    argnames = namedPositionals(func, args)
+    allargs  = dict(zip(argnames, args))
+    allargs.update(kwargs)
+    outputs  = {}
+    suffix   = namedPositionals.varargsSuffix
+
+    for things, outprefix in declared:
+        for name, val in allargs.items():
+
+            prefix = name == outprefix
+
+            # Same rules as FileOrThing.__prepareArgs
+            if not any((prefix,
+                        len(things) == 0,
+                        name in things,
+                        name.endswith(suffix))):
+                continue
+
+            if isinstance(val, (list, tuple)):
+                vals = [((name, i), v) for i, v in enumerate(val)]
+            else:
+                vals = [(name, val)]
+
+            for key, path in vals:
+                if isinstance(path, pathlib.Path):
+                    path = str(path)
+                if not isinstance(path, str) or path == '':
+                    continue
+
+                isprefix     = prefix or outputs.get(key, (None, False))[1]
+                outputs[key] = (op.abspath(path), isprefix)
+
+    return outputs
 
 
 genxwrapper.run_options = {
-    'stdout'   : True,
-    'stderr'   : True,
-    'exitcode' : False,
-    'submit'   : None,
-    'log'      : {'tee' : True},
-    'cmdonly'  : False,
-    'silent'   : False
+    'stdout'       : True,
+    'stderr'       : True,
+    'exitcode'     : False,
+    'submit'       : None,
+    'log'          : {'tee' : True},
+    'cmdonly'      : False,
+    'silent'       : False,
+    'cache'        : None,
+    'asynchronous' : None,
+    'executor'     : None
 }
 
 
@@ -347,6 +645,582 @@ class wrapperconfig:
         wrapperconfig.active    = self.__active
 
 
+class ResultCache:
+    """A content-addressed cache of the outputs of wrapper function calls.
+    A ``ResultCache`` can be passed to any wrapper function via the ``cache``
+    option (see :func:`genxwrapper`), or enabled for a block of code via the
+    :class:`wrapperconfig` context manager::
+
+        cache = ResultCache('~/.fslpy_cache', maxsize=10 * 1024 ** 3)
+
+        with wrapperconfig(cache=cache):
+            bet('T1', 'T1_brain', mask=True)
+
+        # T1_brain and T1_brain_mask are restored
+        # from the cache - bet is not executed
+        with wrapperconfig(cache=cache):
+            bet('T1', 'T1_brain', mask=True)
+
+
+    **Cache keys**
+
+
+    Every call is identified by a hash of its command-line arguments, where
+    arguments which refer to existing files (or images, with or without a
+    file extension) are replaced with a hash of the file contents, and other
+    file paths are replaced with their base name. Output files (see below)
+    are always replaced with their base name, so that a call is not affected
+    by the outputs of a previous call already being present. The values of the
+    environment variables listed in :attr:`ENVIRONMENT`, the installed FSL
+    version, and the ``stdout``/``stderr``/``exitcode`` options are also
+    included in the key.
+
+
+    **Outputs**
+
+
+    The outputs of a command are derived from the arguments which are
+    handled by the :class:`FileOrThing` decorators (e.g. :func:`fileOrImage`
+    and :func:`fileOrArray`) of the wrapper function. Files which are created
+    or modified by the command are considered to be outputs if they have the
+    name of one of these arguments (with any image file extension), or if
+    their names begin with the value of the ``outprefix`` argument (e.g. the
+    ``out`` argument to :func:`.fast`). For example, the outputs of
+    ``bet('T1', 'T1_brain', mask=True)`` will be ``T1_brain.nii.gz`` and
+    ``T1_brain_mask.nii.gz``. No other files are considered.
+
+
+    Calls to wrapper functions which do not have any ``FileOrThing``
+    decorators, and commands which create or modify directories, are not
+    cached.
+
+
+    Output files are stored by their content hash, so identical outputs are
+    only stored once. On a cache hit, the outputs are copied (or, if
+    ``link=True``, hard-linked) into their expected locations, and the
+    command's return value (e.g. its standard output) is returned, but is
+    not forwarded to the standard output/error of this process.
+
+
+    .. warning:: If ``link=True``, restored output files share their contents
+                 with the cache, so must not be modified in-place.
+
+
+    **Size limit**
+
+
+    If a ``maxsize`` is given, the least recently used entries are evicted
+    whenever the total size of all stored outputs exceeds it.
+
+
+    **Statistics**
+
+
+    Hit, miss, store and eviction counts are available via the :meth:`stats`
+    method.
+    """
+
+
+    ENVIRONMENT = ['FSLDIR', 'FSLDEVDIR', 'FSLOUTPUTTYPE']
+    """Environment variables which are included in the cache key for every
+    command.
+    """
+
+
+    def __init__(self, cachedir, maxsize=None, link=False):
+        """Create a ``ResultCache``.
+
+        :arg cachedir: Directory in which to store cached outputs. Created if
+                       it does not exist.
+        :arg maxsize:  Maximum total size, in bytes, of all cached outputs.
+        :arg link:     Restore outputs with hard links instead of copies,
+                       where possible.
+        """
+        cachedir = op.abspath(op.expanduser(cachedir))
+
+        self.__cachedir = cachedir
+        self.__objdir   = op.join(cachedir, 'objects')
+        self.__entdir   = op.join(cachedir, 'entries')
+        self.__outdir   = op.join(cachedir, 'outputs')
+        self.__maxsize  = maxsize
+        self.__link     = link
+        self.__lock     = threading.Lock()
+        self.__hashes   = {}
+        self.__stats    = {'hits'      : 0,
+                           'misses'    : 0,
+                           'stores'    : 0,
+                           'evictions' : 0}
+
+        os.makedirs(self.__objdir, exist_ok=True)
+        os.makedirs(self.__entdir, exist_ok=True)
+        os.makedirs(self.__outdir, exist_ok=True)
+
+
+    @property
+    def cachedir(self):
+        """Returns the cache directory. """
+        return self.__cachedir
+
+
+    def stats(self):
+        """Returns a dict containing the number of cache ``hits``,
+        ``misses``, ``stores`` and ``evictions``, and the total ``size`` of
+        all stored outputs in bytes.
+        """
+        with self.__lock:
+            stats = dict(self.__stats)
+        stats['size'] = sum(self.__objects().values())
+        return stats
+
+
+    def resetStats(self):
+        """Resets all counters returned by :meth:`stats` to zero. """
+        with self.__lock:
+            for k in self.__stats:
+                self.__stats[k] = 0
+
+
+    def clear(self):
+        """Removes all entries and outputs from the cache. """
+        shutil.rmtree(self.__objdir, ignore_errors=True)
+        shutil.rmtree(self.__entdir, ignore_errors=True)
+        shutil.rmtree(self.__outdir, ignore_errors=True)
+        os.makedirs(self.__objdir, exist_ok=True)
+        os.makedirs(self.__entdir, exist_ok=True)
+        os.makedirs(self.__outdir, exist_ok=True)
+
+
+    def call(self, runner, cmd, outputs, **kwargs):
+        """Runs ``cmd`` with ``runner``, or restores its outputs from the
+        cache. Called by :func:`genxwrapper`.
+
+        :arg runner:  Function to run the command (:func:`.run.run` or
+                      :func:`.run.runfsl`).
+        :arg cmd:     Command to run, as a string or sequence.
+        :arg outputs: Dict of ``{key : (path, prefix)}`` mappings describing
+                      the declared outputs of the command, as returned by
+                      :func:`_declaredOutputs`.
+        :arg kwargs:  Passed to ``runner``.
+        :returns:     The value returned by ``runner``.
+        """
+
+        # Output arguments are keyed by name rather
+        # than by content, as they will exist when
+        # the command is called again. We don't know
+        # which arguments are outputs until the
+        # command has been run, so they are recorded
+        # against a key which does not depend on the
+        # contents of any file.
+        cmd     = [str(c) for c in run.prepareArgs((cmd,))]
+        paths   = self.__paths(cmd, outputs)
+        base    = self.__key(runner, cmd, paths, kwargs)
+        outkeys = self.__outputKeys(base)
+        key     = self.__key(runner, cmd, paths, kwargs, outkeys)
+
+        result = self.__restore(key, outputs)
+        if result is not None:
+            log.debug('Restored outputs of %s from cache (%s)',
+                      ' '.join(cmd), key)
+            with self.__lock:
+                self.__stats['hits'] += 1
+            return result[0]
+
+        with self.__lock:
+            self.__stats['misses'] += 1
+
+        before = self.__snapshot(outputs)
+        result = runner(cmd, **kwargs)
+        after  = self.__snapshot(outputs)
+
+        # don't cache failed commands
+        if kwargs.get('exitcode', False) and \
+           isinstance(result, tuple)     and \
+           result[-1] != 0:
+            return result
+
+        files = self.__changes(paths, outputs, before, after)
+        if files is not None:
+            outkeys = set(okey for okey, _, _ in files)
+            key     = self.__key(runner, cmd, paths, kwargs, outkeys)
+            self.__store(base, key, outkeys, files, result)
+        return result
+
+
+    def __paths(self, cmd, outputs):
+        """Used by :meth:`call`. Identifies command-line arguments which
+        may refer to file paths, so that the contents of any input files can
+        be included in the cache key. Returns a dict of ``{index : (path,
+        files, okey)}`` mappings, where ``path`` is the absolute path,
+        ``files`` is a list of existing files that the argument refers to,
+        and ``okey`` is the key of the corresponding entry in ``outputs``
+        (see :func:`_declaredOutputs`), or ``None``.
+        """
+
+        paths = {}
+        okeys = {path : okey for okey, (path, _) in outputs.items()}
+
+        for i, arg in enumerate(cmd[1:], 1):
+
+            # --arg=value
+            if arg.startswith('-'):
+                if '=' not in arg:
+                    continue
+                arg = arg.split('=', 1)[1]
+
+            if arg == '':
+                continue
+
+            path = op.abspath(arg)
+            if not op.isdir(op.dirname(path)):
+                continue
+
+            if op.isfile(path):
+                try:
+                    files = fslpath.getFileGroup(path,
+                                                 fslimage.ALLOWED_EXTENSIONS,
+                                                 fslimage.FILE_GROUPS)
+                except fslpath.PathError:
+                    files = [path]
+            else:
+                files = [path + ext for ext in fslimage.ALLOWED_EXTENSIONS]
+                files = [f for f in files if op.isfile(f)]
+
+            paths[i] = (path, files, okeys.get(path, None))
+
+        return paths
+
+
+    def __key(self, runner, cmd, paths, kwargs, outkeys=None):
+        """Used by :meth:`call`. Generates a key for the given command.
+
+        :arg outkeys: Keys of output arguments (see :func:`_declaredOutputs`),
+                      which are identified by their name rather than by the
+                      contents of the files that they refer to. If ``None``,
+                      all file arguments are identified by name.
+        """
+
+        args = [cmd[0]]
+        for i, arg in enumerate(cmd[1:], 1):
+            if i not in paths:
+                args.append(arg)
+                continue
+
+            path, files, okey = paths[i]
+
+            if arg.startswith('-'): flag = arg.split('=', 1)[0] + '='
+            else:                   flag = ''
+
+            if outkeys is None or okey in outkeys:
+                files = []
+
+            if len(files) > 0:
+                hashes = [op.splitext(f)[1] + ':' + self.__hash(f)
+                          for f in files]
+                args.append(flag + 'file:' + ','.join(hashes))
+            else:
+                args.append(flag + 'path:' + op.basename(path))
+
+        env = {k : os.environ.get(k) for k in ResultCache.ENVIRONMENT}
+        env['FSL_PREFIX'] = run.FSL_PREFIX
+        env['fslversion'] = None
+
+        fsldir = os.environ.get('FSLDIR', None)
+        if fsldir is not None:
+            try:
+                with open(op.join(fsldir, 'etc', 'fslversion'), 'rt') as f:
+                    env['fslversion'] = f.read().strip()
+            except OSError:
+                pass
+
+        opts = {k : kwargs.get(k) for k in ('stdout', 'stderr', 'exitcode')}
+        key  = repr((getattr(runner, '__name__', str(runner)),
+                     args,
+                     sorted(env .items()),
+                     sorted(opts.items())))
+
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+    def __hash(self, path):
+        """Returns a hash of the contents of the given file. Hashes are
+        cached in memory, keyed by the file's inode, size and modification
+        time. Hashes of files which have been modified very recently are not
+        cached, as a subsequent modification may not change the modification
+        time (depending on the file system timestamp resolution).
+        """
+        st  = os.stat(path)
+        key = (path, st.st_ino, st.st_size, st.st_mtime_ns)
+
+        with self.__lock:
+            digest = self.__hashes.get(key, None)
+        if digest is not None:
+            return digest
+
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1048576), b''):
+                h.update(block)
+        digest = h.hexdigest()
+
+        if fslpath.isSettled(st.st_mtime_ns):
+            with self.__lock:
+                if len(self.__hashes) > 4096:
+                    self.__hashes.clear()
+                self.__hashes[key] = digest
+        return digest
+
+
+    def __snapshot(self, outputs):
+        """Used by :meth:`call`. Returns a dict containing ``{(key, name) :
+        (isdir, inode, size, mtime)}`` for every existing file which may be
+        one of the given ``outputs`` - files with the name of an output
+        argument (with any image file extension), and files whose names
+        begin with an output prefix.
+        """
+        snapshot = {}
+        for key, (path, prefix) in outputs.items():
+            dirname, basename = op.split(path)
+
+            if prefix:
+                try:
+                    with os.scandir(dirname) as entries:
+                        names = [e.name for e in entries
+                                 if e.name.startswith(basename)]
+                except OSError:
+                    names = []
+            else:
+                base  = fslimage.removeExt(basename)
+                names = [basename] + [base + ext for ext in
+                                      fslimage.ALLOWED_EXTENSIONS]
+
+            for name in names:
+                fname = op.join(dirname, name)
+                try:
+                    st = os.stat(fname)
+                except OSError:
+                    continue
+                snapshot[key, name] = (op.isdir(fname),
+                                       st.st_ino,
+                                       st.st_size,
+                                       st.st_mtime_ns)
+        return snapshot
+
+
+    def __entry(self, key):
+        """Returns the path to the entry file for the given key. """
+        return op.join(self.__entdir, key)
+
+
+    def __object(self, digest):
+        """Returns the path to the object file for the given digest. """
+        return op.join(self.__objdir, digest[:2], digest)
+
+
+    def __objects(self):
+        """Returns a dict of ``{digest : size}`` for all stored outputs. """
+        objects = {}
+        for dirpath, _, filenames in os.walk(self.__objdir):
+            for f in filenames:
+                try:
+                    objects[f] = op.getsize(op.join(dirpath, f))
+                except OSError:
+                    pass
+        return objects
+
+
+    def __restore(self, key, outputs):
+        """Used by :meth:`call`. If the given key is in the cache, restores
+        its outputs and returns a tuple containing the cached command return
+        value. Otherwise returns ``None``.
+        """
+
+        entry = self.__entry(key)
+
+        try:
+            with open(entry, 'rb') as f:
+                stored, result = pickle.load(f)
+
+            for okey, name, digest in stored:
+                src = self.__object(digest)
+                dst = op.join(op.dirname(outputs[okey][0]), name)
+
+                if op.lexists(dst):
+                    os.remove(dst)
+
+                if self.__link:
+                    try:
+                        os.link(src, dst)
+                        continue
+                    except OSError:
+                        pass
+                shutil.copyfile(src, dst)
+
+            # LRU - entries are ordered
+            # by modification time
+            os.utime(entry)
+
+        # Entry or outputs have been evicted
+        # (possibly by another process), or
+        # are corrupt - treat as a miss
+        except Exception as e:
+            if op.exists(entry):
+                log.debug('Could not restore cache entry %s: %s', key, e)
+            return None
+
+        return (result,)
+
+
+    def __outputKeys(self, base):
+        """Used by :meth:`call`. Returns the keys of the output arguments
+        which were recorded by :meth:`__store` for a command, where ``base``
+        is the key generated by :meth:`__key` with ``outkeys=None``. Returns
+        an empty set if the command has not been stored.
+        """
+        try:
+            with open(op.join(self.__outdir, base), 'rb') as f:
+                return pickle.load(f)
+        except Exception:
+            return set()
+
+
+    def __changes(self, paths, outputs, before, after):
+        """Used by :meth:`call`. Identifies the files which were created or
+        modified by a command. Returns a list of ``(okey, name, path)``
+        tuples, or ``None`` if the command should not be cached.
+        """
+
+        files = []
+
+        for (okey, name), stat in after.items():
+
+            if before.get((okey, name)) == stat:
+                continue
+
+            path = op.join(op.dirname(outputs[okey][0]), name)
+
+            if stat[0]:
+                log.debug('Command created directory %s - not caching', path)
+                return None
+
+            files.append((okey, name, path))
+
+        # A file which is passed more than once, and
+        # is modified, has probably been modified in
+        # place (e.g. fslmaths img -add 1 img) - we
+        # can't key it by name, as it is also an input
+        outkeys = set(okey for okey, _, _ in files)
+        counts  = collections.Counter(p[0] for p in paths.values())
+        for path, _, okey in paths.values():
+            if okey in outkeys and counts[path] > 1:
+                log.debug('Command modified %s in place - not caching', path)
+                return None
+
+        return files
+
+
+    def __store(self, base, key, outkeys, files, result):
+        """Used by :meth:`call`. Stores the files which were created or
+        modified by a command (as returned by :meth:`__changes`), along with
+        the command return value and the keys of its output arguments, in the
+        cache.
+        """
+
+        try:
+            stored = []
+            for okey, name, path in files:
+                digest = self.__hash(path)
+                obj    = self.__object(digest)
+
+                if not op.exists(obj):
+                    os.makedirs(op.dirname(obj), exist_ok=True)
+                    tmp = tempdir.mkstemp(dir=op.dirname(obj))
+                    shutil.copyfile(path, tmp)
+                    os.replace(tmp, obj)
+
+                stored.append((okey, name, digest))
+
+            tmp = tempdir.mkstemp(dir=self.__entdir)
+            with open(tmp, 'wb') as f:
+                pickle.dump((stored, result), f)
+            os.replace(tmp, self.__entry(key))
+
+            tmp = tempdir.mkstemp(dir=self.__outdir)
+            with open(tmp, 'wb') as f:
+                pickle.dump(outkeys, f)
+            os.replace(tmp, op.join(self.__outdir, base))
+
+        except Exception as e:
+            log.warning('Could not store command outputs in cache: %s', e)
+            return
+
+        with self.__lock:
+            self.__stats['stores'] += 1
+
+        if self.__maxsize is not None:
+            self.__evict(key)
+
+
+    def __evict(self, keep):
+        """Used by :meth:`__store`. Evicts the least recently used entries
+        until the total size of all stored outputs is less than ``maxsize``.
+        The entry with key ``keep`` is not evicted.
+        """
+
+        objects = self.__objects()
+        if sum(objects.values()) <= self.__maxsize:
+            return
+
+        entries = []
+        for key in os.listdir(self.__entdir):
+            try:
+                path = self.__entry(key)
+                with open(path, 'rb') as f:
+                    outputs = pickle.load(f)[0]
+                entries.append((op.getmtime(path), key, outputs))
+            except Exception:
+                continue
+
+        entries = sorted(entries, key=lambda e: e[0])
+        refs    = {}
+        for _, _, outputs in entries:
+            for _, _, digest in outputs:
+                refs[digest] = refs.get(digest, 0) + 1
+
+        # remove orphaned outputs (e.g.
+        # from interrupted stores) first
+        for digest in list(objects.keys()):
+            if digest not in refs:
+                try:
+                    os.remove(self.__object(digest))
+                    objects.pop(digest)
+                except OSError:
+                    pass
+
+        total = sum(objects.values())
+        for _, key, outputs in entries:
+            if total <= self.__maxsize:
+                break
+            if key == keep:
+                continue
+
+            try:
+                os.remove(self.__entry(key))
+            except OSError:
+                continue
+
+            with self.__lock:
+                self.__stats['evictions'] += 1
+
+            for _, _, digest in outputs:
+                refs[digest] -= 1
+                if refs[digest] == 0 and digest in objects:
+                    try:
+                        os.remove(self.__object(digest))
+                        total -= objects.pop(digest)
+                    except OSError:
+                        pass
+
+
 SHOW_IF_TRUE = object()
 """Constant to be used in the ``valmap`` passed to the :func:`applyArgStyle`
 function.
@@ -662,6 +1536,17 @@ class FileOrThing:
     and any other arguments with a value of ``LOAD``).
 
 
+    **Temporary files**
+
+
+    All temporary input/output files are stored in a temporary directory,
+    which is created within the directory returned by :meth:`scratchDir`,
+    and which is deleted after the function has completed. A RAM-backed file
+    system such as ``/dev/shm`` can be used, via the :attr:`SCRATCH_DIR`
+    attribute or the ``$FSLPY_SCRATCHDIR`` environment variable, to avoid
+    disk I/O.
+
+
     **Return value**
 
 
@@ -768,6 +1653,29 @@ class FileOrThing:
     """
 
 
+    SCRATCH_DIR = None
+    """Directory in which temporary directories are created. If ``None``, the
+    ``$FSLPY_SCRATCHDIR`` environment variable is used if it is set, or the
+    system default temporary directory otherwise. See :meth:`scratchDir`.
+    """
+
+
+    @staticmethod
+    def scratchDir():
+        """Returns the directory in which temporary input/output files should
+        be created - the :attr:`SCRATCH_DIR`, or ``$FSLPY_SCRATCHDIR``, or
+        ``None`` if neither has been set, or if the directory does not exist.
+        """
+        sdir = FileOrThing.SCRATCH_DIR
+        if sdir is None:
+            sdir = os.environ.get('FSLPY_SCRATCHDIR', None)
+        if sdir is not None and not op.isdir(sdir):
+            log.warning('Scratch directory %s does not exist - using '
+                        'system default temporary directory', sdir)
+            sdir = None
+        return sdir
+
+
     class Results(dict):
         """A custom ``dict`` type used to return outputs from a function
         decorated with ``FileOrThing``. All outputs are stored as dictionary
@@ -866,6 +1774,14 @@ class FileOrThing:
         self.__things    = args
         self.__outprefix = kwargs.get('outprefix', None)
 
+        # Record the handled arguments on the
+        # decorated function, so that a
+        # ResultCache can identify the outputs
+        # of a call (see _declaredOutputs).
+        wrapped  = _unwrap(func)
+        declared = getattr(wrapped, '_fot_declared', [])
+        wrapped._fot_declared = declared + [(args, self.__outprefix)]
+
 
     def __call__(self, *args, **kwargs):
         """Function which calls ``func``, ensuring that any arguments of
@@ -921,7 +1837,9 @@ class FileOrThing:
         # input/output things, but don't change
         # into it, as file paths passed to the
         # function may be relative.
-        with tempdir.tempdir(changeto=False, override=fot_workdir) as td:
+        with tempdir.tempdir(root=FileOrThing.scratchDir(),
+                             changeto=False,
+                             override=fot_workdir) as td:
 
             log.debug('Redirecting LOADed outputs to %s', td)
 
@@ -1226,6 +2144,40 @@ class FileOrThing:
         return result
 
 
+def _saveTempImage(workdir, img):
+    """Used by the :func:`fileOrImage` and :func:`fileOrNiftiMRS` decorators.
+    Saves an in-memory ``nibabel`` image to a temporary file in ``workdir``,
+    and returns the file name.
+
+    Temporary input images are always saved uncompressed, regardless of
+    ``$FSLOUTPUTTYPE``, as they only exist for the duration of the call.
+    """
+    infile = tempdir.mkstemp('.nii', dir=workdir)
+
+    # Save a new image which shares the input
+    # image's data, so the original doesn't
+    # get associated with the temp file
+    nib.nifti1.Nifti1Image(img.dataobj, None, img.header).to_filename(infile)
+
+    return infile
+
+
+def _loadTempImage(path):
+    """Used by the :func:`fileOrImage` and :func:`fileOrNiftiMRS` decorators.
+    Loads an output image from ``path``, which will be deleted after it has
+    been loaded. Returns the ``nibabel`` image, and its data.
+
+    On POSIX platforms, uncompressed images (e.g. when ``$FSLOUTPUTTYPE`` is
+    ``NIFTI``) are memory-mapped rather than being read into memory - the
+    mapping remains valid after the file has been deleted. Otherwise an
+    independent in-memory copy of the image is created.
+    """
+    mmap = os.name == 'posix' and not path.endswith('.gz')
+    img  = nib.load(path, mmap=mmap)
+    data = np.asanyarray(img.dataobj)
+    return img, data
+
+
 def fileOrImage(*args, **kwargs):
     """Decorator which can be used to ensure that any NIfTI images are saved
     to file, and output images can be loaded and returned as ``nibabel``
@@ -1236,7 +2188,7 @@ def fileOrImage(*args, **kwargs):
     # types on each call, so we know
     # whether to return a fsl.Image or
     # a nibabel image
-    intypes = []
+    intypes = _LocalList()
 
     def prepIn(workdir, name, val):
 
@@ -1255,14 +2207,7 @@ def fileOrImage(*args, **kwargs):
             # in-memory image - we have
             # to save it out to a file
             if infile is None or not op.exists(infile):
-                infile = tempdir.mkstemp(fslimage.defaultExt(), dir=workdir)
-
-                # Create a copy of the input image and
-                # save that, so the original doesn't
-                # get associated with the temp file
-                val = nib.nifti1.Nifti1Image(
-                    np.asanyarray(val.dataobj), None, val.header)
-                val.to_filename(infile)
+                infile = _saveTempImage(workdir, val)
 
         return infile
 
@@ -1274,10 +2219,7 @@ def fileOrImage(*args, **kwargs):
         if not fslimage.looksLikeImage(path):
             return None
 
-        # create an independent in-memory
-        # copy of the image file
-        img  = nib.load(path, mmap=False)
-        data = np.asanyarray(img.dataobj)
+        img, data = _loadTempImage(path)
 
         # if any arguments were fsl images,
         # that takes precedence.
@@ -1308,7 +2250,7 @@ def fileOrImage(*args, **kwargs):
             intypes[:] = []
             return result
 
-        return _update_wrapper(wrapper, func)
+        return _asynchronous(_update_wrapper(wrapper, func))
 
     return decorator
 
@@ -1347,7 +2289,7 @@ def fileOrArray(*args, **kwargs):
         def wrapper(*args, **kwargs):
             return fot(*args, **kwargs)
 
-        return _update_wrapper(wrapper, func)
+        return _asynchronous(_update_wrapper(wrapper, func))
 
     return decorator
 
@@ -1415,7 +2357,7 @@ def fileOrText(*args, **kwargs):
         def wrapper(*args, **kwargs):
             return fot(*args, **kwargs)
 
-        return _update_wrapper(wrapper, func)
+        return _asynchronous(_update_wrapper(wrapper, func))
 
     return decorator
 
@@ -1463,7 +2405,7 @@ def fileOrBasis(*args, **kwargs):
         def wrapper(*args, **kwargs):
             return fot(*args, **kwargs)
 
-        return _update_wrapper(wrapper, func)
+        return _asynchronous(_update_wrapper(wrapper, func))
 
     return decorator
 
@@ -1478,7 +2420,7 @@ def fileOrNiftiMRS(*args, **kwargs):
     # types on each call, so we know
     # whether to return a fsl.Image or
     # a nibabel image
-    intypes = []
+    intypes = _LocalList()
 
     try:
         from nifti_mrs.nifti_mrs import NIFTI_MRS
@@ -1506,14 +2448,7 @@ def fileOrNiftiMRS(*args, **kwargs):
             # in-memory image - we have
             # to save it out to a file
             if infile is None or not op.exists(infile):
-                infile = tempdir.mkstemp(fslimage.defaultExt(), dir=workdir)
-
-                # Create a copy of the input image and
-                # save that, so the original doesn't
-                # get associated with the temp file
-                val = nib.nifti1.Nifti1Image(
-                    np.asanyarray(val.dataobj), None, val.header)
-                val.to_filename(infile)
+                infile = _saveTempImage(workdir, val)
 
         return infile
 
@@ -1525,10 +2460,7 @@ def fileOrNiftiMRS(*args, **kwargs):
         if not fslimage.looksLikeImage(path):
             return None
 
-        # create an independent in-memory
-        # copy of the image file
-        img  = nib.load(path, mmap=False)
-        data = np.asanyarray(img.dataobj)
+        img, data = _loadTempImage(path)
 
         # if any arguments were NIfTI_MRS images,
         # that takes precedence.
@@ -1565,6 +2497,6 @@ def fileOrNiftiMRS(*args, **kwargs):
             intypes[:] = []
             return result
 
-        return _update_wrapper(wrapper, func)
+        return _asynchronous(_update_wrapper(wrapper, func))
 
     return decorator